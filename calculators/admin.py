@@ -1,3 +1,22 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import CircuitBreakerState, SymbolBackoff
+
+
+@admin.register(CircuitBreakerState)
+class CircuitBreakerStateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_open', 'failures', 'opened_until', 'last_error', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+    @admin.display(boolean=True, description='Open')
+    def is_open(self, obj):
+        return obj.is_open
+
+
+@admin.register(SymbolBackoff)
+class SymbolBackoffAdmin(admin.ModelAdmin):
+    """ Deleting an entry lets the symbol be requested again immediately. """
+    list_display = ('symbol', 'failures', 'retry_after', 'last_error', 'updated_at')
+    search_fields = ('symbol',)
+    ordering = ('-retry_after',)
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,152 @@
+# calculators/circuit_breaker.py
+"""
+Failure memory for the market data provider, shared by every worker.
+
+  - Negative cache: a symbol the provider could not quote (delisted, typo)
+    is skipped until its retry_after passes. Each further failure doubles
+    the wait, so a bad symbol costs a handful of calls a week instead of
+    one per page load.
+  - Circuit breaker: repeated rate limit responses ("Note"/"Information")
+    mean the quota is gone. Once tripped, every upstream call fails fast
+    until the reset window passes; the first throttled call after that
+    trips it again straight away.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CircuitBreakerState, SymbolBackoff
+
+DEFAULT_BACKOFF_BASE_SECONDS = 15 * 60
+DEFAULT_BACKOFF_MAX_SECONDS = 7 * 24 * 60 * 60
+
+
+# --- Negative cache ---
+
+def backoff_seconds(failures):
+    base = getattr(settings, 'MARKET_DATA_BACKOFF_BASE_SECONDS', DEFAULT_BACKOFF_BASE_SECONDS)
+    cap = getattr(settings, 'MARKET_DATA_BACKOFF_MAX_SECONDS', DEFAULT_BACKOFF_MAX_SECONDS)
+    return min(base * 2 ** max(failures - 1, 0), cap)
+
+
+def backed_off_symbols(symbols):
+    """ The subset of `symbols` that must not be requested yet (one query). """
+    symbols = {s.strip().upper() for s in symbols}
+    if not symbols:
+        return set()
+    return set(
+        SymbolBackoff.objects.filter(symbol__in=symbols, retry_after__gt=timezone.now())
+        .values_list('symbol', flat=True)
+    )
+
+
+def record_symbol_failure(symbol, error=''):
+    """ Puts `symbol` into (longer) backoff. Returns the new retry time. """
+    symbol = symbol.strip().upper()
+    with transaction.atomic():
+        entry, _ = SymbolBackoff.objects.select_for_update().get_or_create(
+            symbol=symbol, defaults={'retry_after': timezone.now()}
+        )
+        entry.failures += 1
+        entry.last_error = str(error)[:500]
+        entry.retry_after = timezone.now() + timedelta(seconds=backoff_seconds(entry.failures))
+        entry.save(update_fields=['failures', 'last_error', 'retry_after', 'updated_at'])
+    return entry.retry_after
+
+
+def clear_symbol_failures(symbols):
+    """ Forgets past failures for symbols that have just been quoted. """
+    symbols = [s.strip().upper() for s in symbols]
+    if symbols:
+        SymbolBackoff.objects.filter(symbol__in=symbols).delete()
+
+
+# --- Circuit breaker ---
+
+class CircuitBreaker:
+    """ Breaker state lives in CircuitBreakerState so all workers trip together. """
+
+    def __init__(self, name, threshold=3, reset_seconds=60):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        # Known opening time, so an open breaker costs no query per call
+        self._open_until = None
+
+    def allow(self):
+        """ False while the breaker is open; upstream calls must not be made. """
+        now = timezone.now()
+        if self._open_until is not None and self._open_until > now:
+            return False
+        opened_until = (
+            CircuitBreakerState.objects.filter(name=self.name, opened_until__gt=now)
+            .values_list('opened_until', flat=True)
+            .first()
+        )
+        self._open_until = opened_until
+        return opened_until is None
+
+    def record_throttle(self, message=''):
+        """ Counts a rate limit response and opens the breaker at the threshold. """
+        now = timezone.now()
+        with transaction.atomic():
+            state, _ = CircuitBreakerState.objects.select_for_update().get_or_create(name=self.name)
+            state.failures += 1
+            state.last_error = str(message)[:500]
+            if state.failures >= self.threshold:
+                state.opened_until = now + timedelta(seconds=self.reset_seconds)
+                self._open_until = state.opened_until
+            state.save()
+
+    def record_success(self):
+        """ Closes the breaker after any successful call (no write if already closed). """
+        self._open_until = None
+        CircuitBreakerState.objects.filter(name=self.name, failures__gt=0).update(
+            failures=0, opened_until=None, updated_at=timezone.now()
+        )
+
+    def state(self):
+        row = CircuitBreakerState.objects.filter(name=self.name).first()
+        if row is None:
+            return {'name': self.name, 'state': 'closed', 'failures': 0, 'opened_until': None, 'last_error': ''}
+        if row.is_open:
+            label = 'open'
+        elif row.failures >= self.threshold:
+            label = 'half-open'  # Window passed; next throttled call re-opens it
+        else:
+            label = 'closed'
+        return {
+            'name': self.name,
+            'state': label,
+            'failures': row.failures,
+            'opened_until': row.opened_until,
+            'last_error': row.last_error,
+        }
+
+
+def get_market_data_breaker():
+    """ The breaker guarding every Alpha Vantage call, configured from settings. """
+    return CircuitBreaker(
+        'alpha_vantage',
+        threshold=getattr(settings, 'MARKET_DATA_BREAKER_THRESHOLD', 3),
+        reset_seconds=getattr(settings, 'MARKET_DATA_BREAKER_RESET_SECONDS', 60),
+    )
+
+
+# Wording of Alpha Vantage's per-second, per-minute and daily quota notices
+THROTTLE_MARKERS = ('rate limit', 'call frequency', 'requests per day', 'sparingly')
+
+
+def is_throttle_message(message):
+    """
+    Alpha Vantage reports exhausted quota as a 'Note' or 'Information'. The
+    quota notices also advertise the premium plans (and premium endpoints),
+    so they are recognised by their own wording first; otherwise only the
+    "This is a premium endpoint" notice is not a throttle.
+    """
+    message = str(message).lower()
+    if any(marker in message for marker in THROTTLE_MARKERS):
+        return True
+    return 'premium endpoint' not in message
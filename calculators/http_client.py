@@ -0,0 +1,148 @@
+# calculators/http_client.py
+"""
+Pooled, keep-alive HTTP client for upstream market data calls.
+
+One requests.Session per process reuses TCP+TLS connections across calls.
+Connect and read timeouts are separate, so a dead host fails fast. 5xx
+responses and connection errors are retried with jittered exponential
+backoff. Every attempt's latency is recorded in `upstream_stats`.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_POOL_SIZE = 10
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 4
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class UpstreamStats:
+    """ Thread-safe latency and outcome counters for upstream calls. """
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds, ok, retried=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self.retries += 1 if retried else 0
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self._latencies.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.0
+        index = min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def snapshot(self):
+        with self._lock:
+            calls, errors, retries = self.calls, self.errors, self.retries
+            total, worst = self.total_seconds, self.max_seconds
+        return {
+            'calls': calls,
+            'errors': errors,
+            'retries': retries,
+            'mean_seconds': total / calls if calls else 0.0,
+            'p50_seconds': self.percentile(50),
+            'p99_seconds': self.percentile(99),
+            'max_seconds': worst,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self.calls = self.errors = self.retries = 0
+            self.total_seconds = self.max_seconds = 0.0
+
+
+upstream_stats = UpstreamStats()
+
+
+def get_session():
+    """ Returns this process's pooled session, creating it after a fork. """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                pool_size = getattr(settings, 'MARKET_DATA_POOL_SIZE', DEFAULT_POOL_SIZE)
+                session = requests.Session()
+                # Retries are handled in get() so that each attempt is measured
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+def _backoff(attempt):
+    """ Full-jitter exponential backoff. """
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def get(url, params=None, max_retries=None):
+    """
+    GETs `url` through the pooled session. Retries on connection errors and
+    5xx responses; read timeouts are not retried, so the worst case stays
+    bounded. Raises requests.exceptions.RequestException on final failure.
+    """
+    timeout = (
+        getattr(settings, 'MARKET_DATA_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        getattr(settings, 'MARKET_DATA_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+    )
+    if max_retries is None:
+        max_retries = getattr(settings, 'MARKET_DATA_MAX_RETRIES', DEFAULT_MAX_RETRIES)
+
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        retried = attempt > 0
+        start = time.monotonic()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+            elapsed = time.monotonic() - start
+            upstream_stats.record(elapsed, ok=False, retried=retried)
+            logger.warning('Upstream connection error after %.3fs (attempt %d): %s', elapsed, attempt + 1, e)
+            if attempt == max_retries:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        except requests.exceptions.RequestException:
+            upstream_stats.record(time.monotonic() - start, ok=False, retried=retried)
+            raise
+
+        elapsed = time.monotonic() - start
+        ok = response.status_code < 500
+        upstream_stats.record(elapsed, ok=ok, retried=retried)
+        logger.debug('Upstream %s %d in %.3fs', url, response.status_code, elapsed)
+        if not ok and attempt < max_retries:
+            time.sleep(_backoff(attempt))
+            continue
+        return response
@@ -0,0 +1,339 @@
+# calculators/market_calendar.py
+"""
+Exchange trading calendars (sessions, weekends, holidays, early closes).
+
+Prices only move while a venue is open, so cache lifetimes follow the
+calendar: a price fetched during a session is fresh for the usual short
+TTL, and one fetched after the close stays fresh until the next open.
+
+US (NYSE/Nasdaq) and UK (LSE) calendars are built in, with their regular
+holiday rules. MARKET_CALENDAR_FILE may point to a JSON file adding one-off
+closures or further venues:
+
+    {
+      "exchanges": {
+        "US": {"holidays": ["2027-01-09"], "early_closes": {"2027-07-02": "13:00"}},
+        "XETR": {"name": "Xetra", "timezone": "Europe/Berlin", "open": "09:00", "close": "17:30",
+                 "holidays": ["2027-12-24"]}
+      },
+      "suffixes": {".DEX": "XETR"}
+    }
+
+Symbols are mapped to venues by suffix (Alpha Vantage style, e.g. TSCO.LON);
+anything without a known suffix trades in the US.
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULT_EXCHANGE = 'US'
+# Built-in holiday rules are generated for this span of years
+FIRST_YEAR, LAST_YEAR = 1990, 2060
+# Delayed feeds keep publishing for a while after the bell; the closing
+# price is only trusted once this long has passed.
+CLOSE_SETTLE_SECONDS = 20 * 60
+# How far ahead to look for the next session (covers any real closure)
+MAX_SEARCH_DAYS = 30
+
+
+@dataclass(frozen=True)
+class Exchange:
+    code: str
+    name: str
+    tz: str
+    open_time: time
+    close_time: time
+    holidays: FrozenSet[date] = frozenset()
+    early_closes: Dict[date, time] = field(default_factory=dict)
+    weekend: FrozenSet[int] = frozenset({5, 6})
+
+    @property
+    def tzinfo(self):
+        return ZoneInfo(self.tz)
+
+    def is_trading_day(self, day):
+        return day.weekday() not in self.weekend and day not in self.holidays
+
+    def session(self, day) -> Optional[Tuple[datetime, datetime]]:
+        """ (open, close) as aware datetimes for `day`, or None if the venue is closed all day. """
+        if not self.is_trading_day(day):
+            return None
+        close_time = self.early_closes.get(day, self.close_time)
+        return (
+            datetime.combine(day, self.open_time, tzinfo=self.tzinfo),
+            datetime.combine(day, close_time, tzinfo=self.tzinfo),
+        )
+
+    def _local_date(self, at):
+        return at.astimezone(self.tzinfo).date()
+
+    def is_open(self, at=None):
+        at = at or timezone.now()
+        session = self.session(self._local_date(at))
+        return session is not None and session[0] <= at < session[1]
+
+    def next_open(self, at=None):
+        """ The first session open strictly after `at`. """
+        at = at or timezone.now()
+        day = self._local_date(at)
+        for offset in range(MAX_SEARCH_DAYS + 1):
+            session = self.session(day + timedelta(days=offset))
+            if session is not None and session[0] > at:
+                return session[0]
+        raise ValueError(f'No {self.code} session within {MAX_SEARCH_DAYS} days of {at}.')
+
+    def next_close(self, at=None):
+        """ The first session close strictly after `at`. """
+        at = at or timezone.now()
+        day = self._local_date(at)
+        for offset in range(MAX_SEARCH_DAYS + 1):
+            session = self.session(day + timedelta(days=offset))
+            if session is not None and session[1] > at:
+                return session[1]
+        raise ValueError(f'No {self.code} session within {MAX_SEARCH_DAYS} days of {at}.')
+
+    def previous_close(self, at=None):
+        """ The last session close at or before `at`. """
+        at = at or timezone.now()
+        day = self._local_date(at)
+        for offset in range(MAX_SEARCH_DAYS + 1):
+            session = self.session(day - timedelta(days=offset))
+            if session is not None and session[1] <= at:
+                return session[1]
+        return None
+
+    def previous_trading_day(self, day):
+        """ The last trading day strictly before `day`. """
+        for offset in range(1, MAX_SEARCH_DAYS + 1):
+            candidate = day - timedelta(days=offset)
+            if self.is_trading_day(candidate):
+                return candidate
+        return day - timedelta(days=1)
+
+
+class MarketCalendar:
+    """ A set of exchanges plus the symbol-suffix rules that route symbols to them. """
+
+    def __init__(self, exchanges, suffixes=None, default=DEFAULT_EXCHANGE):
+        self.exchanges = dict(exchanges)
+        self.suffixes = dict(suffixes or {})
+        self.default = default
+
+    def exchange(self, code):
+        return self.exchanges[code]
+
+    def exchange_for(self, symbol):
+        symbol = (symbol or '').strip().upper()
+        # Longest suffix first, so '.LON' wins over '.L'
+        for suffix in sorted(self.suffixes, key=len, reverse=True):
+            if symbol.endswith(suffix):
+                return self.exchanges[self.suffixes[suffix]]
+        return self.exchanges[self.default]
+
+    def price_expiry(self, symbol, as_of, fresh_seconds):
+        """
+        When a price for `symbol` fetched at `as_of` stops being current:
+        `fresh_seconds` later while the venue is open (or still settling
+        after the close), otherwise at the next open.
+        """
+        exchange = self.exchange_for(symbol)
+        if exchange.is_open(as_of):
+            return as_of + timedelta(seconds=fresh_seconds)
+        last_close = exchange.previous_close(as_of)
+        if last_close is not None and as_of < last_close + timedelta(seconds=CLOSE_SETTLE_SECONDS):
+            return as_of + timedelta(seconds=fresh_seconds)
+        return max(exchange.next_open(as_of), as_of + timedelta(seconds=fresh_seconds))
+
+    def daily_bar_expiry(self, symbol, as_of):
+        """ When the next daily bar for `symbol` can exist: after the next close has settled. """
+        exchange = self.exchange_for(symbol)
+        last_close = exchange.previous_close(as_of)
+        if last_close is not None and as_of < last_close + timedelta(seconds=CLOSE_SETTLE_SECONDS):
+            return last_close + timedelta(seconds=CLOSE_SETTLE_SECONDS)
+        return exchange.next_close(as_of) + timedelta(seconds=CLOSE_SETTLE_SECONDS)
+
+
+# --- Holiday rules ---
+
+def easter_sunday(year):
+    """ Gregorian Easter (anonymous Gregorian algorithm). """
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """ The n-th `weekday` (0=Monday) of a month; n=-1 for the last one. """
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _us_observed(day):
+    """ NYSE: Saturday holidays move to Friday, Sunday holidays to Monday. """
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def us_holidays(year):
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),   # Presidents' Day
+        easter_sunday(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _us_observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),   # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _us_observed(date(year, 12, 25)),
+    }
+    # New Year's Day falling on a Saturday is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_us_observed(new_year))
+    if year >= 2022:
+        holidays.add(_us_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+
+def us_early_closes(year):
+    one_pm = time(13, 0)
+    closes = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1): one_pm}  # Day after Thanksgiving
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 5:
+            closes[day] = one_pm
+    return closes
+
+
+def uk_holidays(year):
+    easter = easter_sunday(year)
+    holidays = {
+        easter - timedelta(days=2),    # Good Friday
+        easter + timedelta(days=1),    # Easter Monday
+        _nth_weekday(year, 5, 0, 1),   # Early May bank holiday
+        _nth_weekday(year, 5, 0, -1),  # Spring bank holiday
+        _nth_weekday(year, 8, 0, -1),  # Summer bank holiday
+    }
+    # Weekend holidays are substituted by the following weekdays
+    new_year = date(year, 1, 1)
+    holidays.add(new_year + timedelta(days={5: 2, 6: 1}.get(new_year.weekday(), 0)))
+    christmas, boxing_day = date(year, 12, 25), date(year, 12, 26)
+    if christmas.weekday() == 5:
+        holidays.update({christmas + timedelta(days=2), boxing_day + timedelta(days=2)})
+    elif christmas.weekday() == 6:
+        holidays.update({christmas + timedelta(days=2), boxing_day})
+    elif boxing_day.weekday() == 5:
+        holidays.update({christmas, boxing_day + timedelta(days=2)})
+    else:
+        holidays.update({christmas, boxing_day})
+    return holidays
+
+
+def uk_early_closes(year):
+    half_twelve = time(12, 30)
+    return {day: half_twelve for day in (date(year, 12, 24), date(year, 12, 31)) if day.weekday() < 5}
+
+
+def _collect(rule):
+    result = {}
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        produced = rule(year)
+        if isinstance(produced, dict):
+            result.update(produced)
+        else:
+            result.update(dict.fromkeys(produced))
+    return result
+
+
+def builtin_exchanges():
+    return {
+        'US': Exchange(
+            code='US', name='New York Stock Exchange / Nasdaq', tz='America/New_York',
+            open_time=time(9, 30), close_time=time(16, 0),
+            holidays=frozenset(_collect(us_holidays)), early_closes=_collect(us_early_closes),
+        ),
+        'UK': Exchange(
+            code='UK', name='London Stock Exchange', tz='Europe/London',
+            open_time=time(8, 0), close_time=time(16, 30),
+            holidays=frozenset(_collect(uk_holidays)), early_closes=_collect(uk_early_closes),
+        ),
+    }
+
+
+BUILTIN_SUFFIXES = {'.LON': 'UK', '.L': 'UK'}
+
+
+# --- Loading ---
+
+def load_calendar(path=None):
+    """ Built-in calendars, extended with the JSON file at `path` if it exists. """
+    exchanges = builtin_exchanges()
+    suffixes = dict(BUILTIN_SUFFIXES)
+    if path and Path(path).exists():
+        with open(path) as f:
+            config = json.load(f)
+        for code, spec in config.get('exchanges', {}).items():
+            exchanges[code] = _merge_exchange(code, exchanges.get(code), spec)
+        suffixes.update({suffix.upper(): code for suffix, code in config.get('suffixes', {}).items()})
+    return MarketCalendar(exchanges, suffixes)
+
+
+def _merge_exchange(code, base, spec):
+    holidays = {date.fromisoformat(day) for day in spec.get('holidays', [])}
+    early_closes = {date.fromisoformat(day): time.fromisoformat(at) for day, at in spec.get('early_closes', {}).items()}
+    if base is None:
+        return Exchange(
+            code=code,
+            name=spec.get('name', code),
+            tz=spec['timezone'],
+            open_time=time.fromisoformat(spec['open']),
+            close_time=time.fromisoformat(spec['close']),
+            holidays=frozenset(holidays),
+            early_closes=early_closes,
+            weekend=frozenset(spec.get('weekend', [5, 6])),
+        )
+    return Exchange(
+        code=code,
+        name=spec.get('name', base.name),
+        tz=spec.get('timezone', base.tz),
+        open_time=time.fromisoformat(spec['open']) if 'open' in spec else base.open_time,
+        close_time=time.fromisoformat(spec['close']) if 'close' in spec else base.close_time,
+        holidays=base.holidays | holidays,
+        early_closes={**base.early_closes, **early_closes},
+        weekend=frozenset(spec['weekend']) if 'weekend' in spec else base.weekend,
+    )
+
+
+@lru_cache(maxsize=None)
+def _calendar_for(path):
+    return load_calendar(path)
+
+
+def get_calendar():
+    """ The process-wide calendar configured by MARKET_CALENDAR_FILE. """
+    return _calendar_for(getattr(settings, 'MARKET_CALENDAR_FILE', None))
+
+
+def price_expiry(symbol, as_of, fresh_seconds):
+    """ MarketCalendar.price_expiry, or a plain TTL when MARKET_CALENDAR_TTLS is off. """
+    if not getattr(settings, 'MARKET_CALENDAR_TTLS', True):
+        return as_of + timedelta(seconds=fresh_seconds)
+    return get_calendar().price_expiry(symbol, as_of, fresh_seconds)
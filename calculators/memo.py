@@ -0,0 +1,110 @@
+# calculators/memo.py
+"""
+Memoization of the calculator API results.
+
+The capital gains, reprice and rebalance endpoints are pure functions of
+their validated input, and the dashboards post the same payload again and
+again (every keystroke, and many users model the same positions). Results
+are stored in the Django cache named by CALCULATOR_CACHE_ALIAS, keyed by
+the calculator, MEMO_VERSION and a SHA-256 of the canonical JSON of the
+validated data. The cache backend's MAX_ENTRIES bounds its size.
+
+A request bypasses the lookup with `Cache-Control: no-cache` or
+`?fresh=true`; its result is still stored for the next caller. Only
+successful (200) responses are kept.
+"""
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+# Bump when any calculator's output changes for the same input (e.g. new tax rules)
+MEMO_VERSION = 1
+DEFAULT_ALIAS = 'calculators'
+HEADER = 'X-Result-Cache'
+
+
+def payload_key(calculator, data):
+    """ Content address of one calculation: the same validated input always gives the same key. """
+    canonical = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f'calc:{calculator}:v{MEMO_VERSION}:{digest}'
+
+
+def wants_fresh(request):
+    if 'no-cache' in request.headers.get('Cache-Control', '').lower():
+        return True
+    return request.query_params.get('fresh', '').lower() in ('1', 'true', 'yes')
+
+
+class ResultMemo:
+    """ Looks up and stores calculator responses; counts this worker's hits and misses. """
+
+    def __init__(self, alias=None):
+        self._alias = alias
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.bypassed = self.stored = 0
+
+    @property
+    def cache(self):
+        alias = self._alias or getattr(settings, 'CALCULATOR_CACHE_ALIAS', DEFAULT_ALIAS)
+        try:
+            return caches[alias]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def respond(self, request, calculator, data, compute):
+        """
+        The response for `data`: cached if available, otherwise from
+        `compute()` (which returns a Response), storing it if successful.
+        """
+        if not getattr(settings, 'CALCULATOR_MEMO_ENABLED', True):
+            return compute()
+
+        key = payload_key(calculator, data)
+        fresh = wants_fresh(request)
+        if not fresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count('hits')
+                response = Response(cached, status=status.HTTP_200_OK)
+                response[HEADER] = 'hit'
+                return response
+
+        self._count('bypassed' if fresh else 'misses')
+        response = compute()
+        if response.status_code == status.HTTP_200_OK:
+            self.cache.set(key, response.data)
+            self._count('stored')
+        response[HEADER] = 'bypass' if fresh else 'miss'
+        return response
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.bypassed = self.stored = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'stored': self.stored,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'backend': type(self.cache).__name__,
+            }
+
+
+# Process-wide instance; the entries themselves live in the configured cache.
+result_memo = ResultMemo()
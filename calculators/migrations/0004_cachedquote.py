@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculators', '0003_savedrebalancescenario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedQuote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=10)),
+                ('function', models.CharField(max_length=50)),
+                ('data', models.JSONField()),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('last_accessed', models.DateTimeField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_accessed'], name='calculators_last_ac_98d60b_idx')],
+                'unique_together': {('symbol', 'function')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculators', '0005_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('open', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('high', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('low', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('close', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('adjusted_close', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('volume', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['symbol', 'date'],
+                'unique_together': {('symbol', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculators', '0008_symbolbackoff_circuitbreakerstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='savedcapitalgainsscenario',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='taxscenario_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedrebalancescenario',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='rebalscenario_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedrepricestrategy',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='repricestrat_user_created_idx'),
+        ),
+    ]
@@ -1,11 +1,13 @@
 # calculators/models.py
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 class SavedRepriceStrategy(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # No separate FK index: the (user, -created_at, -id) index below serves user lookups too
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -20,12 +22,15 @@ class SavedRepriceStrategy(models.Model):
 
     class Meta:
         ordering = ['-created_at'] # Newest first
+        # Per-user lists are keyset-paginated on (created_at, id), newest first
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='repricestrat_user_created_idx')]
 
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
 class SavedCapitalGainsScenario(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # No separate FK index: the (user, -created_at, -id) index below serves user lookups too
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -35,12 +40,14 @@ class SavedCapitalGainsScenario(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='taxscenario_user_created_idx')]
 
     def __str__(self):
         return f"{self.name} - Tax Scenario ({self.user.username})"
     
 class SavedRebalanceScenario(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # No separate FK index: the (user, -created_at, -id) index below serves user lookups too
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -51,5 +58,95 @@ class SavedRebalanceScenario(models.Model):
     # Structure: [{'name': 'US Stocks', 'target': 60}]
     categories_data = models.JSONField(default=list)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='rebalscenario_user_created_idx')]
+
+    def __str__(self):
+        return f"{self.name} - {self.user.username}"
+
+class CachedQuote(models.Model):
+    """ Shared (cross-process) tier of the market data quote cache. """
+    symbol = models.CharField(max_length=10)
+    function = models.CharField(max_length=50)
+    data = models.JSONField()
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    # Used for LRU eviction once the table grows past QUOTE_CACHE_MAX_ENTRIES
+    last_accessed = models.DateTimeField()
+    hits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('symbol', 'function')
+        indexes = [models.Index(fields=['last_accessed'])]
+
+    def __str__(self):
+        return f"{self.symbol} {self.function} (expires {self.expires_at})"
+
+
+class RateLimitBucket(models.Model):
+    """ Token bucket state shared by every worker calling a rate-limited API. """
+    name = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.2f} tokens"
+
+
+class DailyBar(models.Model):
+    """ Locally stored daily price history, filled incrementally from the market data provider. """
+    symbol = models.CharField(max_length=10)
+    date = models.DateField()
+    open = models.DecimalField(max_digits=18, decimal_places=6)
+    high = models.DecimalField(max_digits=18, decimal_places=6)
+    low = models.DecimalField(max_digits=18, decimal_places=6)
+    close = models.DecimalField(max_digits=18, decimal_places=6)
+    adjusted_close = models.DecimalField(max_digits=18, decimal_places=6)
+    volume = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('symbol', 'date')
+        ordering = ['symbol', 'date']
+
+    def __str__(self):
+        return f"{self.symbol} {self.date}: {self.close}"
+
+
+class InFlightFetch(models.Model):
+    """ Cross-process lease marking an upstream fetch that is in progress (single-flight). """
+    key = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} (held by {self.owner} until {self.expires_at})"
+
+
+class SymbolBackoff(models.Model):
+    """ Negative cache: a symbol the provider could not quote, and when to try it again. """
+    symbol = models.CharField(max_length=10, unique=True)
+    failures = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    retry_after = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.symbol}: {self.failures} failures, retry after {self.retry_after}"
+
+
+class CircuitBreakerState(models.Model):
+    """ Provider-wide circuit breaker, opened by repeated rate limit responses. """
+    name = models.CharField(max_length=50, unique=True)
+    # Consecutive rate limit responses; reset by any successful call
+    failures = models.PositiveIntegerField(default=0)
+    opened_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_open(self):
+        return self.opened_until is not None and self.opened_until > timezone.now()
+
     def __str__(self):
-        return f"{self.name} - {self.user.username}"
\ No newline at end of file
+        return f"{self.name}: {'open' if self.is_open else 'closed'}"
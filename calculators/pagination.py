@@ -0,0 +1,81 @@
+# calculators/pagination.py
+"""
+Keyset (cursor) pagination for the saved strategy / scenario lists.
+
+Pages are ordered newest first on (created_at, id) and each page starts
+where the previous one ended, so fetching page N costs the same single
+indexed query as page 1 (no OFFSET scan), and rows saved while paging
+never shift the results. The cursor is an opaque token holding the last
+row's (created_at, id).
+"""
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Columns returned by the light list mode (?summary=true); the JSON blobs are not read
+SUMMARY_FIELDS = ('id', 'name', 'created_at')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError) as exc:
+        raise InvalidCursor('Invalid cursor.') from exc
+
+
+def past_cursor(queryset, created_at, pk):
+    """
+    Rows older than the cursor (created_at, pk), i.e. the ones that follow
+    it in newest-first order. A range on created_at lets the
+    (user, -created_at, -id) index seek straight to the cursor; the
+    equivalent `created_at < x OR (created_at = x AND id < pk)` only seeks
+    on user and walks every newer row first.
+    """
+    return queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+
+
+def page_size(params):
+    try:
+        size = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, params, serializer_class):
+    """
+    One page of `queryset` as {'results': [...], 'next_cursor': str or None}.
+    Reads `cursor`, `limit` and `summary` from the query params; raises
+    InvalidCursor for a malformed cursor.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    cursor = params.get('cursor')
+    if cursor:
+        queryset = past_cursor(queryset, *decode_cursor(cursor))
+
+    limit = page_size(params)
+    summary = params.get('summary', '').lower() in ('1', 'true', 'yes')
+    # One extra row tells whether there is a next page
+    if summary:
+        rows = list(queryset.values(*SUMMARY_FIELDS)[:limit + 1])
+    else:
+        rows = list(queryset[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(*((last['created_at'], last['id']) if summary else (last.created_at, last.id)))
+    results = rows if summary else serializer_class(rows, many=True).data
+    return {'results': results, 'next_cursor': next_cursor}
@@ -0,0 +1,119 @@
+# calculators/pdf.py
+"""
+PDF rendering for the calculator exports.
+
+reportlab and xhtml2pdf are slow to import and heavy in memory, so this
+module is only imported inside the export views, on the first export a
+worker serves. Nothing else may import it at module level.
+"""
+from io import BytesIO
+
+from django.template.loader import get_template
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from xhtml2pdf import pisa
+
+
+def render_html_pdf(template_src, context_dict=None):
+    """ Renders a Django template to PDF bytes with xhtml2pdf; None if rendering failed. """
+    html = get_template(template_src).render(context_dict or {})
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    if not pdf.err:
+        return result.getvalue()
+    return None
+
+
+def rebalance_plan_pdf(data, generated_on=None):
+    """ The rebalancing plan PDF (reportlab) for a RebalanceAPIView result. """
+    generated_on = generated_on or timezone.now().date()
+    # Create a file-like buffer to receive PDF data
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # 1. Header
+    elements.append(Paragraph("Portfolio Rebalancing Plan", styles['Title']))
+    elements.append(Paragraph(f"Generated on: {generated_on.strftime('%Y-%m-%d')}", styles['Normal']))
+    elements.append(Spacer(1, 12))
+    
+    # 2. Total Value
+    total_value = data.get('total_portfolio_value', 0)
+    elements.append(Paragraph(f"<b>Total Portfolio Value:</b> ${float(total_value):,.2f}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # 3. Allocation Summary Table
+    elements.append(Paragraph("<b>Allocation Summary</b>", styles['Heading2']))
+    elements.append(Spacer(1, 10))
+    
+    # Table Header
+    table_data = [['Category', 'Current %', 'Target %', 'Current $', 'Target $', 'Difference']]
+    
+    # Table Rows
+    target_allocation = data.get('target_allocation', {})
+    current_allocation = data.get('current_allocation', {})
+    
+    for category, target_info in target_allocation.items():
+        current_info = current_allocation.get(category, {})
+        
+        # Format numbers
+        curr_pct = f"{current_info.get('percent', 0)}%"
+        tgt_pct = f"{target_info.get('percent', 0)}%"
+        curr_val = f"${float(current_info.get('value', 0)):,.2f}"
+        tgt_val = f"${float(target_info.get('value', 0)):,.2f}"
+        
+        # Calculate diff for display
+        diff = float(target_info.get('value', 0)) - float(current_info.get('value', 0))
+        diff_str = f"${diff:,.2f}"
+        if diff > 0: diff_str = f"+{diff_str}"
+        
+        table_data.append([category, curr_pct, tgt_pct, curr_val, tgt_val, diff_str])
+
+    # Draw Table 1
+    t1 = Table(table_data)
+    t1.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    elements.append(t1)
+    elements.append(Spacer(1, 20))
+
+    # 4. Actionable Orders Table
+    elements.append(Paragraph("<b>Actionable Orders</b>", styles['Heading2']))
+    elements.append(Spacer(1, 10))
+    
+    orders_data = [['Action', 'Asset/Category', 'Amount']]
+    rebalancing_orders = data.get('rebalancing_orders', [])
+    
+    for order in rebalancing_orders:
+        if order['action'] == 'HOLD':
+            continue
+        
+        amount = f"${abs(float(order['difference_value'])):,.2f}"
+        orders_data.append([order['action'], order['category'], amount])
+        
+    if len(orders_data) > 1:
+        t2 = Table(orders_data, colWidths=[100, 200, 100])
+        t2.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.navy),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(t2)
+    else:
+        elements.append(Paragraph("No trades needed. Your portfolio is balanced.", styles['Normal']))
+
+    # Build PDF
+    doc.build(elements)
+    return buffer.getvalue()
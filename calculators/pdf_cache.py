@@ -0,0 +1,203 @@
+# calculators/pdf_cache.py
+"""
+On-disk cache of rendered report PDFs.
+
+Rendering through xhtml2pdf or reportlab is the most expensive thing the
+site does, and users often download the same report twice or re-export an
+unchanged scenario. Each PDF is stored under a hash of what produced it:
+the template (its name and the source of every template it extends or
+includes, or the reportlab layout name), RENDER_VERSION, the
+PDF_CACHE_VERSION setting, and the canonical JSON of the context. A repeat
+export is one file read. The hash doubles as the ETag, so a conditional GET
+for an unchanged report is answered with 304 without reading the file.
+
+Anything else that changes the output without changing those inputs - a
+template picked by a variable name, a stylesheet, fonts, an xhtml2pdf
+upgrade - needs PDF_CACHE_VERSION bumped (e.g. to the release id) on deploy.
+
+The directory is bounded by PDF_CACHE_MAX_BYTES; the least recently used
+files (by mtime, refreshed on every hit) are removed first. Files are
+written atomically, so several workers can share one directory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponseNotModified
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.utils.http import quote_etag
+
+# Bump when a reportlab layout (which has no template source to hash) changes
+RENDER_VERSION = 1
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+HEADER = 'X-Result-Cache'
+
+
+def template_fingerprint(template_src):
+    """
+    Template name plus a hash of its source and of every template it
+    extends or includes, so editing any of them invalidates its PDFs.
+    """
+    digest = hashlib.sha256()
+    for name, source in template_sources(template_src):
+        digest.update(f'{name}\0{source}\0'.encode())
+    return f'{template_src}:{digest.hexdigest()[:16]}'
+
+
+def template_sources(template_name, seen=None):
+    """ [(name, source)] of a template and, recursively, the templates it names in extends/include tags. """
+    seen = set() if seen is None else seen
+    if template_name in seen:
+        return []
+    seen.add(template_name)
+    template = get_template(template_name).template
+    sources = [(template_name, getattr(template, 'source', ''))]
+    nodelist = getattr(template, 'nodelist', None)
+    if nodelist is not None:
+        for node in nodelist.get_nodes_by_type(ExtendsNode):
+            sources += _referenced_sources(node.parent_name, seen)
+        for node in nodelist.get_nodes_by_type(IncludeNode):
+            sources += _referenced_sources(node.template, seen)
+    return sources
+
+
+def _referenced_sources(expression, seen):
+    # Only literal names can be followed; variable ones are covered by PDF_CACHE_VERSION
+    name = getattr(expression, 'var', None)
+    if isinstance(name, str) and not getattr(expression, 'filters', None):
+        return template_sources(name, seen)
+    return []
+
+
+def report_key(fingerprint, context):
+    canonical = json.dumps(context, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    version = f"{RENDER_VERSION}:{getattr(settings, 'PDF_CACHE_VERSION', '')}"
+    return hashlib.sha256(f'{fingerprint}:v{version}:{canonical}'.encode()).hexdigest()
+
+
+class PdfCache:
+    """ Content-addressed PDF files in one directory, evicted least recently used first. """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def directory(self):
+        directory = self._directory or getattr(settings, 'PDF_CACHE_DIR', None)
+        return Path(directory or Path(tempfile.gettempdir()) / 'stock_savvy_pdf_cache')
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+    def path(self, key):
+        return self.directory / f'{key}.pdf'
+
+    def get(self, key):
+        """ The cached file's path, or None. Marks it as recently used. """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, content):
+        """ Stores `content` and evicts old files beyond max_bytes. Returns the path. """
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(content)
+        path = self.path(key)
+        os.replace(temporary, path)
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another worker
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == str(keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def pdf_response(request, fingerprint, context, render, filename):
+    """
+    The PDF for (`fingerprint`, `context`) as a download, rendered with
+    `render()` (returning bytes, or None on failure) only on a cache miss.
+    Returns None if rendering failed. GET/HEAD requests whose If-None-Match
+    holds the ETag get a 304.
+    """
+    key = report_key(fingerprint, context)
+    etag = quote_etag(key)
+    if request.method in ('GET', 'HEAD') and etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    file, state = None, 'hit'
+    path = pdf_cache.get(key)
+    if path is not None:
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            pass  # Evicted by another worker since the lookup
+    if file is None:
+        content = render()
+        if content is None:
+            return None
+        pdf_cache.put(key, content)
+        file, state = BytesIO(content), 'miss'
+
+    response = FileResponse(file, as_attachment=True, filename=filename, content_type='application/pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'  # Revalidate with If-None-Match before reuse
+    response[HEADER] = state
+    return response
+
+
+# Process-wide instance; the files are shared by every worker using the directory.
+pdf_cache = PdfCache()
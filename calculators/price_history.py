@@ -0,0 +1,71 @@
+# calculators/price_history.py
+"""
+Local store of daily price history (the DailyBar table).
+
+sync_daily_bars() fetches only what is missing: full history the first time
+a symbol is seen, then compact (last ~100 days) updates. Readers such as
+backfill_snapshots query DailyBar directly and never call upstream.
+"""
+from datetime import date
+
+from .market_calendar import get_calendar
+from .models import DailyBar
+from .providers import get_provider
+
+UPDATE_FIELDS = ['open', 'high', 'low', 'close', 'adjusted_close', 'volume']
+
+
+def last_completed_trading_day(today=None, symbol=None):
+    """ The most recent trading day before `today` on `symbol`'s exchange (it may still be open today). """
+    return get_calendar().exchange_for(symbol).previous_trading_day(today or date.today())
+
+
+def latest_bar_date(symbol):
+    return (
+        DailyBar.objects.filter(symbol=symbol.strip().upper())
+        .order_by('-date')
+        .values_list('date', flat=True)
+        .first()
+    )
+
+
+def sync_daily_bars(symbol, provider=None, permit_timeout=0, today=None):
+    """
+    Brings the stored history for `symbol` up to date. Returns the number of
+    bars written; 0 without an upstream call if nothing is missing.
+
+    The latest stored bar is re-requested too, since it may have been stored
+    before the session closed; rows are upserted on (symbol, date).
+    """
+    symbol = symbol.strip().upper()
+    latest = latest_bar_date(symbol)
+    if latest is not None and latest >= last_completed_trading_day(today, symbol):
+        return 0
+
+    provider = provider or get_provider(permit_timeout=permit_timeout)
+    # since=None asks for full history; a recent date lets the provider use compact output
+    bars = provider.get_daily_bars(symbol, since=latest)
+    if not bars:
+        return 0
+
+    DailyBar.objects.bulk_create(
+        [
+            DailyBar(
+                symbol=symbol,
+                date=bar.date,
+                open=bar.open,
+                high=bar.high,
+                low=bar.low,
+                close=bar.close,
+                adjusted_close=bar.adjusted_close,
+                volume=bar.volume,
+            )
+            for bar in bars
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['symbol', 'date'],
+        update_fields=UPDATE_FIELDS,
+    )
+    return len(bars)
+
@@ -0,0 +1,391 @@
+# calculators/providers.py
+"""
+Market data providers.
+
+Every provider returns the same typed results, so callers never parse
+Alpha Vantage's '05. price' style keys themselves:
+
+    get_quotes(symbols)             -> {symbol: Quote}
+    get_daily_bars(symbol, since)   -> [Bar, ...] (oldest first)
+
+Use get_provider() to obtain the provider configured in settings.
+"""
+import csv
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from django.conf import settings
+
+from . import http_client
+from .circuit_breaker import (
+    backed_off_symbols, clear_symbol_failures, get_market_data_breaker, is_throttle_message, record_symbol_failure,
+)
+from .rate_limit import get_market_data_limiter
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+
+
+class MarketDataError(Exception):
+    """ Raised when the upstream provider returns an error or unusable data. """
+
+
+class RateLimitedError(MarketDataError):
+    """ Raised when no rate limit permit could be obtained for an upstream call. """
+
+
+class CircuitOpenError(RateLimitedError):
+    """ Raised without calling upstream while the provider circuit breaker is open. """
+
+
+class InvalidSymbolError(MarketDataError):
+    """ Raised when upstream rejects the symbol itself ('Error Message'). """
+
+
+# --- Data Structures ---
+
+@dataclass(frozen=True)
+class Quote:
+    symbol: str
+    price: Decimal
+    previous_close: Optional[Decimal] = None
+    volume: Optional[int] = None
+    latest_trading_day: Optional[date] = None
+    # When the quote was fetched from upstream (set by the quote cache)
+    as_of: Optional[datetime] = None
+
+    def to_dict(self):
+        """ A JSON-safe representation, used by the shared quote cache. """
+        return {
+            'symbol': self.symbol,
+            'price': str(self.price),
+            'previous_close': str(self.previous_close) if self.previous_close is not None else None,
+            'volume': self.volume,
+            'latest_trading_day': self.latest_trading_day.isoformat() if self.latest_trading_day else None,
+            'as_of': self.as_of.isoformat() if self.as_of else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            symbol=data['symbol'],
+            price=Decimal(str(data['price'])),
+            previous_close=_to_decimal(data.get('previous_close')),
+            volume=_to_int(data.get('volume')),
+            latest_trading_day=_to_date(data.get('latest_trading_day')),
+            as_of=datetime.fromisoformat(data['as_of']) if data.get('as_of') else None,
+        )
+
+
+@dataclass(frozen=True)
+class Bar:
+    date: date
+    open: Decimal
+    high: Decimal
+    low: Decimal
+    close: Decimal
+    adjusted_close: Decimal
+    volume: int
+
+
+# --- Parsing Helpers ---
+
+def _to_decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def _to_int(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(Decimal(str(value)))
+    except InvalidOperation:
+        return None
+
+
+def _to_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _normalise(symbols):
+    """ Upper-cases and de-duplicates symbols, preserving order. """
+    return list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+
+
+# --- Providers ---
+
+class MarketDataProvider:
+    """ Base class for market data providers. """
+
+    def __init__(self, permit_timeout=0):
+        # Seconds an upstream call may wait for a rate limit permit
+        self.permit_timeout = permit_timeout
+        # Upstream requests actually sent (not those refused by the breaker, limiter or backoff)
+        self.requests = 0
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        """ Returns the latest quote for each symbol. Unknown symbols are omitted. """
+        raise NotImplementedError
+
+    def get_daily_bars(self, symbol: str, since: Optional[date] = None) -> List[Bar]:
+        """ Returns daily bars on or after `since` (all available history if None), oldest first. """
+        raise NotImplementedError
+
+    def get_quote(self, symbol: str) -> Optional[Quote]:
+        return self.get_quotes([symbol]).get(symbol.strip().upper())
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """
+    Alpha Vantage implementation. When bulk quotes are enabled (a premium
+    feature) up to `chunk_size` symbols are fetched per call with
+    REALTIME_BULK_QUOTES; otherwise GLOBAL_QUOTE is used per symbol.
+    """
+    BULK_CHUNK_SIZE = 100
+    # TIME_SERIES_DAILY_ADJUSTED returns this many days with outputsize=compact
+    COMPACT_DAYS = 100
+
+    def __init__(self, api_key=None, bulk=None, chunk_size=BULK_CHUNK_SIZE, permit_timeout=0):
+        super().__init__(permit_timeout=permit_timeout)
+        self.api_key = api_key or os.getenv('ALPHA_VANTAGE_API_KEY')
+        self.bulk = getattr(settings, 'ALPHA_VANTAGE_BULK_QUOTES', False) if bulk is None else bulk
+        self.chunk_size = chunk_size
+        self.breaker = get_market_data_breaker()
+
+    def get_quotes(self, symbols):
+        symbols = _normalise(symbols)
+        # Negative cache: symbols that recently failed are not requested again yet
+        skipped = backed_off_symbols(symbols)
+        symbols = [s for s in symbols if s not in skipped]
+        quotes = {}
+        try:
+            if self.bulk and len(symbols) > 1:
+                for chunk in _chunks(symbols, self.chunk_size):
+                    try:
+                        quotes.update(self._get_bulk_quotes(chunk))
+                    except CircuitOpenError:
+                        raise
+                    except RateLimitedError:
+                        continue  # No permit in time; these are retried one by one below
+                    if not self.bulk:
+                        break  # Bulk endpoint unavailable; finish one by one below
+            for symbol in symbols:
+                if symbol not in quotes:
+                    try:
+                        quote = self._get_global_quote(symbol)
+                    except CircuitOpenError:
+                        raise
+                    except RateLimitedError:
+                        # No permit in time for this symbol; the rest still get their turn
+                        continue
+                    if quote is not None:
+                        quotes[symbol] = quote
+        except CircuitOpenError:
+            # Upstream is throttling us: return what we have, the rest stay unavailable
+            pass
+        clear_symbol_failures(quotes)
+        return quotes
+
+    def get_daily_bars(self, symbol, since=None):
+        symbol = symbol.strip().upper()
+        if backed_off_symbols([symbol]):
+            raise MarketDataError(f'Symbol {symbol} recently failed; not retrying yet.')
+        compact = since is not None and since >= date.today() - timedelta(days=self.COMPACT_DAYS - 10)
+        try:
+            data = self._query({
+                'function': 'TIME_SERIES_DAILY_ADJUSTED',
+                'symbol': symbol,
+                'outputsize': 'compact' if compact else 'full',
+            })
+        except InvalidSymbolError as e:
+            record_symbol_failure(symbol, e)
+            raise
+        series = data.get('Time Series (Daily)')
+        if not series:
+            raise MarketDataError(f'Invalid or empty response from API for symbol {symbol}.')
+
+        bars = []
+        for day, values in series.items():
+            bar_date = date.fromisoformat(day)
+            if since is not None and bar_date < since:
+                continue
+            try:
+                bars.append(Bar(
+                    date=bar_date,
+                    open=Decimal(values['1. open']),
+                    high=Decimal(values['2. high']),
+                    low=Decimal(values['3. low']),
+                    close=Decimal(values['4. close']),
+                    adjusted_close=Decimal(values.get('5. adjusted close', values['4. close'])),
+                    volume=int(values.get('6. volume', values.get('5. volume', 0))),
+                ))
+            except (KeyError, InvalidOperation):
+                continue
+        bars.sort(key=lambda bar: bar.date)
+        return bars
+
+    def _get_global_quote(self, symbol):
+        try:
+            data = self._query({'function': 'GLOBAL_QUOTE', 'symbol': symbol})
+        except InvalidSymbolError as e:
+            record_symbol_failure(symbol, e)
+            return None
+        except RateLimitedError:
+            raise
+        except MarketDataError:
+            return None
+
+        raw = data.get('Global Quote') or {}
+        price = _to_decimal(raw.get('05. price'))
+        if price is None:
+            # Unknown symbols come back as an empty 'Global Quote'
+            record_symbol_failure(symbol, 'No quote returned.')
+            return None
+        return Quote(
+            symbol=symbol,
+            price=price,
+            previous_close=_to_decimal(raw.get('08. previous close')),
+            volume=_to_int(raw.get('06. volume')),
+            latest_trading_day=_to_date(raw.get('07. latest trading day')),
+        )
+
+    def _get_bulk_quotes(self, symbols):
+        try:
+            data = self._query({'function': 'REALTIME_BULK_QUOTES', 'symbol': ','.join(symbols)})
+        except RateLimitedError:
+            raise
+        except MarketDataError:
+            # Most likely a free-tier key; stop trying the premium endpoint
+            self.bulk = False
+            return {}
+
+        quotes = {}
+        for row in data.get('data') or []:
+            symbol = str(row.get('symbol', '')).upper()
+            price = _to_decimal(row.get('close'))
+            if symbol in symbols and price is not None:
+                quotes[symbol] = Quote(
+                    symbol=symbol,
+                    price=price,
+                    previous_close=_to_decimal(row.get('previous_close')),
+                    volume=_to_int(row.get('volume')),
+                    latest_trading_day=_to_date(row.get('timestamp')),
+                )
+        return quotes
+
+    def _query(self, params):
+        """ Performs one rate-limited upstream call and returns the decoded JSON. """
+        if not self.api_key:
+            raise MarketDataError('Alpha Vantage API key not found.')
+        if not self.breaker.allow():
+            raise CircuitOpenError('Market data provider is rate limiting us. Please try again shortly.')
+        if not get_market_data_limiter().acquire(timeout=self.permit_timeout):
+            raise RateLimitedError('Market data rate limit reached. Please try again shortly.')
+
+        self.requests += 1
+        try:
+            response = http_client.get(ALPHA_VANTAGE_URL, params={**params, 'apikey': self.api_key})
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise MarketDataError(f'Network error: {e}')
+
+        if 'Error Message' in data:
+            raise InvalidSymbolError(data['Error Message'])
+        if 'Note' in data or 'Information' in data:
+            message = data.get('Note', data.get('Information'))
+            if is_throttle_message(message):
+                self.breaker.record_throttle(message)
+                raise RateLimitedError(message)
+            raise MarketDataError(message)
+        self.breaker.record_success()
+        return data
+
+
+class LocalFileProvider(MarketDataProvider):
+    """
+    Offline provider for development and load testing. Reads from a directory:
+
+        quotes.json         {"AAPL": {"price": "190.50", "previous_close": "189.00"}, ...}
+        daily/AAPL.csv      date,open,high,low,close,adjusted_close,volume
+    """
+
+    def __init__(self, root=None, permit_timeout=0):
+        super().__init__(permit_timeout=permit_timeout)
+        self.root = Path(root or getattr(settings, 'MARKET_DATA_LOCAL_DIR', 'market_data'))
+
+    def get_quotes(self, symbols):
+        path = self.root / 'quotes.json'
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            available = {symbol.upper(): values for symbol, values in json.load(f).items()}
+
+        quotes = {}
+        for symbol in _normalise(symbols):
+            values = available.get(symbol)
+            if values is None:
+                continue
+            if not isinstance(values, dict):
+                values = {'price': values}
+            quotes[symbol] = Quote.from_dict({**values, 'symbol': symbol})
+        return quotes
+
+    def get_daily_bars(self, symbol, since=None):
+        symbol = symbol.strip().upper()
+        path = self.root / 'daily' / f'{symbol}.csv'
+        if not path.exists():
+            raise MarketDataError(f'No local daily data for symbol {symbol}.')
+
+        bars = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                bar_date = date.fromisoformat(row['date'])
+                if since is not None and bar_date < since:
+                    continue
+                bars.append(Bar(
+                    date=bar_date,
+                    open=Decimal(row['open']),
+                    high=Decimal(row['high']),
+                    low=Decimal(row['low']),
+                    close=Decimal(row['close']),
+                    adjusted_close=Decimal(row.get('adjusted_close') or row['close']),
+                    volume=int(row.get('volume') or 0),
+                ))
+        bars.sort(key=lambda bar: bar.date)
+        return bars
+
+
+PROVIDERS = {
+    'alpha_vantage': AlphaVantageProvider,
+    'local': LocalFileProvider,
+}
+
+
+def get_provider(**kwargs):
+    """ Returns an instance of the provider named by settings.MARKET_DATA_PROVIDER. """
+    name = getattr(settings, 'MARKET_DATA_PROVIDER', 'alpha_vantage')
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise MarketDataError(f'Unknown market data provider "{name}".')
+    return provider_class(**kwargs)
@@ -0,0 +1,295 @@
+# calculators/quote_cache.py
+"""
+A shared cache in front of the market data provider.
+
+Entries are keyed by (symbol, function) and live in two tiers:
+  1. An in-process LRU with per-entry expiry, so repeated lookups in one
+     worker never touch the database.
+  2. The CachedQuote table, so every worker and management command reuses
+     one upstream response for a symbol, however many users hold it.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .market_calendar import get_calendar, price_expiry
+from .models import CachedQuote
+from .providers import Quote, get_provider
+from .single_flight import single_flight
+
+# Cache "function" under which normalised provider quotes are stored
+QUOTE = 'QUOTE'
+# Functions whose lifetime follows the symbol's trading calendar
+PRICE_FUNCTIONS = {QUOTE, 'GLOBAL_QUOTE'}
+DAILY_FUNCTIONS = {'TIME_SERIES_DAILY', 'TIME_SERIES_DAILY_ADJUSTED'}
+
+DEFAULT_TTL_SECONDS = 15 * 60
+DEFAULT_MAX_ENTRIES = 5000
+# Extra seconds a follower waits for an in-flight fetch beyond its permit timeout
+COALESCE_WAIT_SECONDS = 15
+
+
+class QuoteCache:
+    """ TTL + LRU cache of market data responses. """
+
+    def __init__(self, max_entries=None, ttls=None):
+        self._max_entries = max_entries
+        self._ttls = ttls
+        self._entries = OrderedDict()  # (symbol, function) -> (expires_at, data)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Upstream calls made by this process, symbols they returned, and
+        # lookups served by another thread's or worker's in-flight fetch
+        self.upstream_fetches = 0
+        self.upstream_responses = 0
+        self.coalesced = 0
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'QUOTE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    def ttl_for(self, function):
+        """ Returns the time-to-live (in seconds) for a given API function. """
+        ttls = self._ttls if self._ttls is not None else getattr(settings, 'QUOTE_CACHE_TTLS', {})
+        return ttls.get(function, DEFAULT_TTL_SECONDS)
+
+    def expires_at_for(self, symbol, function, now):
+        """
+        Expiry of a response fetched at `now`. Prices use the TTL only while
+        the symbol's market is open and then last until the next open; daily
+        series last until the next session's close. Other functions use the TTL.
+        """
+        ttl = self.ttl_for(function)
+        if getattr(settings, 'MARKET_CALENDAR_TTLS', True):
+            if function in PRICE_FUNCTIONS:
+                return price_expiry(symbol, now, ttl)
+            if function in DAILY_FUNCTIONS:
+                return get_calendar().daily_bar_expiry(symbol, now)
+        return now + timedelta(seconds=ttl)
+
+    @staticmethod
+    def _key(symbol, function):
+        return (symbol.strip().upper(), function)
+
+    def get(self, symbol, function):
+        """ Returns the cached response, or None if it is missing or expired. """
+        key = self._key(symbol, function)
+        now = timezone.now()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, data = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return data
+                del self._entries[key]
+
+        row = CachedQuote.objects.filter(symbol=key[0], function=function, expires_at__gt=now).first()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # F() so concurrent workers never lose an increment
+        CachedQuote.objects.filter(pk=row.pk).update(last_accessed=now, hits=F('hits') + 1)
+        with self._lock:
+            self.shared_hits += 1
+            self._store_local(key, row.expires_at, row.data)
+        return row.data
+
+    def get_stale(self, symbol, function):
+        """ Returns the last known response regardless of expiry, or None. """
+        key = self._key(symbol, function)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+        row = CachedQuote.objects.filter(symbol=key[0], function=function).only('data').first()
+        return row.data if row is not None else None
+
+    def set(self, symbol, function, data, ttl=None):
+        """ Stores a response in both tiers. """
+        key = self._key(symbol, function)
+        now = timezone.now()
+        if ttl is not None:
+            expires_at = now + timedelta(seconds=ttl)
+        else:
+            expires_at = self.expires_at_for(key[0], function, now)
+
+        CachedQuote.objects.update_or_create(
+            symbol=key[0],
+            function=function,
+            defaults={'data': data, 'fetched_at': now, 'expires_at': expires_at, 'last_accessed': now},
+        )
+        with self._lock:
+            self._store_local(key, expires_at, data)
+        self._prune_shared()
+
+    def get_quotes(self, symbols, timeout=0, allow_stale=False, refresh=False, fetch=True):
+        """
+        Returns {symbol: Quote} for the given symbols. Fresh cached quotes are
+        used as-is and every miss is requested from the provider together, so
+        a whole portfolio costs one (bulk) or a few upstream calls.
+
+        `timeout` bounds the wait for each rate limit permit. With
+        `allow_stale`, symbols that could not be fetched fall back to their
+        last known quote. `refresh` skips the cache lookup entirely, while
+        `fetch=False` only reads the cache and never calls upstream.
+        """
+        symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        quotes = {}
+        missing = []
+        for symbol in symbols:
+            data = None if refresh else self.get(symbol, QUOTE)
+            if data is not None:
+                quotes[symbol] = Quote.from_dict(data)
+            else:
+                missing.append(symbol)
+
+        if missing and fetch:
+            # Single-flight: lead the fetch for symbols nobody else is fetching,
+            # and wait for the in-flight fetch of the rest.
+            leading = [symbol for symbol in missing if single_flight.claim((symbol, QUOTE))]
+            following = [symbol for symbol in missing if symbol not in leading]
+            try:
+                # Another leader may have finished between our lookup and claim
+                for symbol, data in self._fresh_shared(leading, QUOTE).items():
+                    quotes[symbol] = Quote.from_dict(data)
+                to_fetch = [symbol for symbol in leading if symbol not in quotes]
+                if to_fetch:
+                    fetched_at = timezone.now()
+                    provider = get_provider(permit_timeout=timeout)
+                    fetched = provider.get_quotes(to_fetch)
+                    with self._lock:
+                        self.upstream_fetches += provider.requests
+                        self.upstream_responses += len(fetched)
+                    for symbol, quote in fetched.items():
+                        quote = replace(quote, as_of=quote.as_of or fetched_at)
+                        self.set(symbol, QUOTE, quote.to_dict())
+                        quotes[symbol] = quote
+            finally:
+                for symbol in leading:
+                    single_flight.release((symbol, QUOTE))
+
+            for symbol in following:
+                single_flight.wait((symbol, QUOTE), timeout + COALESCE_WAIT_SECONDS)
+                data = self.get(symbol, QUOTE)
+                if data is not None:
+                    quotes[symbol] = Quote.from_dict(data)
+                    with self._lock:
+                        self.coalesced += 1
+
+            if allow_stale:
+                for symbol in missing:
+                    stale = self.get_stale(symbol, QUOTE) if symbol not in quotes else None
+                    if stale is not None:
+                        quotes[symbol] = Quote.from_dict(stale)
+        return quotes
+
+    async def aget_quotes(self, symbols, timeout=0, allow_stale=False):
+        """
+        Async get_quotes for ASGI views. Misses are fetched concurrently on
+        worker threads (one batch when bulk quotes are enabled, otherwise one
+        call per symbol), so N cold symbols cost about one upstream round trip
+        instead of N. The rate limiter still applies to every call.
+        """
+        symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        quotes = await sync_to_async(self.get_quotes)(symbols, fetch=False)
+        missing = [symbol for symbol in symbols if symbol not in quotes]
+        if not missing:
+            return quotes
+
+        if getattr(settings, 'ALPHA_VANTAGE_BULK_QUOTES', False):
+            batches = [missing]
+        else:
+            batches = [[symbol] for symbol in missing]
+        fetch_batch = sync_to_async(self._fetch_batch, thread_sensitive=False)
+        for fetched in await asyncio.gather(*(fetch_batch(batch, timeout, allow_stale) for batch in batches)):
+            quotes.update(fetched)
+        return quotes
+
+    def _fetch_batch(self, symbols, timeout, allow_stale):
+        try:
+            return self.get_quotes(symbols, timeout=timeout, allow_stale=allow_stale)
+        finally:
+            # Executor threads open their own database connections
+            connections.close_all()
+
+    def get_quote(self, symbol, **kwargs):
+        """ Convenience wrapper around get_quotes() for a single symbol. """
+        return self.get_quotes([symbol], **kwargs).get(symbol.strip().upper())
+
+    def _fresh_shared(self, symbols, function):
+        """ Unexpired shared-tier responses for several symbols, in one query. """
+        if not symbols:
+            return {}
+        return dict(
+            CachedQuote.objects.filter(symbol__in=symbols, function=function, expires_at__gt=timezone.now())
+            .values_list('symbol', 'data')
+        )
+
+    def invalidate(self, symbol, function):
+        key = self._key(symbol, function)
+        with self._lock:
+            self._entries.pop(key, None)
+        CachedQuote.objects.filter(symbol=key[0], function=function).delete()
+
+    def clear(self):
+        """ Empties the in-process tier and resets the counters. """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+            self.upstream_fetches = self.upstream_responses = self.coalesced = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'upstream_fetches': self.upstream_fetches,
+                'upstream_responses': self.upstream_responses,
+                'coalesced': self.coalesced,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+    def _store_local(self, key, expires_at, data):
+        # Caller must hold self._lock
+        self._entries[key] = (expires_at, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_shared(self):
+        overflow = CachedQuote.objects.count() - self.max_entries
+        if overflow > 0:
+            stale_ids = list(
+                CachedQuote.objects.order_by('last_accessed').values_list('id', flat=True)[:overflow]
+            )
+            CachedQuote.objects.filter(id__in=stale_ids).delete()
+            with self._lock:
+                self.evictions += len(stale_ids)
+
+
+# Process-wide instance used by views and management commands.
+quote_cache = QuoteCache()
@@ -0,0 +1,99 @@
+# calculators/rate_limit.py
+"""
+A token bucket shared through the database, so every web worker and
+management command draws from the same Alpha Vantage quota.
+
+Updates use compare-and-swap on the bucket row rather than row locks, which
+behaves the same on SQLite and PostgreSQL.
+"""
+import time
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import RateLimitBucket
+
+
+class TokenBucket:
+    """ Refills at `rate` tokens per second, up to `capacity` tokens. """
+
+    # Attempts before giving up when other workers keep winning the update race
+    MAX_RACE_RETRIES = 5
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def try_acquire(self, tokens=1):
+        """ Takes a permit if one is available right now. Never blocks. """
+        for _ in range(self.MAX_RACE_RETRIES):
+            acquired, wait = self._take(tokens)
+            if acquired:
+                return True
+            if wait > 0:
+                return False
+        return False
+
+    def acquire(self, tokens=1, timeout=0):
+        """
+        Waits up to `timeout` seconds for a permit. Returns False straight away
+        if the next permit cannot be available before the deadline.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            acquired, wait = self._take(tokens)
+            if acquired:
+                return True
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                return False
+            if wait > 0:
+                time.sleep(wait)
+
+    def seconds_until_available(self, tokens=1):
+        bucket = self._get_bucket()
+        available = self._refilled(bucket, timezone.now())
+        return max(0.0, (tokens - available) / self.rate)
+
+    def _get_bucket(self):
+        try:
+            bucket, _ = RateLimitBucket.objects.get_or_create(
+                name=self.name,
+                defaults={'tokens': self.capacity, 'updated_at': timezone.now()},
+            )
+        except IntegrityError:
+            # Another worker created the row first
+            bucket = RateLimitBucket.objects.get(name=self.name)
+        return bucket
+
+    def _refilled(self, bucket, now):
+        elapsed = max(0.0, (now - bucket.updated_at).total_seconds())
+        return min(float(self.capacity), bucket.tokens + elapsed * self.rate)
+
+    def _take(self, tokens):
+        """
+        Returns (acquired, seconds_to_wait). A lost race is reported as
+        (False, 0) so the caller retries immediately.
+        """
+        bucket = self._get_bucket()
+        now = timezone.now()
+        available = self._refilled(bucket, now)
+        if available < tokens:
+            return False, (tokens - available) / self.rate
+
+        updated = RateLimitBucket.objects.filter(
+            pk=bucket.pk, tokens=bucket.tokens, updated_at=bucket.updated_at
+        ).update(tokens=available - tokens, updated_at=now)
+        return bool(updated), 0.0
+
+
+def get_market_data_limiter():
+    """ The limiter guarding every upstream Alpha Vantage call. """
+    calls_per_minute = getattr(settings, 'ALPHA_VANTAGE_CALLS_PER_MINUTE', 5)
+    return TokenBucket(
+        name='alpha_vantage',
+        rate=calls_per_minute / 60.0,
+        capacity=getattr(settings, 'ALPHA_VANTAGE_BURST', 1),
+    )
@@ -0,0 +1,116 @@
+# calculators/single_flight.py
+"""
+Single-flight coordination for upstream fetches.
+
+When several threads or workers need the same (symbol, function) at once,
+only the first one (the leader) calls upstream. The others wait for it to
+finish and then read its result from the shared quote cache.
+
+Leadership is tracked in two places:
+  - in-process, with a threading.Event per key, so waiting threads wake up
+    as soon as the leader is done;
+  - cross-process, with a lease row in InFlightFetch. The lease expires, so
+    a crashed leader cannot block a key forever.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import InFlightFetch
+
+DEFAULT_LEASE_SECONDS = 120
+POLL_INTERVAL_SECONDS = 0.2
+
+
+class SingleFlight:
+    """ Claim/release/wait primitives keyed by (symbol, function). """
+
+    def __init__(self, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._inflight = {}  # key -> threading.Event, for keys this process leads
+        self._lock = threading.Lock()
+        self.leads = 0
+        self.waits = 0
+
+    @staticmethod
+    def _key(key):
+        symbol, function = key
+        return f'{function}:{symbol.strip().upper()}'
+
+    def claim(self, key, lease_seconds=None):
+        """
+        Tries to become the leader for `key`. Returns True if the caller must
+        fetch and then call release(), False if another fetch is in flight.
+        """
+        name = self._key(key)
+        with self._lock:
+            if name in self._inflight:
+                return False
+            self._inflight[name] = threading.Event()
+
+        if self._acquire_lease(name, lease_seconds or self.lease_seconds):
+            with self._lock:
+                self.leads += 1
+            return True
+
+        with self._lock:
+            self._inflight.pop(name).set()
+        return False
+
+    def release(self, key):
+        """ Ends leadership of `key` and wakes every waiter. """
+        name = self._key(key)
+        InFlightFetch.objects.filter(key=name, owner=self.owner).delete()
+        with self._lock:
+            event = self._inflight.pop(name, None)
+        if event is not None:
+            event.set()
+
+    def wait(self, key, timeout):
+        """
+        Blocks until the in-flight fetch for `key` finishes or `timeout`
+        seconds pass. Returns True if the fetch finished in time.
+        """
+        name = self._key(key)
+        with self._lock:
+            self.waits += 1
+            event = self._inflight.get(name)
+        if event is not None:
+            return event.wait(timeout)
+
+        deadline = time.monotonic() + timeout
+        while InFlightFetch.objects.filter(key=name, expires_at__gt=timezone.now()).exists():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL_SECONDS)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {'leads': self.leads, 'waits': self.waits, 'in_flight': len(self._inflight)}
+
+    def _acquire_lease(self, name, lease_seconds):
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=lease_seconds)
+        try:
+            with transaction.atomic():
+                InFlightFetch.objects.create(key=name, owner=self.owner, expires_at=expires_at)
+            return True
+        except IntegrityError:
+            pass
+        # Take over a lease abandoned by a crashed or timed-out leader
+        return bool(
+            InFlightFetch.objects.filter(key=name, expires_at__lte=now)
+            .update(owner=self.owner, expires_at=expires_at)
+        )
+
+
+# Process-wide instance shared by every cache lookup in this worker.
+single_flight = SingleFlight()
@@ -1,6 +1,34 @@
 # core/tests.py
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .circuit_breaker import get_market_data_breaker, is_throttle_message
+from .market_calendar import load_calendar
+from .memo import payload_key, result_memo
+from .pagination import past_cursor
+from .pdf_cache import PdfCache, pdf_cache, report_key, template_fingerprint
+from .models import CachedQuote, DailyBar, SavedCapitalGainsScenario, SavedRebalanceScenario, SymbolBackoff
+from .price_history import sync_daily_bars
+from . import http_client
+from .providers import AlphaVantageProvider, Bar, LocalFileProvider, Quote
+from .quote_cache import QuoteCache
+from .rate_limit import TokenBucket
+from .single_flight import SingleFlight, single_flight
 
 class LandingPageTest(TestCase):
     """
@@ -18,4 +46,634 @@ class LandingPageTest(TestCase):
         Verify that the landing page renders its correct template.
         """
         response = self.client.get(reverse('home'))
-        self.assertTemplateUsed(response, 'core/landing_page.html')b
\ No newline at end of file
+        self.assertTemplateUsed(response, 'core/landing_page.html')
+
+class QuoteCacheTest(TestCase):
+    """
+    Tests for the shared TTL + LRU quote cache.
+    """
+    QUOTE = {'Global Quote': {'01. symbol': 'AAPL', '05. price': '190.50'}}
+
+    @staticmethod
+    def provider(**quotes):
+        provider = mock.Mock(requests=1)
+        provider.get_quotes.return_value = {
+            symbol: Quote(symbol=symbol, price=Decimal(price)) for symbol, price in quotes.items()
+        }
+        return provider
+
+    def test_fetch_is_shared_between_cache_instances(self):
+        """
+        One upstream call should serve every later lookup, even from another process.
+        """
+        provider = self.provider(AAPL='190.50')
+        with mock.patch('calculators.quote_cache.get_provider', return_value=provider):
+            first = QuoteCache().get_quote('aapl')
+            other_worker = QuoteCache()
+            second = other_worker.get_quote('AAPL ')
+
+        provider.get_quotes.assert_called_once_with(['AAPL'])
+        self.assertEqual(first, second)
+        self.assertEqual(other_worker.stats()['shared_hits'], 1)
+
+    def test_unquoted_symbols_are_not_cached(self):
+        cache = QuoteCache()
+        with mock.patch('calculators.quote_cache.get_provider', return_value=self.provider()):
+            self.assertIsNone(cache.get_quote('MSFT'))
+        self.assertIsNone(cache.get('MSFT', 'QUOTE'))
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_expired_entries_are_misses_but_remain_available_as_stale(self):
+        cache = QuoteCache()
+        cache.set('AAPL', 'GLOBAL_QUOTE', self.QUOTE, ttl=-1)
+        self.assertIsNone(cache.get('AAPL', 'GLOBAL_QUOTE'))
+        self.assertEqual(cache.get_stale('AAPL', 'GLOBAL_QUOTE'), self.QUOTE)
+
+    def test_shared_hits_are_counted_in_the_database(self):
+        QuoteCache().set('AAPL', 'GLOBAL_QUOTE', self.QUOTE)
+        for _ in range(3):
+            QuoteCache().get('AAPL', 'GLOBAL_QUOTE')
+        self.assertEqual(CachedQuote.objects.get(symbol='AAPL').hits, 3)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = QuoteCache(max_entries=2)
+        cache.set('AAPL', 'GLOBAL_QUOTE', self.QUOTE)
+        cache.set('MSFT', 'GLOBAL_QUOTE', self.QUOTE)
+        cache.get('AAPL', 'GLOBAL_QUOTE')
+        cache.set('TSLA', 'GLOBAL_QUOTE', self.QUOTE)
+
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertIsNotNone(cache.get('AAPL', 'GLOBAL_QUOTE'))
+        self.assertEqual(CachedQuote.objects.count(), 2)
+
+    def test_unavailable_quotes_fall_back_to_stale_ones(self):
+        cache = QuoteCache()
+        cache.set('AAPL', 'QUOTE', Quote(symbol='AAPL', price=Decimal('190.50')).to_dict(), ttl=-1)
+
+        with mock.patch('calculators.quote_cache.get_provider', return_value=self.provider()):
+            stale = cache.get_quote('AAPL', allow_stale=True)
+            refused = cache.get_quote('AAPL')
+
+        self.assertEqual(stale.price, Decimal('190.50'))
+        self.assertIsNone(refused)
+
+    def test_get_quotes_only_requests_missing_symbols(self):
+        cache = QuoteCache()
+        cache.set('AAPL', 'QUOTE', Quote(symbol='AAPL', price=Decimal('190.50')).to_dict())
+        provider = mock.Mock(requests=1)
+        provider.get_quotes.return_value = {'MSFT': Quote(symbol='MSFT', price=Decimal('410.00'))}
+
+        with mock.patch('calculators.quote_cache.get_provider', return_value=provider):
+            quotes = cache.get_quotes(['aapl', 'MSFT'])
+            again = cache.get_quotes(['MSFT'])
+
+        provider.get_quotes.assert_called_once_with(['MSFT'])
+        self.assertEqual(quotes['AAPL'].price, Decimal('190.50'))
+        self.assertEqual(again['MSFT'].price, Decimal('410.00'))
+
+
+class SingleFlightTest(TestCase):
+    """
+    Tests for coalescing concurrent upstream fetches.
+    """
+    KEY = ('AAPL', 'QUOTE')
+
+    def test_only_one_worker_leads_a_key(self):
+        worker, other_worker = SingleFlight(), SingleFlight()
+        self.assertTrue(worker.claim(self.KEY))
+        self.assertFalse(worker.claim(self.KEY))
+        self.assertFalse(other_worker.claim(self.KEY))
+
+        worker.release(self.KEY)
+        self.assertTrue(other_worker.claim(self.KEY))
+
+    def test_expired_lease_is_taken_over(self):
+        crashed, worker = SingleFlight(), SingleFlight()
+        self.assertTrue(crashed.claim(self.KEY, lease_seconds=-1))
+        self.assertTrue(worker.claim(self.KEY))
+
+    def test_follower_shares_the_leaders_result(self):
+        """
+        While another worker fetches a symbol, get_quotes waits for it and
+        never calls the provider itself.
+        """
+        leader, cache = SingleFlight(), QuoteCache()
+        leader.claim(self.KEY)
+        provider = mock.Mock()
+
+        def leader_finishes(key, timeout):
+            cache.set('AAPL', 'QUOTE', Quote(symbol='AAPL', price=Decimal('190.50')).to_dict())
+            leader.release(key)
+            return True
+
+        with mock.patch('calculators.quote_cache.get_provider', return_value=provider), \
+                mock.patch.object(single_flight, 'wait', side_effect=leader_finishes):
+            quotes = cache.get_quotes(['AAPL'])
+
+        provider.get_quotes.assert_not_called()
+        self.assertEqual(quotes['AAPL'].price, Decimal('190.50'))
+        self.assertEqual(cache.stats()['coalesced'], 1)
+        self.assertEqual(cache.stats()['upstream_fetches'], 0)
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('calculators:api_market_data_stats')
+        self.client.force_login(User.objects.create_user('member'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('upstream_responses', response.json()['quote_cache'])
+
+
+class TokenBucketTest(TestCase):
+    """
+    Tests for the database-backed token bucket rate limiter.
+    """
+    def test_try_acquire_does_not_block_once_the_bucket_is_empty(self):
+        bucket = TokenBucket('test', rate=1 / 60.0, capacity=2)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        self.assertGreater(bucket.seconds_until_available(), 55)
+
+    def test_acquire_gives_up_immediately_when_the_deadline_is_too_short(self):
+        bucket = TokenBucket('test', rate=1 / 60.0, capacity=1)
+        bucket.try_acquire()
+        with mock.patch('calculators.rate_limit.time.sleep') as sleep:
+            self.assertFalse(bucket.acquire(timeout=5))
+        sleep.assert_not_called()
+
+    def test_acquire_waits_for_a_refill_within_the_deadline(self):
+        bucket = TokenBucket('test', rate=100.0, capacity=1)
+        bucket.try_acquire()
+        self.assertTrue(bucket.acquire(timeout=1))
+
+
+class MarketDataProviderTest(TestCase):
+    """
+    Tests for the market data provider implementations.
+    """
+    def setUp(self):
+        patcher = mock.patch('calculators.providers.get_market_data_limiter')
+        self.limiter = patcher.start().return_value
+        self.limiter.acquire.return_value = True
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def api_response(payload):
+        response = mock.Mock()
+        response.json.return_value = payload
+        return response
+
+    def test_bulk_quotes_are_requested_in_chunks(self):
+        provider = AlphaVantageProvider(api_key='demo', bulk=True, chunk_size=2)
+        responses = [
+            self.api_response({'data': [{'symbol': 'AAPL', 'close': '190.5'}, {'symbol': 'MSFT', 'close': '410'}]}),
+            self.api_response({'data': [{'symbol': 'TSLA', 'close': '250.25'}]}),
+        ]
+
+        with mock.patch('calculators.http_client.get', side_effect=responses) as get:
+            quotes = provider.get_quotes(['AAPL', 'msft', 'TSLA'])
+
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(get.call_args_list[0].kwargs['params']['symbol'], 'AAPL,MSFT')
+        self.assertEqual(quotes['TSLA'].price, Decimal('250.25'))
+
+    def test_falls_back_to_global_quote_without_bulk_access(self):
+        provider = AlphaVantageProvider(api_key='demo', bulk=True)
+        responses = [
+            self.api_response({'Information': 'This is a premium endpoint.'}),
+            self.api_response({'Global Quote': {'05. price': '190.50', '07. latest trading day': '2026-10-16'}}),
+            self.api_response({'Global Quote': {}}),
+        ]
+
+        with mock.patch('calculators.http_client.get', side_effect=responses):
+            quotes = provider.get_quotes(['AAPL', 'DELISTED'])
+
+        self.assertFalse(provider.bulk)
+        self.assertEqual(list(quotes), ['AAPL'])
+        self.assertEqual(quotes['AAPL'].latest_trading_day, date(2026, 10, 16))
+
+    def test_a_permit_timeout_only_skips_that_symbol(self):
+        provider = AlphaVantageProvider(api_key='demo')
+        self.limiter.acquire.side_effect = [True, False, True]
+        responses = [
+            self.api_response({'Global Quote': {'05. price': '190.50'}}),
+            self.api_response({'Global Quote': {'05. price': '250.25'}}),
+        ]
+
+        with mock.patch('calculators.http_client.get', side_effect=responses):
+            quotes = provider.get_quotes(['AAPL', 'MSFT', 'TSLA'])
+
+        self.assertEqual(sorted(quotes), ['AAPL', 'TSLA'])
+        self.assertFalse(SymbolBackoff.objects.exists())
+
+    def test_unknown_symbols_back_off_exponentially(self):
+        provider = AlphaVantageProvider(api_key='demo')
+        with mock.patch('calculators.http_client.get', return_value=self.api_response({'Global Quote': {}})) as get:
+            provider.get_quotes(['DELISTED'])
+            provider.get_quotes(['DELISTED'])
+        self.assertEqual(get.call_count, 1)
+
+        entry = SymbolBackoff.objects.get(symbol='DELISTED')
+        first_wait = entry.retry_after - entry.updated_at
+        SymbolBackoff.objects.filter(pk=entry.pk).update(retry_after=timezone.now())
+        with mock.patch('calculators.http_client.get', return_value=self.api_response({'Global Quote': {}})):
+            provider.get_quotes(['DELISTED'])
+        entry.refresh_from_db()
+        self.assertEqual(entry.failures, 2)
+        self.assertGreater(entry.retry_after - entry.updated_at, first_wait * 1.9)
+
+    # Alpha Vantage's notices, verbatim
+    PER_SECOND_NOTICE = (
+        'Thank you for using Alpha Vantage! Please consider spreading out your free API requests more sparingly '
+        '(1 request per second). You may subscribe to any of the premium plans at https://www.alphavantage.co/premium/ '
+        'to lift the free key rate limit (25 requests per day), raise the per-second burst limit, and instantly unlock '
+        'all premium endpoints'
+    )
+    DAILY_NOTICE = (
+        'We have detected your API key as demo and our standard API rate limit is 25 requests per day. Please subscribe '
+        'to any of the premium plans at https://www.alphavantage.co/premium/ to instantly remove all daily rate limits.'
+    )
+    PREMIUM_ENDPOINT_NOTICE = (
+        'Thank you for using Alpha Vantage! This is a premium endpoint. You may subscribe to any of the premium plans '
+        'at https://www.alphavantage.co/premium/ to instantly unlock all premium endpoints'
+    )
+
+    def test_rate_limit_notices_are_told_apart_from_premium_endpoints(self):
+        self.assertTrue(is_throttle_message(self.PER_SECOND_NOTICE))
+        self.assertTrue(is_throttle_message(self.DAILY_NOTICE))
+        self.assertFalse(is_throttle_message(self.PREMIUM_ENDPOINT_NOTICE))
+
+    @override_settings(MARKET_DATA_BREAKER_THRESHOLD=2)
+    def test_repeated_rate_limit_notes_open_the_circuit_breaker(self):
+        notices = [
+            self.api_response({'Information': self.PER_SECOND_NOTICE}),
+            self.api_response({'Information': self.DAILY_NOTICE}),
+        ]
+        with mock.patch('calculators.http_client.get', side_effect=notices) as get:
+            AlphaVantageProvider(api_key='demo').get_quotes(['AAPL'])
+            AlphaVantageProvider(api_key='demo').get_quotes(['MSFT'])
+            quotes = AlphaVantageProvider(api_key='demo').get_quotes(['TSLA'])
+
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(quotes, {})
+        self.assertEqual(get_market_data_breaker().state()['state'], 'open')
+        # Rate limiting says nothing about the symbols themselves
+        self.assertFalse(SymbolBackoff.objects.exists())
+
+        # Short-circuited lookups never reach upstream, so they are not counted as fetches
+        cache = QuoteCache()
+        with mock.patch('calculators.quote_cache.get_provider', return_value=AlphaVantageProvider(api_key='demo')), \
+                mock.patch('calculators.http_client.get') as get:
+            self.assertEqual(cache.get_quotes(['NVDA']), {})
+        get.assert_not_called()
+        self.assertEqual(cache.stats()['upstream_fetches'], 0)
+
+    def test_local_file_provider(self):
+        with tempfile.TemporaryDirectory() as root:
+            (Path(root) / 'daily').mkdir()
+            (Path(root) / 'quotes.json').write_text(json.dumps({'AAPL': {'price': '190.50'}, 'MSFT': 410}))
+            (Path(root) / 'daily' / 'AAPL.csv').write_text(
+                'date,open,high,low,close,adjusted_close,volume\n'
+                '2026-10-16,189,191,188,190.5,190.5,1000\n'
+                '2026-10-15,187,189,186,188,188,900\n'
+            )
+            provider = LocalFileProvider(root)
+
+            quotes = provider.get_quotes(['aapl', 'MSFT', 'TSLA'])
+            bars = provider.get_daily_bars('AAPL', since=date(2026, 10, 1))
+
+        self.assertEqual(quotes['MSFT'].price, Decimal('410'))
+        self.assertNotIn('TSLA', quotes)
+        self.assertEqual([bar.date for bar in bars], [date(2026, 10, 15), date(2026, 10, 16)])
+
+
+class HttpClientTest(TestCase):
+    """
+    Tests for the pooled upstream HTTP client.
+    """
+    def setUp(self):
+        http_client.upstream_stats.reset()
+        patcher = mock.patch('calculators.http_client.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def response(status_code):
+        response = mock.Mock()
+        response.status_code = status_code
+        return response
+
+    def test_server_errors_are_retried_with_backoff(self):
+        session = mock.Mock()
+        session.get.side_effect = [self.response(503), self.response(200)]
+
+        with mock.patch('calculators.http_client.get_session', return_value=session):
+            response = http_client.get('https://example.com', max_retries=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sleep.call_count, 1)
+        stats = http_client.upstream_stats.snapshot()
+        self.assertEqual((stats['calls'], stats['errors'], stats['retries']), (2, 1, 1))
+
+    def test_connection_errors_raise_once_retries_are_exhausted(self):
+        session = mock.Mock()
+        session.get.side_effect = http_client.requests.exceptions.ConnectionError('refused')
+
+        with mock.patch('calculators.http_client.get_session', return_value=session):
+            with self.assertRaises(http_client.requests.exceptions.ConnectionError), self.assertLogs('calculators.http_client', 'WARNING'):
+                http_client.get('https://example.com', max_retries=1)
+
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_session_is_reused_and_uses_split_timeouts(self):
+        self.assertIs(http_client.get_session(), http_client.get_session())
+        session = mock.Mock()
+        session.get.return_value = self.response(200)
+
+        with mock.patch('calculators.http_client.get_session', return_value=session):
+            http_client.get('https://example.com')
+
+        connect_timeout, read_timeout = session.get.call_args.kwargs['timeout']
+        self.assertLess(connect_timeout, read_timeout)
+
+
+class MarketCalendarTest(TestCase):
+    """
+    Tests for exchange sessions and calendar-aware price expiry.
+    """
+    def setUp(self):
+        self.calendar = load_calendar()
+        self.us = self.calendar.exchange('US')
+        self.new_york = ZoneInfo('America/New_York')
+
+    def test_builtin_holidays_and_early_closes(self):
+        self.assertFalse(self.us.is_trading_day(date(2026, 11, 26)))  # Thanksgiving
+        self.assertFalse(self.us.is_trading_day(date(2026, 4, 3)))    # Good Friday
+        self.assertTrue(self.us.is_trading_day(date(2026, 4, 6)))
+        self.assertFalse(self.calendar.exchange('UK').is_trading_day(date(2026, 4, 6)))  # Easter Monday
+        self.assertEqual(self.us.session(date(2026, 11, 27))[1].hour, 13)
+
+    def test_symbols_are_routed_by_suffix(self):
+        self.assertEqual(self.calendar.exchange_for('TSCO.LON').code, 'UK')
+        self.assertEqual(self.calendar.exchange_for('aapl').code, 'US')
+
+    def test_prices_fetched_while_closed_last_until_the_next_open(self):
+        friday_evening = datetime(2026, 10, 16, 18, 0, tzinfo=self.new_york)
+        expiry = self.calendar.price_expiry('AAPL', friday_evening, 900)
+        self.assertEqual(expiry, datetime(2026, 10, 19, 9, 30, tzinfo=self.new_york))
+
+        during_session = datetime(2026, 10, 16, 11, 0, tzinfo=self.new_york)
+        self.assertEqual(self.calendar.price_expiry('AAPL', during_session, 900) - during_session, timedelta(seconds=900))
+
+        # Just after the bell the closing price may still be settling
+        after_bell = datetime(2026, 10, 16, 16, 5, tzinfo=self.new_york)
+        self.assertEqual(self.calendar.price_expiry('AAPL', after_bell, 900) - after_bell, timedelta(seconds=900))
+
+    def test_calendar_file_adds_closures_and_venues(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = Path(root) / 'calendar.json'
+            path.write_text(json.dumps({
+                'exchanges': {
+                    'US': {'holidays': ['2026-10-19']},
+                    'XETR': {'timezone': 'Europe/Berlin', 'open': '09:00', 'close': '17:30'},
+                },
+                'suffixes': {'.DEX': 'XETR'},
+            }))
+            calendar = load_calendar(path)
+
+        self.assertFalse(calendar.exchange('US').is_trading_day(date(2026, 10, 19)))
+        self.assertFalse(calendar.exchange('US').is_trading_day(date(2026, 11, 26)))  # Built-in rules kept
+        self.assertEqual(calendar.exchange_for('SAP.DEX').tz, 'Europe/Berlin')
+
+
+class PriceHistoryTest(TestCase):
+    """
+    Tests for the incremental local daily bar store.
+    """
+    @staticmethod
+    def bar(day, close):
+        close = Decimal(close)
+        return Bar(date=day, open=close, high=close, low=close, close=close, adjusted_close=close, volume=100)
+
+    def test_full_history_first_then_incremental_upserts(self):
+        provider = mock.Mock()
+        provider.get_daily_bars.return_value = [self.bar(date(2026, 10, 14), '10'), self.bar(date(2026, 10, 15), '11')]
+        sync_daily_bars('aapl', provider=provider, today=date(2026, 10, 16))
+        provider.get_daily_bars.assert_called_with('AAPL', since=None)
+
+        provider.get_daily_bars.return_value = [self.bar(date(2026, 10, 15), '11.5'), self.bar(date(2026, 10, 16), '12')]
+        sync_daily_bars('AAPL', provider=provider, today=date(2026, 10, 19))
+        provider.get_daily_bars.assert_called_with('AAPL', since=date(2026, 10, 15))
+
+        self.assertEqual(DailyBar.objects.count(), 3)
+        self.assertEqual(DailyBar.objects.get(symbol='AAPL', date=date(2026, 10, 15)).adjusted_close, Decimal('11.5'))
+
+    def test_up_to_date_symbols_do_not_call_upstream(self):
+        provider = mock.Mock()
+        DailyBar.objects.create(
+            symbol='AAPL', date=date(2026, 10, 16), open=1, high=1, low=1, close=1, adjusted_close=1
+        )
+        # Monday: Friday's bar is the last completed session
+        self.assertEqual(sync_daily_bars('AAPL', provider=provider, today=date(2026, 10, 19)), 0)
+        provider.get_daily_bars.assert_not_called()
+
+
+class SavedScenarioListTest(TestCase):
+    """
+    Tests for the keyset-paginated saved scenario lists and detail endpoints.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_login(self.user)
+        created_at = timezone.now()
+        self.scenarios = [
+            SavedRebalanceScenario.objects.create(user=self.user, name=f'Setup {i}', holdings_data=[{'symbol': 'AAPL'}])
+            for i in range(5)
+        ]
+        # Equal timestamps for some rows: the id breaks the tie
+        SavedRebalanceScenario.objects.update(created_at=created_at)
+        SavedRebalanceScenario.objects.filter(pk=self.scenarios[0].pk).update(created_at=created_at - timedelta(days=1))
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            page = self.client.get('/calculators/api/rebalance-scenarios/', params).json()
+            ids += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        expected = [s.pk for s in reversed(self.scenarios[1:])] + [self.scenarios[0].pk]
+        self.assertEqual(ids, expected)
+
+    def test_cursor_page_seeks_the_composite_index_without_sorting(self):
+        rows = SavedRebalanceScenario.objects.filter(user=self.user).order_by('-created_at', '-id')
+        plan = past_cursor(rows, timezone.now(), self.scenarios[3].pk)[:51].explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX rebalscenario_user_created_idx (user_id=? AND created_at<?)', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_summary_mode_does_not_read_the_json_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get('/calculators/api/rebalance-scenarios/', {'summary': 'true'}).json()
+
+        self.assertEqual(set(page['results'][0]), {'id', 'name', 'created_at'})
+        self.assertFalse(any('holdings_data' in q['sql'] for q in queries))
+
+    def test_detail_returns_one_of_the_users_scenarios(self):
+        scenario = self.scenarios[2]
+        response = self.client.get(f'/calculators/api/rebalance-scenarios/{scenario.pk}/')
+        self.assertEqual(response.json()['holdings_data'], [{'symbol': 'AAPL'}])
+
+        other = SavedCapitalGainsScenario.objects.create(
+            user=User.objects.create_user(username='bob'), name='Theirs', input_data={}, result_data={},
+        )
+        self.assertEqual(self.client.get(f'/calculators/api/tax-scenarios/{other.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/calculators/api/tax-scenarios/', {'cursor': 'junk'}).status_code, 400)
+
+
+class CalculatorMemoTest(TestCase):
+    """
+    Tests for memoized calculator results.
+    """
+    url = '/calculators/api/calculate-rebalance/'
+    payload = {
+        'holdings': [{'symbol': 'AAPL', 'value': '600', 'category': 'Stocks'}, {'symbol': 'BND', 'value': '400', 'category': 'Bonds'}],
+        'categories': [{'name': 'Stocks', 'target': 50}, {'name': 'Bonds', 'target': 50}],
+    }
+
+    def setUp(self):
+        result_memo.cache.clear()
+        result_memo.reset_stats()
+
+    def post(self, payload, **extra):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json', **extra)
+
+    def test_identical_requests_are_computed_once(self):
+        with mock.patch('calculators.views.RebalanceAPIView.calculate', autospec=True,
+                        side_effect=lambda view, data: Response({'total_portfolio_value': '1000.00'})) as calculate:
+            first = self.post(self.payload)
+            # Same content, different formatting: the validated data is identical
+            second = self.post({**self.payload, 'holdings': [{**h, 'value': f"{h['value']}.00"} for h in self.payload['holdings']]})
+
+        self.assertEqual(calculate.call_count, 1)
+        self.assertEqual((first['X-Result-Cache'], second['X-Result-Cache']), ('miss', 'hit'))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(result_memo.stats()['hit_rate'], 0.5)
+
+    def test_bypass_recomputes_and_errors_are_not_stored(self):
+        self.post(self.payload)
+        response = self.post(self.payload, HTTP_CACHE_CONTROL='no-cache')
+        self.assertEqual(response['X-Result-Cache'], 'bypass')
+
+        zero = {**self.payload, 'holdings': [{'symbol': 'AAPL', 'value': '0', 'category': 'Stocks'}]}
+        self.assertEqual(self.post(zero).status_code, 400)
+        self.assertEqual(self.post(zero)['X-Result-Cache'], 'miss')
+
+    def test_key_ignores_dict_order_but_not_calculator(self):
+        self.assertEqual(payload_key('rebalance', {'a': 1, 'b': 2}), payload_key('rebalance', {'b': 2, 'a': 1}))
+        self.assertNotEqual(payload_key('rebalance', {'a': 1}), payload_key('reprice', {'a': 1}))
+
+
+class PdfCacheTest(TestCase):
+    """
+    Tests for the rendered-PDF cache.
+    """
+    gains = {
+        'purchase_lots': [{'date': '2023-01-02', 'quantity': '10', 'price': '100', 'fees': '0'}],
+        'sale': {'date': '2024-06-01', 'quantity': '10', 'price': '150', 'fees': '0'},
+        'results': {'net_gain_loss': '500.00'},
+        'summary': {'asset_name': 'ACME', 'jurisdiction': 'UK'},
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(PDF_CACHE_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def export(self, data):
+        return self.client.post('/calculators/api/tax-export-pdf/', json.dumps(data), content_type='application/json')
+
+    def test_repeat_export_is_served_from_the_cache(self):
+        with mock.patch('calculators.pdf.render_html_pdf', return_value=b'%PDF-1.4 report') as render:
+            first = self.export(self.gains)
+            second = self.export(self.gains)
+            changed = self.export({**self.gains, 'results': {'net_gain_loss': '400.00'}})
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual((first['X-Result-Cache'], second['X-Result-Cache']), ('miss', 'hit'))
+        self.assertEqual(b''.join(second.streaming_content), b'%PDF-1.4 report')
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertNotEqual(first['ETag'], changed['ETag'])
+
+    def test_saved_scenario_pdf_supports_conditional_get(self):
+        user = User.objects.create_user(username='alice')
+        self.client.force_login(user)
+        input_data = {key: self.gains[key] for key in ('purchase_lots', 'sale')}
+        result_data = {key: self.gains[key] for key in ('results', 'summary')}
+        scenario = SavedCapitalGainsScenario.objects.create(user=user, name='Sale', input_data=input_data, result_data=result_data)
+        url = f'/calculators/api/tax-scenarios/{scenario.pk}/pdf/'
+
+        with mock.patch('calculators.pdf.render_html_pdf', return_value=b'%PDF-1.4 report') as render:
+            response = self.client.get(url)
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            exported = self.export(self.gains)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(revalidated.status_code, 304)
+        # The dashboard's export of the same scenario shares the cached file
+        self.assertEqual(exported['ETag'], response['ETag'])
+        self.assertEqual(render.call_count, 1)
+
+    def test_fingerprint_covers_extended_and_included_templates(self):
+        with tempfile.TemporaryDirectory() as root:
+            (Path(root) / 'base.html').write_text('<h1>{% block title %}{% endblock %}</h1>{% include "footer.html" %}')
+            (Path(root) / 'footer.html').write_text('Generated by StockSavvy')
+            (Path(root) / 'report.html').write_text('{% extends "base.html" %}{% block title %}Report{% endblock %}')
+
+            def fingerprint():
+                templates = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [root]}]
+                with override_settings(TEMPLATES=templates):
+                    return template_fingerprint('report.html')
+
+            before = fingerprint()
+            (Path(root) / 'footer.html').write_text('Generated by StockSavvy, 2026')
+            self.assertNotEqual(fingerprint(), before)
+
+        # A deploy-time version bump invalidates everything else
+        with override_settings(PDF_CACHE_VERSION='2'):
+            bumped = report_key(before, {})
+        self.assertNotEqual(report_key(before, {}), bumped)
+
+    def test_least_recently_used_files_are_evicted_beyond_the_size_bound(self):
+        cache = PdfCache(directory=pdf_cache.directory, max_bytes=250)
+        for age, key in ((20, 'a'), (10, 'b')):
+            path = cache.put(key, b'x' * 100)
+            os.utime(path, (time.time() - age, time.time() - age))
+        cache.get('a')  # Now the most recently used
+        cache.put('c', b'x' * 100)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_rebalance_plan_is_rendered_and_cached(self):
+        payload = {
+            'holdings': [{'symbol': 'AAPL', 'value': '600', 'category': 'Stocks'}],
+            'categories': [{'name': 'Stocks', 'target': 100}],
+        }
+        result = self.client.post('/calculators/api/calculate-rebalance/', json.dumps(payload), content_type='application/json').json()
+        responses = [
+            self.client.post('/calculators/api/rebalance-export-pdf/', json.dumps(result), content_type='application/json')
+            for _ in range(2)
+        ]
+
+        self.assertEqual([r['X-Result-Cache'] for r in responses], ['miss', 'hit'])
+        self.assertTrue(b''.join(responses[1].streaming_content).startswith(b'%PDF'))
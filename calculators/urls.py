@@ -30,10 +30,14 @@ urlpatterns = [
     path('api/tax-scenarios/', views.SavedCapitalGainsScenarioAPIView.as_view(), name='api_tax_scenarios_list_create'),
     path('api/tax-scenarios/<int:pk>/', views.SavedCapitalGainsScenarioAPIView.as_view(), name='api_tax_scenarios_delete'),
     path('api/tax-export-pdf/', views.ExportCapitalGainsPDFView.as_view(), name='api_tax_export_pdf'),
+    path('api/tax-scenarios/<int:pk>/pdf/', views.SavedCapitalGainsScenarioPDFView.as_view(), name='api_tax_scenario_pdf'),
 
     # --- NEW: Saved Scenarios (Rebalance) ---
     # ADD "views." prefix here!
     path('api/rebalance-scenarios/', views.SavedRebalanceScenarioAPIView.as_view(), name='rebalance_scenarios_list'),
     path('api/rebalance-scenarios/<int:pk>/', views.SavedRebalanceScenarioAPIView.as_view(), name='rebalance_scenarios_detail'),
     path('api/rebalance-export-pdf/', views.ExportRebalancePDFView.as_view(), name='api_rebalance_export_pdf'),
-]
\ No newline at end of file
+
+    # Market data counters (staff only, per worker process)
+    path('api/market-data/stats/', views.MarketDataStatsAPIView.as_view(), name='api_market_data_stats'),
+]
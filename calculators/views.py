@@ -1,7 +1,4 @@
 # calculators/views.py
-import io
-import os
-import requests
 from datetime import datetime, timedelta
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
@@ -23,7 +20,7 @@ from .serializers import (
 
 # Model Imports
 # This was the missing piece causing the NameError
-from .models import SavedRepriceStrategy, SavedCapitalGainsScenario, SavedRebalanceScenario
+from .models import SavedRepriceStrategy, SavedCapitalGainsScenario, SavedRebalanceScenario, SymbolBackoff
 
 # Engine Imports
 from .tax_engine import (
@@ -34,13 +31,15 @@ from .tax_engine import (
 )
 from .reprice_engine import calculate_reprice_by_shares, calculate_reprice_by_target
 
-from .utils import render_to_pdf
+from . import http_client
+from .circuit_breaker import get_market_data_breaker
+from .memo import result_memo
+from .pagination import InvalidCursor, keyset_page
+from .pdf_cache import pdf_cache, pdf_response, template_fingerprint
 from django.http import HttpResponse
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+# PDF rendering (reportlab, xhtml2pdf) lives in .pdf and is imported on first export.
+
 # --- Page Views ---
 
 @login_required
@@ -84,39 +83,6 @@ def rebalance_dashboard_view(request):
     return render(request, 'calculators/rebalance_dashboard.html')
 
 
-# --- Helper function for Alpha Vantage API calls ---
-def get_alpha_vantage_data(symbol, function):
-    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-    if not api_key:
-        return {'error': 'Alpha Vantage API key not found.'}
-    
-    url = f"https://www.alphavantage.co/query?function={function}&symbol={symbol}&outputsize=full&apikey={api_key}"
-    
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        
-        if "Error Message" in data or "Note" in data or "Information" in data:
-            error_message = data.get("Error Message", data.get("Note", data.get("Information", "API error.")))
-            if 'premium endpoint' in error_message.lower():
-                return {'error': f'Historical dividend data for "{symbol}" is a premium feature and is currently unavailable.'}
-            return {'error': error_message}
-            
-        if not data or "Time Series (Daily)" not in data:
-            # For GLOBAL_QUOTE, the key is "Global Quote", not Time Series
-            if function == 'GLOBAL_QUOTE' and 'Global Quote' in data:
-                 return data
-            elif function == 'TIME_SERIES_DAILY_ADJUSTED':
-                 return data
-            else:
-                 return {'error': f'Invalid or empty response from API for symbol {symbol}.'}
-            
-        return data
-
-    except requests.exceptions.RequestException as e:
-        return {'error': f"Network error: {e}"}
-
 # --- API Views ---
 
 class CapitalGainsAPIView(APIView):
@@ -127,6 +93,9 @@ class CapitalGainsAPIView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
+        return result_memo.respond(request, 'capital_gains', data, lambda: self.calculate(data))
+
+    def calculate(self, data):
         purchase_lots = data['purchase_lots']
         sale_details = data['sale']
         tax_profile = data['tax_profile']
@@ -183,6 +152,9 @@ class RepriceAPIView(APIView):
             return Response({'error': first_error}, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
+        return result_memo.respond(request, 'reprice', data, lambda: self.calculate(data))
+
+    def calculate(self, data):
         position = data['position']
         strategy = data['strategy']
         
@@ -206,6 +178,9 @@ class RebalanceAPIView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
+        return result_memo.respond(request, 'rebalance', data, lambda: self.calculate(data))
+
+    def calculate(self, data):
         holdings = data['holdings']
         categories = data['categories']
 
@@ -253,17 +228,40 @@ class RebalanceAPIView(APIView):
 
         return Response(response_data, status=status.HTTP_200_OK)
 
+def saved_list_response(request, queryset, serializer_class):
+    """
+    Keyset-paginated list of saved rows, newest first:
+    {"results": [...], "next_cursor": "..." or null}. Pass ?cursor= to get
+    the next page, ?limit= (max 200) for the page size, and ?summary=true
+    for just id, name and created_at without loading the JSON columns.
+    """
+    try:
+        page = keyset_page(queryset, request.query_params, serializer_class)
+    except InvalidCursor as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(page, status=status.HTTP_200_OK)
+
+
+def saved_detail_response(queryset, pk, serializer_class, not_found):
+    """ A single saved row of the user, with all of its data. """
+    try:
+        return Response(serializer_class(queryset.get(pk=pk)).data, status=status.HTTP_200_OK)
+    except queryset.model.DoesNotExist:
+        return Response({'error': not_found}, status=status.HTTP_404_NOT_FOUND)
+
+
 class SavedRepriceStrategyAPIView(APIView):
     """ Handles listing, creating, and deleting saved strategies. """
     
-    def get(self, request, *args, **kwargs):
-        """ List all saved strategies for the logged-in user. """
+    def get(self, request, pk=None, *args, **kwargs):
+        """ One page of the user's saved strategies, or with `pk` a single strategy. """
         if not request.user.is_authenticated:
              return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
-        
+
         strategies = SavedRepriceStrategy.objects.filter(user=request.user)
-        serializer = SavedRepriceStrategySerializer(strategies, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if pk is not None:
+            return saved_detail_response(strategies, pk, SavedRepriceStrategySerializer, 'Strategy not found')
+        return saved_list_response(request, strategies, SavedRepriceStrategySerializer)
 
     def post(self, request, *args, **kwargs):
         """ Save a new strategy. """
@@ -288,6 +286,30 @@ class SavedRepriceStrategyAPIView(APIView):
         except SavedRepriceStrategy.DoesNotExist:
             return Response({'error': 'Strategy not found'}, status=status.HTTP_404_NOT_FOUND)
     
+def html_pdf_response(request, template_src, context, filename):
+    """ A template rendered to PDF through the PDF cache; None if rendering failed. """
+    def render():
+        from .pdf import render_html_pdf  # Loads xhtml2pdf on first export only
+        return render_html_pdf(template_src, context)
+
+    return pdf_response(request, template_fingerprint(template_src), context, render, filename)
+
+
+def capital_gains_pdf_response(request, data):
+    """ The tax report for a capital gains result ('input_data' merged with 'result_data'). """
+    context = {
+        'purchase_lots': data.get('purchase_lots', []),
+        'sale': data.get('sale', {}),
+        'results': data.get('results', {}),
+        'summary': data.get('summary', {}),
+    }
+    filename = f"TaxReport_{data.get('summary', {}).get('asset_name', 'Asset')}.pdf"
+    response = html_pdf_response(request, 'calculators/pdf_capital_gains.html', context, filename)
+    if response is not None:
+        return response
+    return Response({'error': 'Failed to generate PDF'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class ExportRepricePDFView(APIView):
     def post(self, request, *args, **kwargs):
         data = request.data
@@ -308,24 +330,23 @@ class ExportRepricePDFView(APIView):
             }
         }
 
-        pdf = render_to_pdf('calculators/pdf_report.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = f"StockSavvy_Report.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response = html_pdf_response(request, 'calculators/pdf_report.html', context, "StockSavvy_Report.pdf")
+        if response is not None:
             return response
         return Response({'error': 'Failed to generate PDF'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 class SavedCapitalGainsScenarioAPIView(APIView):
     """ Handles listing, creating, and deleting saved tax scenarios. """
     
-    def get(self, request, *args, **kwargs):
+    def get(self, request, pk=None, *args, **kwargs):
+        """ One page of the user's saved scenarios, or with `pk` a single scenario. """
         if not request.user.is_authenticated:
              return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
-        
+
         scenarios = SavedCapitalGainsScenario.objects.filter(user=request.user)
-        serializer = SavedCapitalGainsScenarioSerializer(scenarios, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if pk is not None:
+            return saved_detail_response(scenarios, pk, SavedCapitalGainsScenarioSerializer, 'Scenario not found')
+        return saved_list_response(request, scenarios, SavedCapitalGainsScenarioSerializer)
 
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -356,32 +377,34 @@ class ExportCapitalGainsPDFView(APIView):
         # We expect the frontend to pass the full 'input_data' and 'result_data' structure
         # This matches how we save scenarios, making the data structure consistent.
         
-        context = {
-            'purchase_lots': data.get('purchase_lots', []),
-            'sale': data.get('sale', {}),
-            'results': data.get('results', {}),
-            'summary': data.get('summary', {}),
-        }
-        
-        pdf = render_to_pdf('calculators/pdf_capital_gains.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = f"TaxReport_{data.get('summary', {}).get('asset_name', 'Asset')}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
-        return Response({'error': 'Failed to generate PDF'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return capital_gains_pdf_response(request, data)
     
+class SavedCapitalGainsScenarioPDFView(APIView):
+    """ The tax report of a saved scenario. Supports conditional GET, so re-downloading an unchanged one costs a 304. """
+
+    def get(self, request, pk, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            scenario = SavedCapitalGainsScenario.objects.get(pk=pk, user=request.user)
+        except SavedCapitalGainsScenario.DoesNotExist:
+            return Response({'error': 'Scenario not found'}, status=status.HTTP_404_NOT_FOUND)
+        # Same shape the dashboard posts to the export endpoint
+        return capital_gains_pdf_response(request, {**scenario.input_data, **scenario.result_data})
+
 class SavedRebalanceScenarioAPIView(APIView):
     """ Handles listing, creating, and deleting saved rebalance scenarios. """
 
-    def get(self, request, *args, **kwargs):
-        """ List all saved scenarios for the logged-in user. """
+    def get(self, request, pk=None, *args, **kwargs):
+        """ One page of the user's saved scenarios, or with `pk` a single scenario. """
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        scenarios = SavedRebalanceScenario.objects.filter(user=request.user).order_by('-created_at')
-        serializer = SavedRebalanceScenarioSerializer(scenarios, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        scenarios = SavedRebalanceScenario.objects.filter(user=request.user)
+        if pk is not None:
+            return saved_detail_response(scenarios, pk, SavedRebalanceScenarioSerializer, 'Scenario not found')
+        return saved_list_response(request, scenarios, SavedRebalanceScenarioSerializer)
 
     def post(self, request, *args, **kwargs):
         """ Save a new scenario. """
@@ -412,97 +435,37 @@ class ExportRebalancePDFView(APIView):
     Receives the calculation result JSON from the frontend.
     """
     def post(self, request, *args, **kwargs):
-        data = request.data
-        
-        # Create a file-like buffer to receive PDF data
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-
-        # 1. Header
-        elements.append(Paragraph("Portfolio Rebalancing Plan", styles['Title']))
-        elements.append(Paragraph(f"Generated on: {timezone.now().strftime('%Y-%m-%d')}", styles['Normal']))
-        elements.append(Spacer(1, 12))
-        
-        # 2. Total Value
-        total_value = data.get('total_portfolio_value', 0)
-        elements.append(Paragraph(f"<b>Total Portfolio Value:</b> ${float(total_value):,.2f}", styles['Normal']))
-        elements.append(Spacer(1, 20))
-
-        # 3. Allocation Summary Table
-        elements.append(Paragraph("<b>Allocation Summary</b>", styles['Heading2']))
-        elements.append(Spacer(1, 10))
-        
-        # Table Header
-        table_data = [['Category', 'Current %', 'Target %', 'Current $', 'Target $', 'Difference']]
-        
-        # Table Rows
-        target_allocation = data.get('target_allocation', {})
-        current_allocation = data.get('current_allocation', {})
-        
-        for category, target_info in target_allocation.items():
-            current_info = current_allocation.get(category, {})
-            
-            # Format numbers
-            curr_pct = f"{current_info.get('percent', 0)}%"
-            tgt_pct = f"{target_info.get('percent', 0)}%"
-            curr_val = f"${float(current_info.get('value', 0)):,.2f}"
-            tgt_val = f"${float(target_info.get('value', 0)):,.2f}"
-            
-            # Calculate diff for display
-            diff = float(target_info.get('value', 0)) - float(current_info.get('value', 0))
-            diff_str = f"${diff:,.2f}"
-            if diff > 0: diff_str = f"+{diff_str}"
-            
-            table_data.append([category, curr_pct, tgt_pct, curr_val, tgt_val, diff_str])
-
-        # Draw Table 1
-        t1 = Table(table_data)
-        t1.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(t1)
-        elements.append(Spacer(1, 20))
-
-        # 4. Actionable Orders Table
-        elements.append(Paragraph("<b>Actionable Orders</b>", styles['Heading2']))
-        elements.append(Spacer(1, 10))
-        
-        orders_data = [['Action', 'Asset/Category', 'Amount']]
-        rebalancing_orders = data.get('rebalancing_orders', [])
-        
-        for order in rebalancing_orders:
-            if order['action'] == 'HOLD':
-                continue
-            
-            amount = f"${abs(float(order['difference_value'])):,.2f}"
-            orders_data.append([order['action'], order['category'], amount])
-            
-        if len(orders_data) > 1:
-            t2 = Table(orders_data, colWidths=[100, 200, 100])
-            t2.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.navy),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            elements.append(t2)
-        else:
-            elements.append(Paragraph("No trades needed. Your portfolio is balanced.", styles['Normal']))
-
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
-        
-        # Return as File Download
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="rebalancing_plan.pdf"'
-        return response
\ No newline at end of file
+        def render():
+            from . import pdf  # Loads reportlab on first export only
+            return pdf.rebalance_plan_pdf(request.data, generated_on)
+
+        # The date is printed on the plan, so it is part of the cache key
+        generated_on = timezone.now().date()
+        context = {'data': request.data, 'generated_on': generated_on}
+        return pdf_response(request, 'reportlab:rebalance_plan', context, render, 'rebalancing_plan.pdf')
+
+class MarketDataStatsAPIView(APIView):
+    """
+    Staff-only view of market data health: this worker's counters plus shared
+    breaker/backoff state, and the calculator result and PDF cache hit rates.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+        if not request.user.is_staff:
+            return Response({'error': 'Staff access required'}, status=status.HTTP_403_FORBIDDEN)
+
+        from .quote_cache import quote_cache
+        from .single_flight import single_flight
+
+        backoff = SymbolBackoff.objects.filter(retry_after__gt=timezone.now()).order_by('retry_after')
+        return Response({
+            'quote_cache': quote_cache.stats(),
+            'single_flight': single_flight.stats(),
+            'upstream_http': http_client.upstream_stats.snapshot(),
+            'circuit_breaker': get_market_data_breaker().state(),
+            'symbols_in_backoff': list(backoff.values('symbol', 'failures', 'retry_after', 'last_error')),
+            'calculator_memo': result_memo.stats(),
+            'pdf_cache': pdf_cache.stats(),
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,118 @@
+# core/management/commands/benchmark_startup.py
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter per measurement; prints one JSON line on stdout
+PROBE = '''
+import json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_savvy_project.settings')
+{code}
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'heavy': sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r})),
+}}))
+'''
+
+TARGETS = {
+    'wsgi': 'import stock_savvy_project.wsgi',
+    'asgi': 'import stock_savvy_project.asgi',
+    # The WSGI app plus every URLconf and view module, as after the first request
+    'wsgi+urls': (
+        'import stock_savvy_project.wsgi\n'
+        'from django.urls import get_resolver\n'
+        'get_resolver().url_patterns'
+    ),
+}
+# Setup plus the command module and its imports: what `manage.py <command>` pays before handle()
+COMMAND_PROBE = (
+    'import django\n'
+    'django.setup()\n'
+    'from django.core.management import get_commands, load_command_class\n'
+    "load_command_class(get_commands()[{name!r}], {name!r})"
+)
+DEFAULT_COMMANDS = ['refresh_prices', 'record_snapshots', 'sync_price_history']
+
+# Packages that should only load on first use
+HEAVY_PACKAGES = ('reportlab', 'xhtml2pdf', 'pandas', 'numpy')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures start-up cost (wall time, peak RSS, modules loaded and the slowest imports from '
+        '`python -X importtime`) of the WSGI/ASGI apps and of management commands, each in a fresh interpreter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--command', action='append', dest='commands',
+                            help=f'Command to measure (repeatable; default: {", ".join(DEFAULT_COMMANDS)}).')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per target; medians are reported (default: 3).')
+        parser.add_argument('--top', type=int, default=8, help='Slowest top-level imports to list (default: 8).')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results, e.g. to track over time.')
+
+    def handle(self, *args, **options):
+        targets = dict(TARGETS)
+        for name in options['commands'] or DEFAULT_COMMANDS:
+            targets[f'manage.py {name}'] = COMMAND_PROBE.format(name=name)
+
+        results = {label: self.measure(code, options['repeat'], options['top']) for label, code in targets.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for label, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            self.stdout.write(
+                f"  {result['seconds'] * 1000:.0f} ms, peak RSS {result['max_rss_kb'] / 1024:.1f} MB, "
+                f"{result['modules']} modules"
+            )
+            if result['heavy']:
+                self.stdout.write(self.style.WARNING(f"  loads at start-up: {', '.join(result['heavy'])}"))
+            for package, microseconds in result['slowest_imports']:
+                self.stdout.write(f'  {microseconds / 1000:8.1f} ms  {package}')
+
+    def measure(self, code, repeat, top):
+        probe = PROBE.format(code=code, heavy=HEAVY_PACKAGES)
+        runs = []
+        for _ in range(max(repeat, 1)):
+            completed = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', probe],
+                cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                raise CommandError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'Probe failed.')
+            run = json.loads(completed.stdout.strip().splitlines()[-1])
+            run['imports'] = parse_importtime(completed.stderr)
+            runs.append(run)
+
+        slowest = sorted(runs[-1]['imports'].items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            'seconds': statistics.median(run['seconds'] for run in runs),
+            'max_rss_kb': statistics.median(run['max_rss_kb'] for run in runs),
+            'modules': runs[-1]['modules'],
+            'heavy': runs[-1]['heavy'],
+            'slowest_imports': slowest,
+        }
+
+
+def parse_importtime(stderr):
+    """ {top-level package: microseconds spent importing its modules} from `-X importtime` output. """
+    spent = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue  # Header row
+        # Self time, so nested imports count towards their own package rather than the importer's
+        package = name.strip().split('.')[0]
+        spent[package] = spent.get(package, 0) + int(own)
+    return spent
@@ -1,6 +1,8 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.urls import reverse
 
+from .management.commands.benchmark_startup import TARGETS, Command as BenchmarkStartupCommand, parse_importtime
+
 class LandingPageTest(TestCase):
     """
     Tests to ensure the landing page functions correctly.
@@ -14,4 +16,24 @@ class LandingPageTest(TestCase):
         response = self.client.get(reverse('home'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'core/landing_page.html')
-        self.assertTemplateUsed(response, 'base.html')
\ No newline at end of file
+        self.assertTemplateUsed(response, 'base.html')
+
+
+class StartupBenchmarkTest(SimpleTestCase):
+    """
+    Tests for the start-up benchmark and the lazily loaded PDF stack.
+    """
+    def test_importtime_output_is_attributed_by_package(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 |   reportlab.lib\n'
+            'import time:        50 |        150 | reportlab\n'
+            'import time:        20 |         20 | json\n'
+        )
+        self.assertEqual(parse_importtime(stderr), {'reportlab': 150, 'json': 20})
+
+    def test_serving_requests_does_not_load_the_pdf_libraries(self):
+        result = BenchmarkStartupCommand().measure(TARGETS['wsgi+urls'], repeat=1, top=3)
+        self.assertEqual(result['heavy'], [])
+        self.assertGreater(result['max_rss_kb'], 0)
+
@@ -0,0 +1,60 @@
+# portfolio/charting.py
+"""
+Server-side downsampling for the performance chart.
+
+Largest-Triangle-Three-Buckets (LTTB) keeps the points that contribute most
+to the visual shape of a series (peaks, troughs, turning points), so a few
+hundred points draw the same line as several thousand.
+"""
+from typing import List, Sequence, Tuple
+
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """
+    Returns the indices of the `threshold` points of `points` ((x, y) pairs
+    with ascending x) chosen by LTTB. The first and last points are always kept.
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+    if threshold <= 2:
+        return [0, n - 1][:max(threshold, 0)]
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_len = next_end - next_start
+        avg_x = sum(points[j][0] for j in range(next_start, next_end)) / next_len
+        avg_y = sum(points[j][1] for j in range(next_start, next_end)) / next_len
+
+        # Pick the point in this bucket forming the largest triangle
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
+
+
+def downsample_series(dates, values, max_points):
+    """ Downsamples parallel date/value lists to at most `max_points` points. """
+    if len(dates) <= max_points:
+        return list(dates), list(values)
+    points = [(d.toordinal(), v) for d, v in zip(dates, values)]
+    keep = lttb(points, max_points)
+    return [dates[i] for i in keep], [values[i] for i in keep]
@@ -0,0 +1,129 @@
+# portfolio/exports.py
+"""
+Streaming CSV / NDJSON exports of a user's data.
+
+Rows are read with a server-side iterator in chunks of EXPORT_CHUNK_SIZE
+and encoded one line at a time, so memory stays flat however many rows are
+exported. Under ASGI the rows come from an async iterator; Django would
+otherwise buffer a synchronous iterator in full before sending it.
+"""
+import csv
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from calculators.models import SavedCapitalGainsScenario, SavedRebalanceScenario
+from .models import PortfolioSnapshot, StockHolding
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+CONTENT_TYPES = {CSV: 'text/csv', NDJSON: 'application/x-ndjson'}
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class Export:
+    """ One exportable dataset: the model, its columns and a stable row order. """
+    model: type
+    fields: tuple
+    ordering: tuple
+    json_fields: tuple = ()
+
+    def columns(self, all_users=False):
+        return (('user_id',) if all_users else ()) + self.fields
+
+    def queryset(self, user=None):
+        """ Rows of `user`, or of every user when None. """
+        rows = self.model.objects.all()
+        if user is not None:
+            rows = rows.filter(user=user)
+            ordering = self.ordering
+        else:
+            ordering = ('user_id',) + self.ordering
+        return rows.order_by(*ordering).values_list(*self.columns(all_users=user is None))
+
+
+EXPORTS = {
+    'holdings': Export(
+        StockHolding,
+        ('id', 'stock_symbol', 'quantity', 'purchase_price', 'purchase_date', 'last_price', 'last_updated'),
+        ('id',),
+    ),
+    'snapshots': Export(PortfolioSnapshot, ('date', 'total_value'), ('date',)),
+    'capital-gains-scenarios': Export(
+        SavedCapitalGainsScenario,
+        ('id', 'name', 'created_at', 'input_data', 'result_data'),
+        ('created_at', 'id'),
+        json_fields=('input_data', 'result_data'),
+    ),
+    'rebalance-scenarios': Export(
+        SavedRebalanceScenario,
+        ('id', 'name', 'created_at', 'holdings_data', 'categories_data'),
+        ('created_at', 'id'),
+        json_fields=('holdings_data', 'categories_data'),
+    ),
+}
+
+
+class _Echo:
+    """ A file-like object whose write() returns the line instead of storing it. """
+    def write(self, value):
+        return value
+
+
+def line_encoder(export, fmt, all_users=False):
+    """ Returns (header line or None, function turning a values_list row into a line). """
+    columns = export.columns(all_users)
+    if fmt == NDJSON:
+        def encode(row):
+            return json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+        return None, encode
+
+    writer = csv.writer(_Echo())
+    json_positions = {columns.index(field) for field in export.json_fields}
+
+    def cell(position, value):
+        if position in json_positions:
+            return json.dumps(value, cls=DjangoJSONEncoder)
+        if value is None:
+            return ''
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def encode(row):
+        return writer.writerow([cell(position, value) for position, value in enumerate(row)])
+    return writer.writerow(columns), encode
+
+
+def stream_rows(queryset, header, encode, chunk_size=EXPORT_CHUNK_SIZE):
+    if header:
+        yield header
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield encode(row)
+
+
+async def astream_rows(queryset, header, encode, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Async twin of stream_rows: each chunk is fetched in the ORM's thread.
+    (QuerySet.aiterator() cannot be used: for values_list() querysets it
+    runs the query in the event loop.)
+    """
+    if header:
+        yield header
+    rows = queryset.iterator(chunk_size=chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+        chunk = await fetch()
+        for row in chunk:
+            yield encode(row)
+        if len(chunk) < chunk_size:
+            break
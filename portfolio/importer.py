@@ -0,0 +1,134 @@
+# portfolio/importer.py
+"""
+Streaming import of broker transaction histories as StockHolding lots.
+
+Rows are read one at a time from a CSV or NDJSON text stream, validated
+with the StockHoldingSerializer field rules and written in chunks: one
+bulk INSERT plus one aggregate update per chunk, each chunk in its own
+transaction. Memory stays bounded by the chunk size (and the capped list of
+reported errors), whatever the size of the file.
+
+Valid rows are imported even when others fail; every failure is reported
+with its 1-based row number (the CSV header is not counted).
+"""
+import csv
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import StockHolding
+from .positions import apply_lot_changes
+from .serializers import StockHoldingSerializer
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_ERRORS = 100
+
+# Common broker export column names -> StockHolding fields
+COLUMN_ALIASES = {
+    'symbol': 'stock_symbol',
+    'ticker': 'stock_symbol',
+    'shares': 'quantity',
+    'qty': 'quantity',
+    'price': 'purchase_price',
+    'cost_basis_per_share': 'purchase_price',
+    'date': 'purchase_date',
+    'trade_date': 'purchase_date',
+}
+# Columns naming the transaction type; only purchases become lots
+ACTION_COLUMNS = ('action', 'side', 'type')
+BUY_ACTIONS = {'', 'buy', 'bought', 'purchase'}
+
+
+def format_for(filename, default=CSV):
+    """ The import format implied by a file name. """
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return NDJSON
+    if name.endswith('.csv'):
+        return CSV
+    return default
+
+
+def iter_rows(stream, fmt=CSV):
+    """ Yields (row number, dict or parse error string) from a text stream. """
+    if fmt == NDJSON:
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, f'Invalid JSON: {exc}'
+                continue
+            yield number, row if isinstance(row, dict) else 'Expected a JSON object.'
+    else:
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+
+
+def normalise_row(row):
+    """ Maps aliased column names onto the serializer fields. Returns None for non-purchase rows. """
+    fields = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip().lower().replace(' ', '_')
+        if key in ACTION_COLUMNS:
+            if str(value or '').strip().lower() not in BUY_ACTIONS:
+                return None
+            continue
+        fields[COLUMN_ALIASES.get(key, key)] = value.strip() if isinstance(value, str) else value
+    return fields
+
+
+def import_holdings(user, stream, fmt=CSV, batch_size=DEFAULT_BATCH_SIZE, max_errors=DEFAULT_MAX_ERRORS, dry_run=False):
+    """
+    Imports every valid row of `stream` as a lot of `user`. Returns
+    {'imported', 'skipped', 'error_count', 'errors': [{'row', 'errors'}]}
+    with at most `max_errors` errors listed.
+    """
+    result = {'imported': 0, 'skipped': 0, 'error_count': 0, 'errors': []}
+    # One serializer validates every row, so its fields are built once
+    serializer = StockHoldingSerializer()
+    batch = []
+
+    def report(number, errors):
+        result['error_count'] += 1
+        if len(result['errors']) < max_errors:
+            result['errors'].append({'row': number, 'errors': errors})
+
+    for number, row in iter_rows(stream, fmt):
+        if isinstance(row, str):
+            report(number, {'non_field_errors': [row]})
+            continue
+        fields = normalise_row(row)
+        if fields is None:
+            result['skipped'] += 1
+            continue
+        try:
+            validated = serializer.run_validation(fields)
+        except serializers.ValidationError as exc:
+            report(number, exc.detail)
+            continue
+        batch.append(StockHolding(user=user, **validated))
+        if len(batch) >= batch_size:
+            result['imported'] += _write(user, batch, dry_run)
+            batch = []
+
+    if batch:
+        result['imported'] += _write(user, batch, dry_run)
+    return result
+
+
+def _write(user, lots, dry_run):
+    if dry_run:
+        return len(lots)
+    with transaction.atomic():
+        StockHolding.objects.bulk_create(lots)
+        apply_lot_changes(user.id, added=lots)
+    return len(lots)
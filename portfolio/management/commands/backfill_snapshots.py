@@ -0,0 +1,155 @@
+# portfolio/management/commands/backfill_snapshots.py
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from portfolio.models import StockHolding, PortfolioSnapshot
+from calculators.models import DailyBar
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds daily portfolio values from each holding\'s purchase date using locally '
+        'stored closes (see sync_price_history). Makes no upstream API calls.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='How many days back to backfill (default: 365).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date to backfill, YYYY-MM-DD (default: yesterday).')
+        parser.add_argument('--user', action='append', dest='usernames', help='Only backfill these users (repeatable).')
+        parser.add_argument('--overwrite', action='store_true', help='Replace existing snapshots instead of keeping them.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users valued per NumPy pass (default: 500).')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Snapshots per bulk INSERT (default: 2000).')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+        end = options['end'] or timezone.now().date() - timedelta(days=1)
+        start = end - timedelta(days=options['days'])
+
+        # 1. Every lot, in one query
+        holdings = StockHolding.objects.filter(purchase_date__lte=end).order_by()
+        if options['usernames']:
+            holdings = holdings.filter(user__username__in=options['usernames'])
+        lots = list(
+            holdings.annotate(symbol=Upper('stock_symbol'))
+            .values_list('user_id', 'symbol', 'quantity', 'purchase_date')
+        )
+        if not lots:
+            self.stdout.write('No holdings to backfill.')
+            return
+
+        # 2. Dense date x symbol price array from stored closes
+        symbols = sorted({symbol for _, symbol, _, _ in lots})
+        dates, prices = self.price_matrix(symbols, start, end)
+        if not dates:
+            raise CommandError('No stored daily prices in range. Run sync_price_history first.')
+
+        missing = [s for i, s in enumerate(symbols) if np.isnan(prices[:, i]).all()]
+        if missing:
+            self.stdout.write(self.style.WARNING(f"No stored prices for {', '.join(missing)}; valued at 0."))
+        prices = np.nan_to_num(prices, nan=0.0)
+
+        # 3. Value users chunk by chunk and write snapshots
+        lots_by_user = {}
+        for lot in lots:
+            lots_by_user.setdefault(lot[0], []).append(lot)
+        user_ids = sorted(lots_by_user)
+        written = 0
+        for i in range(0, len(user_ids), options['chunk_size']):
+            chunk_lots = [lot for user_id in user_ids[i:i + options['chunk_size']] for lot in lots_by_user[user_id]]
+            snapshots = self.value_portfolios(chunk_lots, symbols, dates, prices)
+            written += self.write(snapshots, options['overwrite'], options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} snapshots for {len(user_ids)} users ({dates[0]} to {dates[-1]}).'
+        ))
+
+    def price_matrix(self, symbols, start, end):
+        """
+        Returns (dates, prices) where prices[d, s] is the close of symbols[s]
+        on dates[d], forward-filled across days a symbol did not trade and NaN
+        before its first stored close.
+
+        Raw closes, not adjusted ones: record_snapshots values the stored
+        quantity at the price quoted that day, and adjusted closes are
+        rewritten by every later dividend or split, so they would neither
+        match the live snapshots nor stay put across re-syncs.
+        """
+        rows = list(
+            DailyBar.objects.filter(symbol__in=symbols, date__gte=start, date__lte=end)
+            .order_by()
+            .values_list('date', 'symbol', 'close')
+        )
+        dates = sorted({day for day, _, _ in rows})
+        if not dates:
+            return [], None
+
+        date_index = {day: i for i, day in enumerate(dates)}
+        symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        prices = np.full((len(dates), len(symbols)), np.nan)
+        d_idx = np.fromiter((date_index[day] for day, _, _ in rows), dtype=np.int64, count=len(rows))
+        s_idx = np.fromiter((symbol_index[symbol] for _, symbol, _ in rows), dtype=np.int64, count=len(rows))
+        prices[d_idx, s_idx] = np.fromiter((float(close) for _, _, close in rows), dtype=np.float64, count=len(rows))
+
+        # Forward fill: carry each column's last seen row index down
+        seen = np.where(~np.isnan(prices), np.arange(len(dates))[:, None], 0)
+        np.maximum.accumulate(seen, axis=0, out=seen)
+        filled = prices[seen, np.arange(len(symbols))[None, :]]
+        return dates, filled
+
+    def value_portfolios(self, lots, symbols, dates, prices):
+        """
+        Computes every user's value on every date in one pass. Lots are
+        collapsed into (user, symbol) pairs whose held quantity steps up on
+        each purchase date; values are quantity x price summed per user.
+        Yields (user_id, date, value) from each user's first purchase onward.
+        """
+        n_dates, n_symbols = len(dates), len(symbols)
+        user_ids = sorted({user_id for user_id, _, _, _ in lots})
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        dates_array = np.array(dates, dtype='datetime64[D]')
+
+        lot_user = np.fromiter((user_index[u] for u, _, _, _ in lots), dtype=np.int64, count=len(lots))
+        lot_symbol = np.fromiter((symbol_index[s] for _, s, _, _ in lots), dtype=np.int64, count=len(lots))
+        lot_qty = np.fromiter((float(q) for _, _, q, _ in lots), dtype=np.float64, count=len(lots))
+        lot_start = np.searchsorted(dates_array, np.array([d for _, _, _, d in lots], dtype='datetime64[D]'))
+
+        # Quantity held per (user, symbol) pair and date
+        pairs, pair_of_lot = np.unique(lot_user * n_symbols + lot_symbol, return_inverse=True)
+        deltas = np.zeros((len(pairs), n_dates + 1))
+        np.add.at(deltas, (pair_of_lot, lot_start), lot_qty)
+        held = np.cumsum(deltas[:, :n_dates], axis=1)
+
+        # Pairs are sorted by user, so per-user totals are contiguous row sums
+        pair_values = held * prices.T[pairs % n_symbols]
+        pair_user = pairs // n_symbols
+        user_starts = np.flatnonzero(np.r_[True, pair_user[1:] != pair_user[:-1]])
+        values = np.add.reduceat(pair_values, user_starts, axis=0)
+
+        first_day = np.full(len(user_ids), n_dates)
+        np.minimum.at(first_day, lot_user, lot_start)
+
+        for row, user_i in enumerate(pair_user[user_starts]):
+            for d in range(first_day[user_i], n_dates):
+                yield user_ids[user_i], dates[d], values[row, d]
+
+    def write(self, snapshots, overwrite, batch_size):
+        objs = [
+            PortfolioSnapshot(user_id=user_id, date=day, total_value=Decimal(f'{value:.2f}'))
+            for user_id, day, value in snapshots
+        ]
+        if overwrite:
+            PortfolioSnapshot.objects.bulk_create(
+                objs, batch_size=batch_size,
+                update_conflicts=True, unique_fields=['user', 'date'], update_fields=['total_value'],
+            )
+        else:
+            # Keep snapshots recorded live from real quotes
+            PortfolioSnapshot.objects.bulk_create(objs, batch_size=batch_size, ignore_conflicts=True)
+        return len(objs)
@@ -0,0 +1,206 @@
+# portfolio/management/commands/benchmark_queries.py
+import random
+import re
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from calculators.models import SavedCapitalGainsScenario, SavedRebalanceScenario, SavedRepriceStrategy
+from calculators.pagination import SUMMARY_FIELDS, past_cursor
+from portfolio.models import PortfolioPosition, PortfolioSnapshot, StockHolding
+from portfolio.views import snapshot_query
+
+SYMBOLS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA', 'VOD.L', 'BP.L', 'HSBA.L', 'SPY', 'VTI']
+USERNAME_PREFIX = 'benchmark-user-'
+# Models whose per-user composite index replaced the plain user_id FK index
+INDEXED_MODELS = (StockHolding, SavedRepriceStrategy, SavedCapitalGainsScenario, SavedRebalanceScenario)
+# Index names in SQLite ("USING [COVERING] INDEX x") and PostgreSQL ("Index [Only] Scan using x") plans
+PLAN_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)|Index (?:Only )?Scan(?: Backward)? using (\w+)')
+PLAN_SORT = re.compile(r'TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a synthetic dataset and prints the EXPLAIN plan and timings of the per-user queries '
+        'behind the portfolio and saved-scenario endpoints, with and (--compare) without the composite '
+        'indexes (measured against the plain user_id index they replaced). Each plan is checked for '
+        'the index it uses and for a sort step. Everything runs in one transaction that is rolled '
+        'back unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--lots', type=int, default=50, help='Lots per user (default: 50).')
+        parser.add_argument('--snapshots', type=int, default=365, help='Daily snapshots per user (default: 365).')
+        parser.add_argument('--scenarios', type=int, default=20, help='Saved rows per user and model (default: 20).')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query (default: 20).')
+        parser.add_argument('--compare', action='store_true', help='Also measure with the composite indexes dropped.')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (PostgreSQL only).')
+        parser.add_argument('--keep', action='store_true', help='Commit the seeded data instead of rolling back.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Database: {connection.vendor}')
+        with transaction.atomic():
+            user = self.seed(options)
+            self.analyze_tables()
+
+            baseline = self.measure(user, options, 'with composite indexes')
+            if options['compare']:
+                savepoint = transaction.savepoint()
+                self.restore_user_indexes()
+                without = self.measure(user, options, 'without composite indexes', check_indexes=False)
+                transaction.savepoint_rollback(savepoint)
+                self.report_speedups(baseline, without)
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+                self.stdout.write('Rolled back the seeded data.')
+
+    # --- Seeding ---
+
+    def seed(self, options):
+        """ Bulk-inserts the synthetic users and rows; returns the user the queries run for. """
+        User = get_user_model()
+        started = time.perf_counter()
+        rng = random.Random(42)
+        run = timezone.now().strftime('%Y%m%d%H%M%S')
+        users = User.objects.bulk_create(
+            [User(username=f'{USERNAME_PREFIX}{run}-{i}') for i in range(options['users'])], batch_size=1000
+        )
+        today = timezone.now().date()
+        now = timezone.now()
+
+        lots, positions = [], {}
+        for user in users:
+            for _ in range(options['lots']):
+                symbol = rng.choice(SYMBOLS)
+                quantity = Decimal(rng.randint(1, 100))
+                price = Decimal(rng.randint(1000, 50000)) / 100
+                lots.append(StockHolding(
+                    user=user, stock_symbol=symbol, quantity=quantity, purchase_price=price,
+                    purchase_date=today - timedelta(days=rng.randint(0, 3650)),
+                ))
+                position = positions.setdefault((user.id, symbol), PortfolioPosition(user=user, symbol=symbol))
+                position.total_quantity += quantity
+                position.total_cost += quantity * price
+                position.lot_count += 1
+        StockHolding.objects.bulk_create(lots, batch_size=2000)
+        PortfolioPosition.objects.bulk_create(positions.values(), batch_size=2000)
+
+        PortfolioSnapshot.objects.bulk_create(
+            [
+                PortfolioSnapshot(user=user, date=today - timedelta(days=day), total_value=Decimal(rng.randint(1000, 10 ** 6)))
+                for user in users for day in range(options['snapshots'])
+            ],
+            batch_size=2000,
+        )
+
+        blob = {'rows': [{'symbol': symbol, 'value': '1000.00'} for symbol in SYMBOLS] * 5}
+        for model, fields in (
+            (SavedRepriceStrategy, {
+                'current_shares': 10, 'average_price': 100, 'market_price': 90,
+                'strategy_mode': 'shares', 'strategy_value': 5,
+            }),
+            (SavedCapitalGainsScenario, {'input_data': blob, 'result_data': blob}),
+            (SavedRebalanceScenario, {'holdings_data': blob['rows'], 'categories_data': blob['rows']}),
+        ):
+            model.objects.bulk_create(
+                [model(user=user, name=f'Scenario {i}', **fields) for user in users for i in range(options['scenarios'])],
+                batch_size=1000,
+            )
+            # auto_now_add gives every row the same timestamp; spread them out
+            rows = list(model.objects.filter(user__in=users).only('id'))
+            for row in rows:
+                row.created_at = now - timedelta(minutes=rng.randint(0, 500000))
+            model.objects.bulk_update(rows, ['created_at'], batch_size=1000)
+
+        self.stdout.write(
+            f'Seeded {len(users)} users, {len(lots)} lots, {len(users) * options["snapshots"]} snapshots and '
+            f'{3 * len(users) * options["scenarios"]} saved rows in {time.perf_counter() - started:.1f}s.'
+        )
+        return users[len(users) // 2]
+
+    def analyze_tables(self):
+        """ Refreshes planner statistics so the plans reflect the seeded data. """
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    # --- Measuring ---
+
+    def queries(self, user):
+        """ (label, queryset, index the plan should use or None) for each endpoint's per-user query. """
+        today = timezone.now().date()
+        queries = [
+            ('summary: positions', PortfolioPosition.objects.filter(user=user), None),
+            ('summary: lots', StockHolding.objects.filter(user=user), 'stockholding_user_sym_date_idx'),
+            ('summary: chart (1y)', snapshot_query(user, today - timedelta(days=365), today), None),
+        ]
+        for label, model, summary in (
+            ('reprice strategies', SavedRepriceStrategy, False),
+            ('tax scenarios (summary)', SavedCapitalGainsScenario, True),
+            ('rebalance scenarios', SavedRebalanceScenario, False),
+        ):
+            # The queries calculators.pagination.keyset_page runs for the first and a later page
+            rows = model.objects.filter(user=user).order_by('-created_at', '-id')
+            middle = rows.count() // 2
+            cursor = next(iter(rows.values_list('created_at', 'id')[middle:middle + 1]), None)
+            index = model._meta.indexes[0].name
+            pages = [('first page', rows)]
+            if cursor:
+                pages.append(('cursor page', past_cursor(rows, *cursor)))
+            for page, queryset in pages:
+                queryset = queryset.values(*SUMMARY_FIELDS) if summary else queryset
+                queries.append((f'{label}: {page}', queryset[:51], index))
+        return queries
+
+    def measure(self, user, options, title, check_indexes=True):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {title} =='))
+        explain = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        results = {}
+        for label, queryset, expected in self.queries(user):
+            plan = queryset.explain(**explain)
+            durations = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())  # .all() clones, so every run hits the database
+                durations.append((time.perf_counter() - started) * 1000)
+            used = sorted({name for match in PLAN_INDEX.findall(plan) for name in match if name})
+            sorts = bool(PLAN_SORT.search(plan))
+            results[label] = (statistics.median(durations), used, sorts)
+
+            self.stdout.write(self.style.SUCCESS(f'\n{label}: median {results[label][0]:.2f} ms'))
+            self.stdout.write(f"  index: {', '.join(used) or 'none (table scan)'}; sort step: {'yes' if sorts else 'no'}")
+            if check_indexes and expected and expected not in used:
+                self.stdout.write(self.style.WARNING(f'  expected {expected}; check the query and the index'))
+            self.stdout.write(plan)
+        return results
+
+    def restore_user_indexes(self):
+        """ Swaps the composite indexes for the single-column user_id index each table had before. """
+        # Plain DDL: SQLite's schema editor refuses to run inside a transaction
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                table = model._meta.db_table
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                cursor.execute(
+                    f'CREATE INDEX {connection.ops.quote_name(f"{table}_bench_user")} '
+                    f'ON {connection.ops.quote_name(table)} ("user_id")'
+                )
+        self.analyze_tables()
+
+    def report_speedups(self, baseline, without):
+        self.stdout.write(self.style.MIGRATE_HEADING('\n== Summary (median ms) =='))
+        for label, (with_indexes, used, sorts) in baseline.items():
+            before, _, sorted_before = without[label]
+            self.stdout.write(
+                f'{label:45} {with_indexes:8.2f} with / {before:8.2f} without '
+                f'({before / with_indexes if with_indexes else 0:.1f}x)'
+                f"{'  sort removed' if sorted_before and not sorts else ''}"
+            )
@@ -0,0 +1,55 @@
+# portfolio/management/commands/import_holdings.py
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a broker transaction history (CSV with a header row, or NDJSON) as a user's "
+        'holdings, streaming the file and inserting in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--user', required=True, dest='username', help='Owner of the imported lots.')
+        parser.add_argument('--format', choices=importer.FORMATS, dest='file_format',
+                            help='Defaults to the format implied by the file name, else csv.')
+        parser.add_argument('--batch-size', type=int, default=importer.DEFAULT_BATCH_SIZE,
+                            help=f'Rows per bulk INSERT (default: {importer.DEFAULT_BATCH_SIZE}).')
+        parser.add_argument('--max-errors', type=int, default=importer.DEFAULT_MAX_ERRORS,
+                            help=f'Row errors to list (default: {importer.DEFAULT_MAX_ERRORS}).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named '{options['username']}'.")
+
+        fmt = options['file_format'] or importer.format_for(options['path'])
+        kwargs = {
+            'fmt': fmt,
+            'batch_size': options['batch_size'],
+            'max_errors': options['max_errors'],
+            'dry_run': options['dry_run'],
+        }
+        if options['path'] == '-':
+            result = importer.import_holdings(user, sys.stdin, **kwargs)
+        else:
+            try:
+                with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                    result = importer.import_holdings(user, stream, **kwargs)
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stdout.write(f"row {error['row']}: {error['errors']}")
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['imported']} lots; {result['skipped']} non-purchase rows skipped, "
+            f"{result['error_count']} rows rejected."
+        ))
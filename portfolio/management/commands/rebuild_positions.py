@@ -0,0 +1,36 @@
+# portfolio/management/commands/rebuild_positions.py
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio.positions import rebuild_positions, verify_positions
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the pre-aggregated portfolio positions from the individual lots, '
+        'or with --verify reports where they disagree.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only compare; exit with an error on any mismatch.')
+        parser.add_argument('--user', action='append', dest='usernames', help='Only these users (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Positions per bulk INSERT (default: 1000).')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(
+                get_user_model().objects.filter(username__in=options['usernames']).values_list('id', flat=True)
+            )
+
+        if options['verify']:
+            mismatches = verify_positions(user_ids)
+            for user_id, symbol, expected, actual in mismatches:
+                self.stdout.write(f'user {user_id} {symbol or "(totals)"}: expected {expected}, found {actual}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} aggregate rows disagree with the lots. Run rebuild_positions.')
+            self.stdout.write(self.style.SUCCESS('Positions match the lots.'))
+            return
+
+        written = rebuild_positions(user_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} positions.'))
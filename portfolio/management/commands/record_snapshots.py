@@ -1,78 +1,140 @@
 # portfolio/management/commands/record_snapshots.py
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decimal import Decimal
 from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Upper
 from django.utils import timezone
 
-# Import the necessary models and our API helper function
+# Import the necessary models and our shared quote cache
 from portfolio.models import StockHolding, PortfolioSnapshot
-from calculators.views import get_alpha_vantage_data
-
-from datetime import timedelta
-
-User = get_user_model()
+from calculators.quote_cache import quote_cache
 
 class Command(BaseCommand):
     help = 'Records a daily snapshot of the total value for each user portfolio.'
 
+    # Symbols bound into each aggregate query's CASE expression
+    PRICE_CHUNK_SIZE = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wait',
+            type=float,
+            default=60,
+            help='Maximum seconds to wait for a market data rate limit permit per symbol.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of threads fetching prices concurrently (default: 4).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=25,
+            help='Symbols requested per worker task (default: 25).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Snapshots inserted per bulk INSERT (default: 1000).',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting portfolio snapshot process...'))
 
-        users = User.objects.all()
         today = timezone.now().date()
 
-        for user in users:
-            self.stdout.write(f"Processing portfolio for {user.username}...")
-            
-            # Check if a snapshot for today already exists for this user
-            if PortfolioSnapshot.objects.filter(user=user, date=today).exists():
-                self.stdout.write(self.style.WARNING(f'Snapshot for {user.username} on {today} already exists. Skipping.'))
-                continue
-
-            holdings = StockHolding.objects.filter(user=user)
-            if not holdings:
-                self.stdout.write(f'No holdings found for {user.username}. Skipping.')
-                continue
-
-            total_portfolio_value = Decimal('0.00')
-            
-            # To respect API limits, we cache prices we've already fetched in this run
-            price_cache = {}
-
-            for holding in holdings:
-                symbol = holding.stock_symbol
-                
-                if symbol in price_cache:
-                    current_price = price_cache[symbol]
-                else:
-                    # We need the 'Global Quote' for the most recent price
-                    api_data = get_alpha_vantage_data(symbol, 'GLOBAL_QUOTE')
-                    
-                    if 'error' in api_data or 'Global Quote' not in api_data or not api_data['Global Quote']:
-                        self.stdout.write(self.style.ERROR(f'Could not fetch price for {symbol}. Skipping holding.'))
-                        price_cache[symbol] = None # Cache the failure to avoid re-querying
-                        continue
-                    
-                    try:
-                        current_price = Decimal(api_data['Global Quote']['05. price'])
-                        price_cache[symbol] = current_price
-                        # Alpha Vantage free tier has a limit of 5 calls per minute. We must wait.
-                        time.sleep(15) # Wait 15 seconds between API calls
-                    except (KeyError, ValueError):
-                        self.stdout.write(self.style.ERROR(f'Invalid price data for {symbol}. Skipping holding.'))
-                        price_cache[symbol] = None
-                        continue
-                
-                if current_price is not None:
-                    total_portfolio_value += holding.quantity * current_price
-
-            # Create the new snapshot record
-            PortfolioSnapshot.objects.create(
-                user=user,
-                date=today,
-                total_value=total_portfolio_value
+        # Phase 1: collect every distinct symbol held by users still needing a snapshot
+        symbols = sorted(set(
+            StockHolding.objects.exclude(user__portfoliosnapshot__date=today)
+            .annotate(symbol=Upper('stock_symbol'))
+            .values_list('symbol', flat=True)
+        ))
+        self.stdout.write(f'Fetching prices for {len(symbols)} distinct symbols...')
+
+        # Phase 2: fetch them once, concurrently, within the shared rate limit
+        price_map = self.fetch_prices(symbols, options['workers'], options['chunk_size'], options['wait'])
+        unpriced = [symbol for symbol in symbols if price_map.get(symbol) is None]
+        for symbol in unpriced:
+            self.stdout.write(self.style.ERROR(f'Could not fetch price for {symbol}. Skipping portfolios holding it.'))
+
+        # Phase 3: value every portfolio in SQL and write all snapshots in batches.
+        # The query count does not depend on the number of users.
+        totals = self.portfolio_totals(price_map, today, unpriced)
+        PortfolioSnapshot.objects.bulk_create(
+            [PortfolioSnapshot(user_id=user_id, date=today, total_value=total) for user_id, total in totals.items()],
+            batch_size=options['batch_size'],
+            ignore_conflicts=True,  # unique_together ('user', 'date') makes re-runs safe
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully recorded {len(totals)} portfolio snapshots for {today}.'))
+        if unpriced:
+            self.stdout.write(self.style.WARNING('Portfolios with unpriced holdings were skipped; run again to record them.'))
+
+    def portfolio_totals(self, price_map, today, unpriced=()):
+        """
+        Returns {user_id: total_value} for every user with holdings and no
+        snapshot for `today`, computed as SUM(quantity * price) GROUP BY user.
+        Prices are bound through a CASE expression, in chunks of symbols to
+        stay within database parameter limits.
+
+        Users holding any symbol in `unpriced` are left out: a snapshot is
+        never overwritten, so an undervalued one would be permanent.
+        """
+        holdings = StockHolding.objects.exclude(user__portfoliosnapshot__date=today).order_by()
+        if unpriced:
+            holdings = holdings.exclude(
+                user__in=holdings.annotate(symbol=Upper('stock_symbol')).filter(symbol__in=unpriced).values('user_id')
+            )
+
+        totals = {user_id: Decimal('0.00') for user_id in holdings.values_list('user_id', flat=True).distinct()}
+
+        priced = [(symbol, price) for symbol, price in price_map.items() if price is not None]
+        for start in range(0, len(priced), self.PRICE_CHUNK_SIZE):
+            chunk = priced[start:start + self.PRICE_CHUNK_SIZE]
+            price = Case(
+                *[When(symbol=symbol, then=Value(price)) for symbol, price in chunk],
+                output_field=DecimalField(max_digits=20, decimal_places=4),
             )
-            self.stdout.write(self.style.SUCCESS(f'Successfully recorded snapshot for {user.username}: ${total_portfolio_value:.2f}'))
+            rows = (
+                holdings.annotate(symbol=Upper('stock_symbol'))
+                .filter(symbol__in=[symbol for symbol, _ in chunk])
+                .values('user_id')
+                .annotate(total=Sum(F('quantity') * price, output_field=DecimalField(max_digits=30, decimal_places=8)))
+                .values_list('user_id', 'total')
+            )
+            for user_id, total in rows:
+                totals[user_id] += Decimal(total or 0)
+
+        return {user_id: total.quantize(Decimal('0.01')) for user_id, total in totals.items()}
+
+    def fetch_prices(self, symbols, workers, chunk_size, wait):
+        """
+        Returns {symbol: price} for the given symbols. Chunks are fetched by a
+        bounded thread pool; the shared rate limiter keeps the combined call
+        rate within quota while network latency overlaps.
+        """
+        chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+        price_map = {}
+        if not chunks:
+            return price_map
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as executor:
+            futures = [executor.submit(self._fetch_chunk, chunk, wait) for chunk in chunks]
+            for future in as_completed(futures):
+                price_map.update(future.result())
+        return price_map
 
-        self.stdout.write(self.style.SUCCESS('Successfully completed portfolio snapshot process.'))
\ No newline at end of file
+    @staticmethod
+    def _fetch_chunk(symbols, wait):
+        try:
+            # Falls back to the last known quote if no permit is granted in time
+            quotes = quote_cache.get_quotes(symbols, timeout=wait, allow_stale=True)
+            return {symbol: quote.price for symbol, quote in quotes.items()}
+        finally:
+            # Worker threads open their own database connections
+            connections.close_all()
@@ -0,0 +1,126 @@
+# portfolio/management/commands/refresh_prices.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from portfolio.models import StockHolding
+from portfolio.price_refresh import apply_quotes
+from calculators.circuit_breaker import backed_off_symbols
+from calculators.market_calendar import price_expiry
+from calculators.models import CachedQuote
+from calculators.quote_cache import QUOTE, quote_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs continuously, keeping the price of every held symbol fresh so the '
+        'dashboard never has to call the market data API on the request path.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=15 * 60,
+            help='Seconds after which a symbol is considered stale (default: 900).',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=5,
+            help='Symbols refreshed before priorities are recalculated (default: 5).',
+        )
+        parser.add_argument(
+            '--wait',
+            type=float,
+            default=60,
+            help='Maximum seconds to wait for a rate limit permit before re-planning.',
+        )
+        parser.add_argument(
+            '--idle-sleep',
+            type=float,
+            default=30,
+            help='Seconds to sleep when every symbol is fresh.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single refresh cycle and exit (useful for cron).',
+        )
+
+    def handle(self, *args, **options):
+        max_age = timedelta(seconds=options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f'Starting price refresher (staleness window {max_age}).'))
+
+        try:
+            while True:
+                refreshed = self.refresh_cycle(max_age, options['batch'], options['wait'])
+                if options['once']:
+                    break
+                if not refreshed:
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Price refresher stopped.')
+
+    def refresh_cycle(self, max_age, batch, wait):
+        """ Refreshes up to `batch` of the most urgent stale symbols. Returns the number refreshed. """
+        refreshed = 0
+        urgent = self.stale_symbols(max_age)[:batch]
+        # The whole batch is requested together (one call where bulk quotes are supported)
+        quotes = quote_cache.get_quotes([symbol for symbol, _, _ in urgent], timeout=wait, refresh=True)
+
+        for symbol, holders, age in urgent:
+            quote = quotes.get(symbol)
+            if quote is None:
+                self.stdout.write(self.style.WARNING(f'Could not refresh {symbol}.'))
+                continue
+
+            # One UPDATE keeps every user's cached holding price in sync
+            apply_quotes({symbol: quote})
+            refreshed += 1
+            self.stdout.write(f'Refreshed {symbol} at ${quote.price:.2f} ({holders} holders).')
+        return refreshed
+
+    def stale_symbols(self, max_age):
+        """
+        Returns (symbol, holders, age) for every held symbol whose shared quote
+        is older than `max_age` and could have moved since (the market has been
+        open since it was fetched), most urgent first. Urgency is the number of
+        users holding the symbol weighted by how long it has been stale;
+        symbols that have never been fetched come first. Symbols in backoff
+        after failed lookups (typos, delistings) are left out until their
+        retry time, so they cannot crowd real quotes out of every batch.
+        """
+        now = timezone.now()
+        holders = dict(
+            StockHolding.objects.order_by()
+            .annotate(symbol=Upper('stock_symbol'))
+            .values('symbol')
+            .annotate(holders=Count('user', distinct=True))
+            .values_list('symbol', 'holders')
+        )
+        for symbol in backed_off_symbols(holders):
+            del holders[symbol]
+        fetched_at = dict(
+            CachedQuote.objects.filter(function=QUOTE, symbol__in=holders.keys())
+            .values_list('symbol', 'fetched_at')
+        )
+
+        # Quotes fetched after the close stay current until the next open
+        stale = []
+        for symbol, count in holders.items():
+            age = now - fetched_at[symbol] if symbol in fetched_at else None
+            if age is None or now >= price_expiry(symbol, fetched_at[symbol], max_age.total_seconds()):
+                stale.append((symbol, count, age))
+
+        def urgency(item):
+            _, count, age = item
+            if age is None:
+                return (1, count)
+            return (0, count * age.total_seconds())
+
+        return sorted(stale, key=urgency, reverse=True)
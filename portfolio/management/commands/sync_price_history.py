@@ -0,0 +1,45 @@
+# portfolio/management/commands/sync_price_history.py
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Upper
+
+from portfolio.models import StockHolding
+from calculators.price_history import sync_daily_bars
+from calculators.providers import MarketDataError, RateLimitedError
+
+
+class Command(BaseCommand):
+    help = (
+        'Incrementally fills the local daily price history (DailyBar) for every held '
+        'symbol: full history for new symbols, compact updates afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help='Symbols to sync (default: every held symbol).')
+        parser.add_argument(
+            '--wait',
+            type=float,
+            default=60,
+            help='Maximum seconds to wait for a market data rate limit permit per symbol.',
+        )
+
+    def handle(self, *args, **options):
+        symbols = [s.upper() for s in options['symbols']] or sorted(set(
+            StockHolding.objects.annotate(symbol=Upper('stock_symbol')).values_list('symbol', flat=True)
+        ))
+
+        written = 0
+        for symbol in symbols:
+            try:
+                count = sync_daily_bars(symbol, permit_timeout=options['wait'])
+            except RateLimitedError as e:
+                self.stdout.write(self.style.WARNING(f'{e} Stopping; re-run to continue.'))
+                break
+            except MarketDataError as e:
+                self.stdout.write(self.style.ERROR(f'Could not sync {symbol}: {e}'))
+                continue
+
+            written += count
+            if count:
+                self.stdout.write(f'Stored {count} daily bars for {symbol}.')
+
+        self.stdout.write(self.style.SUCCESS(f'Price history sync complete ({written} bars written).'))
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:17
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_positions(apps, schema_editor):
+    """ Aggregates existing lots (a one-off version of portfolio.positions.rebuild_positions). """
+    StockHolding = apps.get_model('portfolio', 'StockHolding')
+    PortfolioPosition = apps.get_model('portfolio', 'PortfolioPosition')
+    PortfolioTotals = apps.get_model('portfolio', 'PortfolioTotals')
+
+    positions, totals = {}, {}
+    for lot in StockHolding.objects.order_by('last_updated').iterator():
+        key = (lot.user_id, lot.stock_symbol.upper())
+        position = positions.setdefault(key, PortfolioPosition(
+            user_id=key[0], symbol=key[1], total_quantity=Decimal('0'), total_cost=Decimal('0'), lot_count=0,
+        ))
+        position.total_quantity += lot.quantity
+        position.total_cost += lot.quantity * lot.purchase_price
+        position.lot_count += 1
+        if lot.last_updated is not None:
+            position.last_price, position.last_updated = lot.last_price, lot.last_updated
+
+        user_totals = totals.setdefault(lot.user_id, PortfolioTotals(
+            user_id=lot.user_id, total_cost=Decimal('0'), lot_count=0, position_count=0,
+        ))
+        user_totals.total_cost += lot.quantity * lot.purchase_price
+        user_totals.lot_count += 1
+    for position in positions.values():
+        totals[position.user_id].position_count += 1
+
+    PortfolioPosition.objects.bulk_create(positions.values(), batch_size=1000)
+    PortfolioTotals.objects.bulk_create(totals.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('portfolio', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioTotals',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='portfolio_totals', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_cost', models.DecimalField(decimal_places=6, default=Decimal('0'), max_digits=24)),
+                ('lot_count', models.PositiveIntegerField(default=0)),
+                ('position_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PortfolioPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=10)),
+                ('total_quantity', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('total_cost', models.DecimalField(decimal_places=6, default=Decimal('0'), max_digits=24)),
+                ('lot_count', models.PositiveIntegerField(default=0)),
+                ('last_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['symbol'],
+                'unique_together': {('user', 'symbol')},
+            },
+        ),
+        migrations.RunPython(populate_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0002_portfolioposition_portfoliototals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockholding',
+            index=models.Index(fields=['user', 'stock_symbol', 'purchase_date'], name='stockholding_user_sym_date_idx'),
+        ),
+    ]
@@ -7,7 +7,8 @@ from django.utils import timezone
 User = get_user_model()
 
 class StockHolding(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # No separate FK index: stockholding_user_sym_date_idx serves user lookups too
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     stock_symbol = models.CharField(max_length=10)
     quantity = models.DecimalField(max_digits=10, decimal_places=4)
     purchase_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -22,6 +23,10 @@ class StockHolding(models.Model):
 
     class Meta:
         ordering = ['stock_symbol', 'purchase_date']
+        # Lots are always read per user in this order
+        indexes = [
+            models.Index(fields=['user', 'stock_symbol', 'purchase_date'], name='stockholding_user_sym_date_idx'),
+        ]
     
 class PortfolioSnapshot(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -34,4 +39,41 @@ class PortfolioSnapshot(models.Model):
         ordering = ['date']
 
     def __str__(self):
-        return f"{self.user.username}'s Portfolio on {self.date}: ${self.total_value}"
\ No newline at end of file
+        return f"{self.user.username}'s Portfolio on {self.date}: ${self.total_value}"
+
+
+class PortfolioPosition(models.Model):
+    """
+    A user's lots of one symbol, pre-aggregated so the summary reads one row
+    per symbol instead of every lot. Maintained by portfolio.positions
+    wherever lots are written; rebuild or verify with rebuild_positions.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='positions')
+    symbol = models.CharField(max_length=10)  # Upper-case
+    total_quantity = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    # Sum of quantity x purchase_price over the lots
+    total_cost = models.DecimalField(max_digits=24, decimal_places=6, default=Decimal('0'))
+    lot_count = models.PositiveIntegerField(default=0)
+
+    # Latest known price for the symbol, as shown on the dashboard
+    last_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'symbol')
+        ordering = ['symbol']
+
+    def __str__(self):
+        return f"{self.total_quantity} {self.symbol} in {self.lot_count} lots ({self.user.username})"
+
+
+class PortfolioTotals(models.Model):
+    """ Per-user totals across every position, maintained alongside PortfolioPosition. """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='portfolio_totals')
+    total_cost = models.DecimalField(max_digits=24, decimal_places=6, default=Decimal('0'))
+    lot_count = models.PositiveIntegerField(default=0)
+    position_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.lot_count} lots in {self.position_count} positions"
+
@@ -0,0 +1,224 @@
+# portfolio/positions.py
+"""
+Maintenance of the pre-aggregated PortfolioPosition / PortfolioTotals rows.
+
+Every code path that creates, edits or deletes StockHolding lots calls
+apply_lot_changes() in the same transaction, so the aggregates move with
+the lots. Changes are applied as relative UPDATEs (F() expressions), which
+keeps concurrent edits to the same position from overwriting each other.
+
+rebuild_positions() recomputes everything from the lots (e.g. after edits
+made in the admin), and verify_positions() reports any drift.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Upper
+
+from .models import PortfolioPosition, PortfolioTotals, StockHolding
+
+QUANTITY_PLACES = Decimal('0.0001')
+COST_PLACES = Decimal('0.000001')
+
+
+def lot_values(lot):
+    """ (SYMBOL, quantity, purchase_price) from a StockHolding or such a tuple. """
+    if isinstance(lot, tuple):
+        symbol, quantity, price = lot
+    else:
+        symbol, quantity, price = lot.stock_symbol, lot.quantity, lot.purchase_price
+    return symbol.strip().upper(), Decimal(quantity), Decimal(price)
+
+
+def apply_lot_changes(user_id, added=(), removed=()):
+    """
+    Updates the user's aggregates for lots added and removed (an edit is a
+    removal of the old values plus an addition of the new ones). Issues one
+    UPDATE per symbol touched plus one for the user's totals. Call it inside
+    the transaction that writes the lots.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    for sign, lots in ((1, added), (-1, removed)):
+        for lot in lots:
+            symbol, quantity, price = lot_values(lot)
+            delta = deltas[symbol]
+            delta[0] += sign * quantity
+            delta[1] += sign * quantity * price
+            delta[2] += sign
+    deltas = {symbol: delta for symbol, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    positions_delta = 0
+    for symbol, (quantity, cost, lots) in deltas.items():
+        positions_delta += _apply_position(user_id, symbol, quantity, cost, lots)
+    _apply_totals(
+        user_id,
+        cost=sum(delta[1] for delta in deltas.values()),
+        lots=sum(delta[2] for delta in deltas.values()),
+        positions=positions_delta,
+    )
+
+
+def _apply_position(user_id, symbol, quantity, cost, lots):
+    """ Returns +1 if the position was opened, -1 if it was closed, otherwise 0. """
+    position = PortfolioPosition.objects.filter(user_id=user_id, symbol=symbol)
+    changes = {
+        'total_quantity': F('total_quantity') + quantity,
+        'total_cost': F('total_cost') + cost,
+        'lot_count': F('lot_count') + lots,
+    }
+    if not position.update(**changes):
+        try:
+            with transaction.atomic():
+                PortfolioPosition.objects.create(
+                    user_id=user_id, symbol=symbol, total_quantity=quantity, total_cost=cost, lot_count=lots,
+                )
+            return 1
+        except IntegrityError:
+            # Opened concurrently by another request; apply on top of it
+            position.update(**changes)
+            return 0
+    if lots < 0 and position.filter(lot_count__lte=0).delete()[0]:
+        return -1
+    return 0
+
+
+def _apply_totals(user_id, cost, lots, positions):
+    totals = PortfolioTotals.objects.filter(user_id=user_id)
+    changes = {
+        'total_cost': F('total_cost') + cost,
+        'lot_count': F('lot_count') + lots,
+        'position_count': F('position_count') + positions,
+    }
+    if not totals.update(**changes):
+        try:
+            with transaction.atomic():
+                PortfolioTotals.objects.create(
+                    user_id=user_id, total_cost=cost, lot_count=lots, position_count=positions,
+                )
+        except IntegrityError:
+            totals.update(**changes)
+
+
+def expected_positions(user_ids=None):
+    """ {(user_id, SYMBOL): (total_quantity, total_cost, lot_count)} computed from the lots. """
+    lots = StockHolding.objects.order_by()
+    if user_ids is not None:
+        lots = lots.filter(user_id__in=user_ids)
+    rows = (
+        lots.annotate(symbol=Upper('stock_symbol'))
+        .values('user_id', 'symbol')
+        .annotate(
+            sum_quantity=Sum('quantity'),
+            sum_cost=Sum(F('quantity') * F('purchase_price'), output_field=DecimalField(max_digits=24, decimal_places=6)),
+            lots=Count('id'),
+        )
+    )
+    return {
+        (row['user_id'], row['symbol']): (
+            Decimal(row['sum_quantity']).quantize(QUANTITY_PLACES),
+            Decimal(row['sum_cost']).quantize(COST_PLACES),
+            row['lots'],
+        )
+        for row in rows
+    }
+
+
+def rebuild_positions(user_ids=None, batch_size=1000):
+    """
+    Recomputes the aggregates from the lots, keeping known prices. Returns
+    the number of positions written.
+    """
+    expected = expected_positions(user_ids)
+
+    positions = PortfolioPosition.objects.all()
+    totals = PortfolioTotals.objects.all()
+    lots = StockHolding.objects.order_by('last_updated')
+    if user_ids is not None:
+        positions = positions.filter(user_id__in=user_ids)
+        totals = totals.filter(user_id__in=user_ids)
+        lots = lots.filter(user_id__in=user_ids)
+
+    # Keep each position's price, falling back to the most recently priced lot
+    prices = {}
+    for user_id, symbol, price, updated in lots.exclude(last_updated=None).values_list(
+        'user_id', 'stock_symbol', 'last_price', 'last_updated'
+    ):
+        prices[(user_id, symbol.upper())] = (price, updated)
+    prices.update({
+        (user_id, symbol): (price, updated)
+        for user_id, symbol, price, updated in positions.exclude(last_updated=None).values_list(
+            'user_id', 'symbol', 'last_price', 'last_updated'
+        )
+    })
+
+    per_user = defaultdict(lambda: [Decimal('0'), 0, 0])
+    for (user_id, _), (_, cost, lot_count) in expected.items():
+        per_user[user_id][0] += cost
+        per_user[user_id][1] += lot_count
+        per_user[user_id][2] += 1
+
+    with transaction.atomic():
+        positions.delete()
+        totals.delete()
+        PortfolioPosition.objects.bulk_create(
+            [
+                PortfolioPosition(
+                    user_id=user_id, symbol=symbol, total_quantity=quantity, total_cost=cost, lot_count=lot_count,
+                    last_price=prices.get((user_id, symbol), (None, None))[0],
+                    last_updated=prices.get((user_id, symbol), (None, None))[1],
+                )
+                for (user_id, symbol), (quantity, cost, lot_count) in expected.items()
+            ],
+            batch_size=batch_size,
+        )
+        PortfolioTotals.objects.bulk_create(
+            [
+                PortfolioTotals(user_id=user_id, total_cost=cost, lot_count=lot_count, position_count=count)
+                for user_id, (cost, lot_count, count) in per_user.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(expected)
+
+
+def verify_positions(user_ids=None):
+    """
+    Compares the aggregates with the lots. Returns a list of
+    (user_id, symbol or None for the totals row, expected, actual) mismatches.
+    """
+    expected = expected_positions(user_ids)
+    positions = PortfolioPosition.objects.all()
+    totals = PortfolioTotals.objects.all()
+    if user_ids is not None:
+        positions = positions.filter(user_id__in=user_ids)
+        totals = totals.filter(user_id__in=user_ids)
+
+    actual = {
+        (user_id, symbol): (Decimal(quantity).quantize(QUANTITY_PLACES), Decimal(cost).quantize(COST_PLACES), lots)
+        for user_id, symbol, quantity, cost, lots in positions.values_list(
+            'user_id', 'symbol', 'total_quantity', 'total_cost', 'lot_count'
+        )
+    }
+    mismatches = [
+        (user_id, symbol, expected.get((user_id, symbol)), actual.get((user_id, symbol)))
+        for user_id, symbol in sorted(expected.keys() | actual.keys())
+        if expected.get((user_id, symbol)) != actual.get((user_id, symbol))
+    ]
+
+    expected_totals = defaultdict(lambda: (Decimal('0').quantize(COST_PLACES), 0, 0))
+    for (user_id, _), (_, cost, lot_count) in expected.items():
+        total_cost, lots, count = expected_totals[user_id]
+        expected_totals[user_id] = (total_cost + cost, lots + lot_count, count + 1)
+    actual_totals = {
+        user_id: (Decimal(cost).quantize(COST_PLACES), lots, count)
+        for user_id, cost, lots, count in totals.values_list('user_id', 'total_cost', 'lot_count', 'position_count')
+        if lots or count
+    }
+    for user_id in sorted(expected_totals.keys() | actual_totals.keys()):
+        if expected_totals.get(user_id) != actual_totals.get(user_id):
+            mismatches.append((user_id, None, expected_totals.get(user_id), actual_totals.get(user_id)))
+    return mismatches
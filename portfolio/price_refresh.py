@@ -0,0 +1,80 @@
+# portfolio/price_refresh.py
+"""
+Background price refreshes for stale-while-revalidate serving.
+
+The dashboard never waits on the market data API: it serves the last known
+price and calls schedule_refresh() for stale symbols. Refreshes run on a
+small thread pool and are de-duplicated by symbol, so a symbol already
+queued or in flight in this process is not queued again.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.db.models import Case, DateTimeField, DecimalField, Value, When
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from calculators.quote_cache import quote_cache
+from .models import PortfolioPosition, StockHolding
+
+logger = logging.getLogger(__name__)
+
+# Seconds a background refresh may wait for a rate limit permit
+PERMIT_WAIT_SECONDS = 30
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='price-refresh')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+# Symbols bound into each UPDATE's CASE expressions
+APPLY_CHUNK_SIZE = 500
+
+
+def apply_quotes(quotes):
+    """
+    Writes each quote to every user's positions and lots of that symbol:
+    one UPDATE per table for up to APPLY_CHUNK_SIZE symbols, with the new
+    price and timestamp picked per row by CASE on the symbol.
+    """
+    now = timezone.now()
+    quotes = {symbol.upper(): quote for symbol, quote in quotes.items()}
+    symbols = list(quotes)
+    for start in range(0, len(symbols), APPLY_CHUNK_SIZE):
+        chunk = symbols[start:start + APPLY_CHUNK_SIZE]
+        for model, field in ((PortfolioPosition, 'symbol'), (StockHolding, 'stock_symbol')):
+            key = Upper(field)
+            model.objects.annotate(upper_symbol=key).filter(upper_symbol__in=chunk).update(
+                last_price=Case(
+                    *[When(**{f'{field}__iexact': s, 'then': Value(quotes[s].price)}) for s in chunk],
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ),
+                last_updated=Case(
+                    *[When(**{f'{field}__iexact': s, 'then': Value(quotes[s].as_of or now)}) for s in chunk],
+                    output_field=DateTimeField(),
+                ),
+            )
+
+
+def schedule_refresh(symbols):
+    """ Queues a background refresh. Returns the symbols that were newly queued. """
+    with _pending_lock:
+        new = {s.strip().upper() for s in symbols} - _pending
+        _pending.update(new)
+    if new:
+        _executor.submit(_refresh, new)
+    return new
+
+
+def _refresh(symbols):
+    try:
+        apply_quotes(quote_cache.get_quotes(symbols, timeout=PERMIT_WAIT_SECONDS))
+    except Exception:
+        logger.exception('Background price refresh failed for %s', ', '.join(sorted(symbols)))
+    finally:
+        with _pending_lock:
+            _pending.difference_update(symbols)
+        # Pool threads open their own database connections
+        connections.close_all()
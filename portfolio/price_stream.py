@@ -0,0 +1,170 @@
+# portfolio/price_stream.py
+"""
+Live price fan-out for the Server-Sent Events stream (ASGI only).
+
+Each ASGI worker runs one PriceHub. While anyone is subscribed, a single
+task polls the shared quote cache (the CachedQuote table, written by
+refresh_prices and every other worker) for quotes fetched since its last
+look, in one query covering the union of all subscribed symbols. Each new
+quote is pushed to every connection holding that symbol, so one upstream
+update reaches all open dashboards.
+
+A quote can be committed a little after the time stamped on it (a slow
+writer, or another worker's clock), so each poll reaches back an overlap
+window before the previous one and skips quotes it has already published,
+by (symbol, fetched_at).
+
+A connection only keeps the latest pending update per symbol, so a slow
+client skips intermediate prices instead of buffering them; an idle
+dashboard costs an entry in a dict and a parked coroutine.
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from calculators.models import CachedQuote
+from calculators.quote_cache import QUOTE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_SECONDS = 2
+DEFAULT_HEARTBEAT_SECONDS = 15
+DEFAULT_OVERLAP_SECONDS = 30
+
+
+class Subscription:
+    """ One stream's view of the hub: pending updates keyed by symbol. """
+
+    def __init__(self, symbols):
+        self.symbols = frozenset(symbols)
+        self.pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, symbol, update):
+        self.pending[symbol] = update
+        self._ready.set()
+
+    async def next_updates(self, timeout):
+        """ Waits up to `timeout` seconds and returns (and clears) the pending updates. """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._ready.clear()
+        updates, self.pending = self.pending, {}
+        return updates
+
+
+class PriceHub:
+    """ Polls the shared quote cache on behalf of every subscribed connection. """
+
+    def __init__(self, poll_seconds=None, overlap_seconds=None):
+        self._poll_seconds = poll_seconds
+        self._overlap_seconds = overlap_seconds
+        self._subscribers = {}  # symbol -> set of Subscription
+        self._since = None
+        self._published_at = {}  # symbol -> fetched_at of the last quote published
+        self._task = None
+        self.polls = 0
+        self.published = 0
+
+    @property
+    def poll_seconds(self):
+        if self._poll_seconds is not None:
+            return self._poll_seconds
+        return getattr(settings, 'PRICE_STREAM_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+
+    @property
+    def overlap(self):
+        seconds = self._overlap_seconds
+        if seconds is None:
+            seconds = getattr(settings, 'PRICE_STREAM_OVERLAP_SECONDS', DEFAULT_OVERLAP_SECONDS)
+        return timedelta(seconds=seconds)
+
+    def subscribe(self, symbols):
+        subscription = Subscription(symbols)
+        for symbol in subscription.symbols:
+            self._subscribers.setdefault(symbol, set()).add(subscription)
+        if self._task is None or self._task.done():
+            # A (re)started hub never carries a position over from an earlier run
+            self._since = timezone.now()
+            self._published_at = {}
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for symbol in subscription.symbols:
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[symbol]
+
+    def connections(self):
+        return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+    async def poll_once(self):
+        """ Publishes quotes fetched since the last poll. Returns how many symbols changed. """
+        symbols = list(self._subscribers)
+        if not symbols:
+            return 0
+        self.polls += 1
+        polled_at = timezone.now()
+        rows = [
+            row async for row in CachedQuote.objects.filter(
+                function=QUOTE, symbol__in=symbols, fetched_at__gt=self._since - self.overlap
+            ).values_list('symbol', 'data', 'fetched_at')
+        ]
+        changed = 0
+        for symbol, data, fetched_at in rows:
+            if self._published_at.get(symbol) == fetched_at:
+                continue  # Already sent by an earlier, overlapping poll
+            self._published_at[symbol] = fetched_at
+            self.publish(symbol, price_update(data))
+            changed += 1
+
+        self._since = max([polled_at] + [fetched_at for _, _, fetched_at in rows])
+        # Quotes older than the next window are never read again
+        cutoff = self._since - self.overlap
+        self._published_at = {s: at for s, at in self._published_at.items() if at > cutoff}
+        return changed
+
+    def publish(self, symbol, update):
+        for subscription in self._subscribers.get(symbol, ()):
+            subscription.push(symbol, update)
+            self.published += 1
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                await self.poll_once()
+            except Exception:
+                logger.exception('Price stream poll failed')
+            await asyncio.sleep(self.poll_seconds)
+
+
+def price_update(data):
+    """ The per-symbol delta sent to clients, built from a cached quote. """
+    price = data.get('price')
+    previous_close = data.get('previous_close')
+    change = None
+    if price is not None and previous_close not in (None, ''):
+        change = f"{float(price) - float(previous_close):.2f}"
+    return {
+        'symbol': data.get('symbol'),
+        'price': f"{float(price):.2f}" if price is not None else None,
+        'change': change,
+        'as_of': data.get('as_of'),
+    }
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# One hub per worker process (and event loop)
+price_hub = PriceHub()
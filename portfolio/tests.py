@@ -1,3 +1,723 @@
-from django.test import TestCase
+# portfolio/tests.py
+import json
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from calculators.circuit_breaker import record_symbol_failure
+from calculators.models import CachedQuote, DailyBar, SavedCapitalGainsScenario
+from calculators.providers import Quote
+from calculators.quote_cache import QUOTE, quote_cache
+from .management.commands.refresh_prices import Command as RefreshPricesCommand
+from .charting import lttb
+from .importer import import_holdings
+from .models import PortfolioPosition, PortfolioSnapshot, PortfolioTotals, StockHolding
+from .positions import apply_lot_changes, verify_positions
+from .price_refresh import schedule_refresh
+from .price_stream import PriceHub
+from .views import (
+    PortfolioAPIView, StockHoldingAPIView, StockHoldingBulkAPIView, StockHoldingImportAPIView,
+    export_view, portfolio_summary_async_view, price_stream_view,
+)
+
+User = get_user_model()
+
+
+def make_holding(user, symbol, quantity='10', price='100.00'):
+    holding = StockHolding.objects.create(
+        user=user,
+        stock_symbol=symbol,
+        quantity=Decimal(quantity),
+        purchase_price=Decimal(price),
+        purchase_date=date(2024, 1, 2),
+    )
+    apply_lot_changes(user.id, added=[holding])
+    return holding
+
+
+# Fixed age-based freshness; calendar-aware expiry is tested in calculators
+@override_settings(MARKET_CALENDAR_TTLS=False)
+class RefreshPricesCommandTest(TestCase):
+    """
+    Tests for the background price refresher.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+
+    def cache_quote(self, symbol, age):
+        fetched_at = timezone.now() - age
+        CachedQuote.objects.create(
+            symbol=symbol, function=QUOTE, data={},
+            fetched_at=fetched_at, expires_at=fetched_at, last_accessed=fetched_at,
+        )
+
+    def test_stale_symbols_are_prioritised_by_holders_and_staleness(self):
+        make_holding(self.alice, 'AAPL')
+        make_holding(self.bob, 'aapl')
+        make_holding(self.alice, 'MSFT')
+        make_holding(self.alice, 'TSLA')
+        make_holding(self.alice, 'NEW')
+        self.cache_quote('AAPL', timedelta(hours=1))
+        self.cache_quote('MSFT', timedelta(hours=1))
+        self.cache_quote('TSLA', timedelta(minutes=1))
+
+        stale = RefreshPricesCommand().stale_symbols(timedelta(minutes=15))
+
+        self.assertEqual([symbol for symbol, _, _ in stale], ['NEW', 'AAPL', 'MSFT'])
+        self.assertEqual(stale[1][1], 2)
+
+    def test_backed_off_symbols_do_not_starve_stale_quotes(self):
+        make_holding(self.alice, 'AAPL')
+        self.cache_quote('AAPL', timedelta(hours=1))
+        for symbol in ('APPL', 'MSTF', 'GONE', 'TYPO', 'XXXX'):
+            make_holding(self.alice, symbol)
+            record_symbol_failure(symbol, 'Invalid API call.')
+
+        with mock.patch('portfolio.management.commands.refresh_prices.quote_cache.get_quotes', return_value={}) as get_quotes:
+            call_command('refresh_prices', '--once', '--batch', '5', stdout=StringIO())
+
+        get_quotes.assert_called_once_with(['AAPL'], timeout=60, refresh=True)
+
+    def test_once_refreshes_every_holding_of_a_symbol(self):
+        make_holding(self.alice, 'AAPL')
+        make_holding(self.bob, 'AAPL')
+        quotes = {'AAPL': Quote(symbol='AAPL', price=Decimal('190.50'))}
+
+        with mock.patch('portfolio.management.commands.refresh_prices.quote_cache.get_quotes', return_value=quotes) as get_quotes:
+            call_command('refresh_prices', '--once', stdout=StringIO())
+
+        get_quotes.assert_called_once_with(['AAPL'], timeout=60, refresh=True)
+        self.assertEqual(
+            set(StockHolding.objects.values_list('last_price', flat=True)), {Decimal('190.50')}
+        )
+
+
+class RecordSnapshotsCommandTest(TestCase):
+    """
+    Tests for the nightly snapshot command.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+
+    def test_shared_symbols_are_fetched_once_for_all_users(self):
+        make_holding(self.alice, 'AAPL', quantity='2')
+        make_holding(self.alice, 'MSFT', quantity='1')
+        make_holding(self.bob, 'aapl', quantity='3')
+        quotes = {
+            'AAPL': Quote(symbol='AAPL', price=Decimal('100.00')),
+            'MSFT': Quote(symbol='MSFT', price=Decimal('50.00')),
+        }
+
+        with mock.patch('portfolio.management.commands.record_snapshots.quote_cache.get_quotes', return_value=quotes) as get_quotes:
+            call_command('record_snapshots', '--chunk-size', '10', stdout=StringIO())
+
+        get_quotes.assert_called_once_with(['AAPL', 'MSFT'], timeout=60, allow_stale=True)
+        totals = dict(PortfolioSnapshot.objects.values_list('user__username', 'total_value'))
+        self.assertEqual(totals, {'alice': Decimal('250.00'), 'bob': Decimal('300.00')})
+
+    def test_existing_snapshots_are_kept_and_query_count_is_constant(self):
+        quotes = {'AAPL': Quote(symbol='AAPL', price=Decimal('100.00'))}
+        make_holding(self.alice, 'AAPL', quantity='1')
+        PortfolioSnapshot.objects.create(user=self.alice, date=timezone.now().date(), total_value=Decimal('1.00'))
+
+        def run():
+            with mock.patch('portfolio.management.commands.record_snapshots.quote_cache.get_quotes', return_value=quotes):
+                with CaptureQueriesContext(connection) as queries:
+                    call_command('record_snapshots', stdout=StringIO())
+            return len(queries)
+
+        make_holding(self.bob, 'AAPL', quantity='1')
+        few_users = run()
+        PortfolioSnapshot.objects.filter(user=self.bob).delete()
+        for i in range(10):
+            make_holding(User.objects.create_user(username=f'user{i}'), 'AAPL')
+        many_users = run()
+
+        self.assertEqual(few_users, many_users)
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.alice).total_value, Decimal('1.00'))
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.bob).total_value, Decimal('100.00'))
+        self.assertEqual(PortfolioSnapshot.objects.count(), 12)
+
+    def test_portfolios_with_unpriced_holdings_are_not_recorded(self):
+        make_holding(self.alice, 'AAPL', quantity='2')
+        make_holding(self.alice, 'MSFT', quantity='1')
+        make_holding(self.bob, 'AAPL', quantity='3')
+        quotes = {'AAPL': Quote(symbol='AAPL', price=Decimal('100.00'))}
+
+        with mock.patch('portfolio.management.commands.record_snapshots.quote_cache.get_quotes', return_value=quotes):
+            call_command('record_snapshots', stdout=StringIO())
+
+        totals = dict(PortfolioSnapshot.objects.values_list('user__username', 'total_value'))
+        self.assertEqual(totals, {'bob': Decimal('300.00')})
+
+        # Once MSFT is priced, the next run fills in the missing snapshot
+        quotes['MSFT'] = Quote(symbol='MSFT', price=Decimal('50.00'))
+        with mock.patch('portfolio.management.commands.record_snapshots.quote_cache.get_quotes', return_value=quotes):
+            call_command('record_snapshots', stdout=StringIO())
+
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.alice).total_value, Decimal('250.00'))
+
+
+class BackfillSnapshotsCommandTest(TestCase):
+    """
+    Tests for rebuilding historical snapshots from stored daily closes.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        closes = {
+            'AAPL': {date(2026, 1, 5): 10, date(2026, 1, 6): 11, date(2026, 1, 7): 12},
+            # MSFT has no bar on the 6th; the previous close carries forward
+            'MSFT': {date(2026, 1, 5): 100, date(2026, 1, 7): 120},
+        }
+        for symbol, days in closes.items():
+            for day, close in days.items():
+                # A later dividend back-adjusted these bars; snapshots must use the raw close
+                DailyBar.objects.create(
+                    symbol=symbol, date=day, open=close, high=close, low=close, close=close,
+                    adjusted_close=Decimal(close) * Decimal('0.9'),
+                )
+
+    def backfill(self, *args):
+        call_command('backfill_snapshots', '--end', '2026-01-07', '--days', '30', *args, stdout=StringIO())
+        return {
+            (s.user.username, s.date.day): s.total_value
+            for s in PortfolioSnapshot.objects.select_related('user')
+        }
+
+    def test_values_follow_purchase_dates_and_stored_closes(self):
+        StockHolding.objects.create(user=self.alice, stock_symbol='aapl', quantity=2, purchase_price=1, purchase_date=date(2025, 12, 1))
+        StockHolding.objects.create(user=self.alice, stock_symbol='MSFT', quantity=1, purchase_price=1, purchase_date=date(2026, 1, 6))
+        StockHolding.objects.create(user=self.bob, stock_symbol='MSFT', quantity=3, purchase_price=1, purchase_date=date(2026, 1, 7))
+
+        with mock.patch('calculators.providers.get_provider') as get_provider:
+            values = self.backfill()
+
+        get_provider.assert_not_called()
+        self.assertEqual(values, {
+            ('alice', 5): Decimal('20.00'),
+            ('alice', 6): Decimal('122.00'),
+            ('alice', 7): Decimal('144.00'),
+            ('bob', 7): Decimal('360.00'),
+        })
+
+    def test_existing_snapshots_are_kept_unless_overwriting(self):
+        StockHolding.objects.create(user=self.alice, stock_symbol='AAPL', quantity=1, purchase_price=1, purchase_date=date(2026, 1, 7))
+        PortfolioSnapshot.objects.create(user=self.alice, date=date(2026, 1, 7), total_value=Decimal('99.00'))
+
+        self.assertEqual(self.backfill()[('alice', 7)], Decimal('99.00'))
+        self.assertEqual(self.backfill('--overwrite')[('alice', 7)], Decimal('12.00'))
+
+
+class PortfolioChartDataTest(TestCase):
+    """
+    Tests for the range and downsampling options of the summary endpoint.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        start = date(2024, 1, 1)
+        PortfolioSnapshot.objects.bulk_create([
+            PortfolioSnapshot(user=self.user, date=start + timedelta(days=i), total_value=Decimal(1000 + (i % 50)))
+            for i in range(1000)
+        ])
+
+    def get(self, **params):
+        request = APIRequestFactory().get('/portfolio/api/summary/', params)
+        force_authenticate(request, user=self.user)
+        return PortfolioAPIView.as_view()(request)
+
+    def test_chart_is_downsampled_to_max_points(self):
+        chart = self.get(max_points=100).data['chart_data']
+        self.assertEqual(len(chart['labels']), 100)
+        self.assertEqual(chart['labels'][0], '2024-01-01')
+        self.assertEqual(chart['labels'][-1], '2026-09-26')
+
+    def test_chart_range_is_filtered_in_the_database(self):
+        chart = self.get(start='2024-02-01', end='2024-02-10').data['chart_data']
+        self.assertEqual(chart['labels'], [f'2024-02-{day:02d}' for day in range(1, 11)])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.get(start='yesterday').status_code, 400)
+        self.assertEqual(self.get(max_points=1).status_code, 400)
+
+    def test_lttb_keeps_extremes(self):
+        values = [0, 1, 0, 10, 0, 1, 0, -10, 0, 1, 0]
+        keep = lttb(list(enumerate(values)), 4)
+        self.assertEqual(keep, [0, 3, 7, 10])
+
+
+# Fixed age-based freshness; calendar-aware expiry is tested in calculators
+@override_settings(MARKET_CALENDAR_TTLS=False)
+class StaleWhileRevalidateTest(TestCase):
+    """
+    Tests that the summary endpoint serves last known prices without calling upstream.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        # The process-wide cache outlives each test's database transaction
+        quote_cache.clear()
+        self.addCleanup(quote_cache.clear)
+        patcher = mock.patch('portfolio.views.schedule_refresh')
+        self.schedule_refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def holding(self, symbol, price, age):
+        holding = make_holding(self.user, symbol)
+        PortfolioPosition.objects.filter(user=self.user, symbol=symbol).update(
+            last_price=Decimal(price), last_updated=timezone.now() - age
+        )
+        return holding
+
+    def summary(self):
+        request = APIRequestFactory().get('/portfolio/api/summary/')
+        force_authenticate(request, user=self.user)
+        with mock.patch('calculators.quote_cache.get_provider') as get_provider:
+            response = PortfolioAPIView.as_view()(request)
+        get_provider.assert_not_called()
+        return {h['symbol']: h for h in response.data['holdings']}, response.data['summary']
+
+    def test_stale_prices_are_served_and_refreshed_in_the_background(self):
+        self.holding('AAPL', '190.00', timedelta(minutes=1))
+        self.holding('MSFT', '400.00', timedelta(hours=2))
+        self.holding('OLD', '5.00', timedelta(days=30))
+
+        holdings, summary = self.summary()
+
+        self.schedule_refresh.assert_called_once_with({'MSFT', 'OLD'})
+        self.assertTrue(summary['prices_refreshing'])
+        self.assertFalse(holdings['AAPL']['stale'])
+        self.assertTrue(holdings['MSFT']['stale'])
+        self.assertEqual(holdings['MSFT']['market_price'], '400.00')
+        self.assertEqual(holdings['OLD']['market_price'], 'N/A')
+
+    def test_fresher_shared_quotes_are_used_without_refreshing(self):
+        self.holding('MSFT', '400.00', timedelta(hours=2))
+        quote_cache.set('MSFT', QUOTE, Quote(symbol='MSFT', price=Decimal('410.00'), as_of=timezone.now()).to_dict())
+
+        holdings, summary = self.summary()
+
+        self.schedule_refresh.assert_not_called()
+        self.assertEqual(holdings['MSFT']['market_price'], '410.00')
+        self.assertFalse(holdings['MSFT']['stale'])
+
+    def test_schedule_refresh_deduplicates_symbols(self):
+        with mock.patch('portfolio.price_refresh._executor') as executor:
+            first = schedule_refresh(['aapl', 'MSFT'])
+            second = schedule_refresh(['AAPL', 'TSLA'])
+
+        self.assertEqual((first, second), ({'AAPL', 'MSFT'}, {'TSLA'}))
+        self.assertEqual(executor.submit.call_count, 2)
+
+
+class AsyncPortfolioSummaryTest(TestCase):
+    """
+    Tests for the ASGI summary view.
+    """
+    def setUp(self):
+        quote_cache.clear()
+        self.addCleanup(quote_cache.clear)
+        patcher = mock.patch('portfolio.views.schedule_refresh')
+        self.schedule_refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def summary(self, user):
+        async def auser():
+            return user
+
+        request = AsyncRequestFactory().get('/portfolio/api/summary/')
+        request.auser = auser
+        response = await portfolio_summary_async_view(request)
+        return json.loads(response.content)
+
+    async def test_cold_prices_are_fetched_concurrently(self):
+        user = await User.objects.acreate(username='alice')
+        for symbol in ('AAPL', 'MSFT', 'TSLA'):
+            await sync_to_async(make_holding)(user, symbol, quantity='2')
+        # Each batch waits for the other two, so this only passes if all three run at once
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fetch_batch(symbols, timeout, allow_stale):
+            barrier.wait()
+            return {s: Quote(symbol=s, price=Decimal('150'), as_of=timezone.now()) for s in symbols}
+
+        with mock.patch.object(quote_cache, '_fetch_batch', side_effect=fetch_batch) as fetch:
+            data = await self.summary(user)
+
+        self.assertEqual(sorted(call.args[0] for call in fetch.call_args_list), [['AAPL'], ['MSFT'], ['TSLA']])
+        self.assertEqual({h['market_price'] for h in data['holdings']}, {'150.00'})
+        self.assertEqual(data['summary']['total_value'], '900.00')
+        self.schedule_refresh.assert_not_called()
+
+
+class PortfolioPositionTest(TestCase):
+    """
+    Tests for the pre-aggregated positions behind the summary.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+
+    def call(self, method, data=None, pk=None):
+        request = getattr(APIRequestFactory(), method)('/portfolio/api/holdings/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return StockHoldingAPIView.as_view()(request, **({'pk': pk} if pk else {}))
+
+    def test_crud_keeps_positions_in_step_with_lots(self):
+        lot = {'stock_symbol': 'aapl', 'quantity': '2', 'purchase_price': '100.00', 'purchase_date': '2024-01-02'}
+        first = self.call('post', lot).data['id']
+        self.call('post', {**lot, 'quantity': '3', 'purchase_price': '110.00'})
+
+        position = PortfolioPosition.objects.get(user=self.user, symbol='AAPL')
+        self.assertEqual((position.total_quantity, position.total_cost, position.lot_count), (Decimal('5'), Decimal('530'), 2))
+
+        self.call('put', {**lot, 'stock_symbol': 'MSFT'}, pk=first)
+        self.assertEqual(PortfolioPosition.objects.get(symbol='AAPL').total_quantity, Decimal('3'))
+        self.assertEqual(PortfolioTotals.objects.get(user=self.user).position_count, 2)
+
+        self.call('delete', pk=first)
+        self.assertFalse(PortfolioPosition.objects.filter(symbol='MSFT').exists())
+        self.assertEqual(verify_positions(), [])
+
+    def test_summary_query_count_does_not_grow_with_lots(self):
+        def summary_queries():
+            request = APIRequestFactory().get('/portfolio/api/summary/', {'lots': 'false'})
+            force_authenticate(request, user=self.user)
+            with mock.patch('portfolio.views.schedule_refresh'), CaptureQueriesContext(connection) as queries:
+                response = PortfolioAPIView.as_view()(request)
+            return len(queries), response.data
+
+        make_holding(self.user, 'AAPL', quantity='1')
+        few, _ = summary_queries()
+        for _ in range(20):
+            make_holding(self.user, 'AAPL', quantity='1')
+        many, data = summary_queries()
+
+        self.assertEqual(few, many)
+        self.assertEqual(data['holdings'], [])
+        self.assertEqual(data['positions'][0]['lot_count'], 21)
+        self.assertEqual(data['summary']['total_investment'], '2100.00')
+        self.assertEqual((data['summary']['lot_count'], data['summary']['position_count']), (21, 1))
+
+    def test_rebuild_command_repairs_drift(self):
+        make_holding(self.user, 'AAPL', quantity='2')
+        StockHolding.objects.create(  # Written behind the aggregates' back, e.g. in the admin
+            user=self.user, stock_symbol='MSFT', quantity=Decimal('1'), purchase_price=Decimal('50'),
+            purchase_date=date(2024, 1, 2),
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_positions', '--verify', stdout=StringIO())
+
+        call_command('rebuild_positions', stdout=StringIO())
+        call_command('rebuild_positions', '--verify', stdout=StringIO())
+        self.assertEqual(PortfolioTotals.objects.get(user=self.user).total_cost, Decimal('250'))
+
+
+class StockHoldingBulkTest(TestCase):
+    """
+    Tests for bulk holding edits and batched price write-back.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+
+    def bulk(self, data):
+        request = APIRequestFactory().post('/portfolio/api/holdings/bulk/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return StockHoldingBulkAPIView.as_view()(request)
+
+    def lot(self, symbol, quantity='1'):
+        return {'stock_symbol': symbol, 'quantity': quantity, 'purchase_price': '10.00', 'purchase_date': '2024-01-02'}
+
+    def test_import_of_many_lots_takes_a_handful_of_queries(self):
+        lots = [self.lot(['AAPL', 'MSFT', 'TSLA'][i % 3]) for i in range(200)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk({'create': lots})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['created']), 200)
+        # Batched lot INSERTs plus the aggregates for three symbols, savepoints included
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "portfolio_stockholding"')]
+        self.assertLessEqual(len(inserts), 2)
+        self.assertLessEqual(len(queries), 20)
+        self.assertEqual(PortfolioPosition.objects.get(symbol='AAPL').lot_count, 67)
+        self.assertEqual(verify_positions(), [])
+
+    def test_mixed_operations_apply_together(self):
+        keep = make_holding(self.user, 'AAPL', quantity='5')
+        drop = make_holding(self.user, 'MSFT', quantity='2')
+
+        response = self.bulk({
+            'create': [self.lot('TSLA')],
+            'update': [{'id': keep.id, **self.lot('AAPL', quantity='7')}],
+            'delete': [drop.id],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted'], [drop.id])
+        self.assertEqual(PortfolioPosition.objects.get(symbol='AAPL').total_quantity, Decimal('7'))
+        self.assertFalse(PortfolioPosition.objects.filter(symbol='MSFT').exists())
+        self.assertEqual(verify_positions(), [])
+
+    def test_any_invalid_operation_rejects_the_whole_request(self):
+        other = make_holding(User.objects.create_user(username='bob'), 'AAPL')
+
+        response = self.bulk({
+            'create': [self.lot('AAPL'), self.lot('AAPL', quantity='abc')],
+            'delete': [other.id],
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(response.data['errors']['create'][0])
+        self.assertIn('quantity', response.data['errors']['create'][1])
+        self.assertIn('id', response.data['errors']['delete'][0])
+        self.assertFalse(StockHolding.objects.filter(user=self.user).exists())
+        self.assertTrue(StockHolding.objects.filter(pk=other.pk).exists())
+
+    def test_malformed_bodies_and_ids_are_rejected(self):
+        holding = make_holding(self.user, 'AAPL')
+        self.assertEqual(self.bulk([self.lot('AAPL')]).status_code, 400)
+
+        # true == 1 in Python, but it is not a holding id
+        response = self.bulk({'update': [{'id': True, **self.lot('AAPL')}], 'delete': [True, [holding.id]]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.data['errors']['update'][0])
+        self.assertEqual(len(response.data['errors']['delete']), 2)
+        self.assertTrue(StockHolding.objects.filter(pk=holding.pk).exists())
+
+    def test_a_holding_may_appear_in_only_one_operation(self):
+        holding = make_holding(self.user, 'AAPL', quantity='10')
+        other = make_holding(self.user, 'AAPL', quantity='5')
+
+        for data in (
+            {'update': [{'id': holding.id, **self.lot('AAPL', quantity='20')}, {'id': holding.id, **self.lot('AAPL', quantity='30')}]},
+            {'delete': [holding.id, holding.id]},
+            {'update': [{'id': holding.id, **self.lot('AAPL', quantity='20')}], 'delete': [holding.id, other.id]},
+        ):
+            response = self.bulk(data)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['ids'], [holding.id])
+
+        self.assertEqual(PortfolioPosition.objects.get(symbol='AAPL').total_quantity, Decimal('15'))
+        self.assertEqual(StockHolding.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(verify_positions(), [])
+
+    def test_summary_writes_fresher_prices_back_in_one_update(self):
+        for symbol in ('AAPL', 'MSFT', 'TSLA'):
+            make_holding(self.user, symbol)
+        quotes = {s: Quote(symbol=s, price=Decimal('20.00'), as_of=timezone.now()) for s in ('AAPL', 'MSFT', 'TSLA')}
+        request = APIRequestFactory().get('/portfolio/api/summary/', {'lots': 'false'})
+        force_authenticate(request, user=self.user)
+
+        with mock.patch('portfolio.views.schedule_refresh'), \
+                mock.patch.object(quote_cache, 'get_quotes', return_value=quotes), \
+                CaptureQueriesContext(connection) as queries:
+            PortfolioAPIView.as_view()(request)
+
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "portfolio_portfolioposition"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(PortfolioPosition.objects.values_list('last_price', flat=True)), {Decimal('20.00')})
+
+
+class HoldingImportTest(TestCase):
+    """
+    Tests for streaming broker history imports.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+
+    def test_csv_rows_are_imported_in_batches_and_errors_reported(self):
+        rows = ['Symbol,Shares,Price,Trade Date,Action']
+        rows += [f'AAPL,1,10.00,2024-01-{day:02d},BUY' for day in range(1, 26)]
+        rows += ['MSFT,2,,2024-02-01,BUY', 'TSLA,1,5.00,2024-02-01,SELL', 'MSFT,2,300.00,2024-02-02,Buy']
+
+        with CaptureQueriesContext(connection) as queries:
+            result = import_holdings(self.user, StringIO('\n'.join(rows)), batch_size=10)
+
+        self.assertEqual((result['imported'], result['skipped'], result['error_count']), (26, 1, 1))
+        self.assertEqual(result['errors'][0]['row'], 26)
+        self.assertIn('purchase_price', result['errors'][0]['errors'])
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "portfolio_stockholding"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(PortfolioPosition.objects.get(user=self.user, symbol='AAPL').lot_count, 25)
+        self.assertEqual(verify_positions(), [])
+
+    def test_ndjson_upload_endpoint(self):
+        lines = [
+            json.dumps({'stock_symbol': 'AAPL', 'quantity': '3', 'purchase_price': '150.00', 'purchase_date': '2024-01-02'}),
+            '{not json',
+            json.dumps({'ticker': 'MSFT', 'qty': '1', 'price': '300.00', 'date': 'yesterday'}),
+        ]
+        upload = SimpleUploadedFile('history.ndjson', '\n'.join(lines).encode())
+        request = APIRequestFactory().post('/portfolio/api/holdings/import/', {'file': upload}, format='multipart')
+        force_authenticate(request, user=self.user)
+
+        response = StockHoldingImportAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(StockHolding.objects.get(user=self.user).stock_symbol, 'AAPL')
+
+    def test_command_dry_run_writes_nothing(self):
+        with mock.patch('sys.stdin', StringIO('symbol,quantity,purchase_price,purchase_date\nAAPL,1,10,2024-01-02\n')):
+            out = StringIO()
+            call_command('import_holdings', '-', '--user', 'alice', '--dry-run', stdout=out)
+
+        self.assertIn('Validated 1 lots', out.getvalue())
+        self.assertFalse(StockHolding.objects.exists())
+
+
+class ExportTest(TestCase):
+    """
+    Tests for the streaming CSV / NDJSON exports.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+
+    def export(self, dataset, user=None, **params):
+        request = RequestFactory().get(f'/portfolio/api/export/{dataset}/', params)
+        request.user = user or self.user
+        return export_view(request, dataset)
+
+    def test_holdings_csv_streams_only_the_users_rows(self):
+        make_holding(self.user, 'AAPL', quantity='2', price='150.00')
+        make_holding(User.objects.create_user(username='bob'), 'MSFT')
+
+        response = self.export('holdings')
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,stock_symbol,quantity,purchase_price,purchase_date,last_price,last_updated')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('AAPL,2.0000,150.00,2024-01-02', lines[1])
+
+    def test_scenarios_as_ndjson_keep_their_json(self):
+        SavedCapitalGainsScenario.objects.create(
+            user=self.user, name='Sale', input_data={'lots': [1, 2]}, result_data={'gain': '10.00'},
+        )
+
+        response = self.export('capital-gains-scenarios', file_format='ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows[0]['name'], 'Sale')
+        self.assertEqual(rows[0]['input_data'], {'lots': [1, 2]})
+
+    def test_full_export_is_staff_only(self):
+        PortfolioSnapshot.objects.create(user=self.user, date=date(2024, 1, 2), total_value=Decimal('100.00'))
+        self.assertEqual(self.export('snapshots', all='true').status_code, 403)
+        self.assertEqual(self.export('unknown').status_code, 404)
+
+        staff = User.objects.create_user(username='admin', is_staff=True)
+        lines = b''.join(self.export('snapshots', user=staff, all='true').streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['user_id,date,total_value', f'{self.user.id},2024-01-02,100.00'])
+
+    async def test_asgi_export_streams_from_an_async_iterator(self):
+        user = await User.objects.aget(username='alice')
+        await sync_to_async(make_holding)(user, 'AAPL')
+        request = AsyncRequestFactory().get('/portfolio/api/export/holdings/')
+        request.user = user
+
+        response = await sync_to_async(export_view)(request, 'holdings')
+
+        self.assertTrue(response.is_async)
+        lines = [chunk async for chunk in response]
+        self.assertEqual(len(lines), 2)
+
+
+class BenchmarkQueriesCommandTest(TestCase):
+    """
+    Tests for the query plan benchmark.
+    """
+    def test_prints_plans_for_both_index_states_and_rolls_back(self):
+        out = StringIO()
+        call_command(
+            'benchmark_queries', '--users', '3', '--lots', '5', '--snapshots', '5', '--scenarios', '3',
+            '--repeat', '1', '--compare', stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertIn('== without composite indexes ==', output)
+        self.assertIn('stockholding_user_sym_date_idx', output)
+        self.assertIn('summary: chart (1y)', output)
+        self.assertFalse(User.objects.exists())
+
+
+class PriceStreamTest(TestCase):
+    """
+    Tests for the live price fan-out behind the Server-Sent Events stream.
+    """
+    @staticmethod
+    def cached_quote(symbol, price, fetched_at=None):
+        now = timezone.now()
+        return CachedQuote.objects.acreate(
+            symbol=symbol, function=QUOTE, fetched_at=fetched_at or now, expires_at=now + timedelta(minutes=15), last_accessed=now,
+            data=Quote(symbol=symbol, price=Decimal(price), previous_close=Decimal('100.00'), as_of=now).to_dict(),
+        )
+
+    async def test_one_update_fans_out_to_every_subscriber(self):
+        hub = PriceHub(poll_seconds=3600)
+        first, second, other = hub.subscribe(['AAPL']), hub.subscribe(['AAPL', 'MSFT']), hub.subscribe(['TSLA'])
+        self.addCleanup(hub._task.cancel)
+
+        await self.cached_quote('AAPL', '101.50')
+        await hub.poll_once()
+
+        for subscription in (first, second):
+            updates = await subscription.next_updates(timeout=1)
+            self.assertEqual(updates['AAPL']['price'], '101.50')
+            self.assertEqual(updates['AAPL']['change'], '1.50')
+        self.assertEqual(await other.next_updates(timeout=0.01), {})
+
+        hub.unsubscribe(first)
+        self.assertEqual(hub.connections(), 2)
+
+    async def test_late_commits_are_published_once(self):
+        hub = PriceHub(poll_seconds=3600, overlap_seconds=30)
+        hub._since = timezone.now() - timedelta(days=1)  # Left over from an earlier run
+        await self.cached_quote('MSFT', '400.00', fetched_at=timezone.now() - timedelta(hours=1))
+        subscription = hub.subscribe(['AAPL', 'MSFT'])
+        self.addCleanup(hub._task.cancel)
+        # The restarted hub does not replay quotes from before it started
+        self.assertEqual(await hub.poll_once(), 0)
+
+        # Stamped before the last poll but committed after it
+        await self.cached_quote('AAPL', '101.50', fetched_at=hub._since - timedelta(seconds=5))
+        self.assertEqual(await hub.poll_once(), 1)
+        self.assertEqual(await hub.poll_once(), 0)
+        self.assertEqual((await subscription.next_updates(timeout=1))['AAPL']['price'], '101.50')
+
+    async def test_stream_starts_with_a_snapshot_of_held_symbols(self):
+        user = await User.objects.acreate(username='alice')
+        await StockHolding.objects.acreate(
+            user=user, stock_symbol='aapl', quantity=Decimal('1'), purchase_price=Decimal('90'), purchase_date=date.today()
+        )
+        await self.cached_quote('AAPL', '101.50')
+        await self.cached_quote('MSFT', '400.00')
+
+        async def auser():
+            return user
+
+        request = AsyncRequestFactory().get('/portfolio/api/prices/stream/')
+        request.auser = auser
+        response = await price_stream_view(request)
+        stream = aiter(response.streaming_content)
+        first_event = (await anext(stream)).decode()
+        await stream.aclose()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(first_event.startswith('event: snapshot'))
+        self.assertIn('AAPL', first_event)
+        self.assertNotIn('MSFT', first_event)
 
-# Create your tests here.
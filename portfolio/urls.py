@@ -1,4 +1,5 @@
 # portfolio/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -9,9 +10,20 @@ urlpatterns = [
     path('', views.portfolio_dashboard_view, name='portfolio_list'),
     
     # The API endpoint that provides all data for the dashboard
-    path('api/summary/', views.PortfolioAPIView.as_view(), name='api_summary'),
+    # The async summary needs ASGI to pay off; WSGI deployments can keep the sync view
+    path(
+        'api/summary/',
+        views.portfolio_summary_async_view if settings.ASYNC_PORTFOLIO_SUMMARY else views.PortfolioAPIView.as_view(),
+        name='api_summary',
+    ),
+
+    # Live price updates for the dashboard (Server-Sent Events, needs ASGI)
+    path('api/prices/stream/', views.price_stream_view, name='api_price_stream'),
+    path('api/export/<slug:dataset>/', views.export_view, name='api_export'),
 
     # URLs for Creating, Updating, Deleting holdings
     path('api/holdings/', views.StockHoldingAPIView.as_view(), name='api_holdings_create'),
     path('api/holdings/<int:pk>/', views.StockHoldingAPIView.as_view(), name='api_holdings_detail'),
+    path('api/holdings/bulk/', views.StockHoldingBulkAPIView.as_view(), name='api_holdings_bulk'),
+    path('api/holdings/import/', views.StockHoldingImportAPIView.as_view(), name='api_holdings_import'),
 ]
\ No newline at end of file
@@ -1,127 +1,535 @@
 # portfolio/views.py
 from rest_framework import status
 from .serializers import StockHoldingSerializer
+import io
 import os
 import requests
-import time
+from collections import Counter
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import StockHolding, PortfolioSnapshot
-from calculators.views import get_alpha_vantage_data # Reusing our helper
+from . import exports, importer
+from .charting import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, downsample_series
+from .models import PortfolioPosition, PortfolioSnapshot, PortfolioTotals, StockHolding
+from .positions import apply_lot_changes, lot_values
+from .price_refresh import schedule_refresh
+from .price_stream import DEFAULT_HEARTBEAT_SECONDS, price_hub, price_update, sse_event
+from calculators.models import CachedQuote
+from calculators.market_calendar import price_expiry
+from calculators.quote_cache import QUOTE, quote_cache # Shared across users and workers
 
 @login_required
 def portfolio_dashboard_view(request):
     """ Renders the new portfolio dashboard. """
     return render(request, 'portfolio/dashboard.html')
 
+# How long a browser on a WSGI deployment waits before asking again
+WSGI_STREAM_RETRY_MS = 30000
+
+
+async def price_stream_view(request):
+    """
+    Server-Sent Events stream of price updates for the user's holdings.
+    Sends a 'snapshot' of the cached prices, then a 'price' event per symbol
+    whenever the shared quote cache gets a newer quote. Needs ASGI to stay
+    open; under WSGI it sends the snapshot and lets the browser reconnect.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+    symbols = {
+        symbol.upper() async for symbol in
+        StockHolding.objects.filter(user=user).values_list('stock_symbol', flat=True)
+    }
+    snapshot = {
+        symbol: price_update(data) async for symbol, data in
+        CachedQuote.objects.filter(function=QUOTE, symbol__in=symbols).values_list('symbol', 'data')
+    }
+
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            f"retry: {WSGI_STREAM_RETRY_MS}\n" + sse_event('snapshot', snapshot),
+            content_type='text/event-stream',
+        )
+
+    response = StreamingHttpResponse(_price_events(symbols, snapshot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+    return response
+
+
+async def _price_events(symbols, snapshot):
+    yield sse_event('snapshot', snapshot)
+    subscription = price_hub.subscribe(symbols)
+    heartbeat = getattr(settings, 'PRICE_STREAM_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+    try:
+        while True:
+            updates = await subscription.next_updates(heartbeat)
+            if not updates:
+                yield ": keep-alive\n\n"
+            for update in updates.values():
+                yield sse_event('price', update)
+    finally:
+        # Runs when the client disconnects and the server cancels the stream
+        price_hub.unsubscribe(subscription)
+
+
 class PortfolioAPIView(APIView):
     """
     Provides a complete summary of the user's portfolio, including
     live prices, overall metrics, and historical performance data.
+    Prices are served stale-while-revalidate and never block on upstream.
+    This is the WSGI version; see portfolio_summary_async_view.
     """
     def get(self, request, *args, **kwargs):
         user = request.user
         if not user.is_authenticated:
             return Response({"error": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        holdings = StockHolding.objects.filter(user=user)
-        snapshots = PortfolioSnapshot.objects.filter(user=user).order_by('date')
-
-        total_portfolio_value = Decimal('0.00')
-        total_investment = Decimal('0.00')
-        holdings_data = []
-
-        for holding in holdings:
-            cost_basis = holding.quantity * holding.purchase_price
-            total_investment += cost_basis
-            
-            current_price = holding.last_price
-            if not holding.last_updated or holding.last_updated < timezone.now() - timedelta(minutes=15):
-                api_data = get_alpha_vantage_data(holding.stock_symbol, 'GLOBAL_QUOTE')
-                if 'Global Quote' in api_data and api_data.get('Global Quote'):
-                    try:
-                        current_price = Decimal(api_data['Global Quote']['05. price'])
-                        holding.last_price = current_price
-                        holding.last_updated = timezone.now()
-                        holding.save()
-                        time.sleep(15)
-                    except (KeyError, ValueError):
-                        pass
-            
-            market_value = holding.quantity * current_price if current_price is not None else Decimal('0.00')
-            total_portfolio_value += market_value
-            pnl = market_value - cost_basis if current_price is not None else Decimal('0.00')
-
-            holdings_data.append({
-                'id': holding.id,
-                'symbol': holding.stock_symbol,
-                'quantity': f"{holding.quantity:.4f}",
-                'average_price': f"{holding.purchase_price:.2f}",
-                'cost_basis': f"{cost_basis:.2f}",
-                'market_price': f"{current_price:.2f}" if current_price is not None else "N/A",
-                'market_value': f"{market_value:.2f}",
-                'pnl_amount': f"{pnl:.2f}",
-                'pnl_percent': f"{(pnl / cost_basis * 100):.2f}" if cost_basis > 0 else "0.00",
-                'allocation': f"{(market_value / total_portfolio_value * 100):.2f}" if total_portfolio_value > 0 else "0.00",
-                'purchase_date': holding.purchase_date.strftime('%Y-%m-%d') if holding.purchase_date else None,
-            })
-
-        overall_pnl = total_portfolio_value - total_investment
-        overall_pnl_percent = (overall_pnl / total_investment * 100) if total_investment > 0 else Decimal('0.00')
-
-        chart_labels = [s.date.strftime('%Y-%m-%d') for s in snapshots]
-        chart_values = [float(s.total_value) for s in snapshots]
-
-        response_data = {
-            'summary': {
-                'total_value': f"{total_portfolio_value:.2f}",
-                'total_investment': f"{total_investment:.2f}",
-                'overall_pnl': f"{overall_pnl:.2f}",
-                'overall_pnl_percent': f"{overall_pnl_percent:.2f}",
-            },
-            'holdings': holdings_data,
-            'chart_data': { 'labels': chart_labels, 'values': chart_values }
+        try:
+            chart_start, chart_end, max_points = chart_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One row per symbol; individual lots are only read for the holdings table
+        positions = list(PortfolioPosition.objects.filter(user=user))
+        totals = PortfolioTotals.objects.filter(user=user).first()
+        lots = list(StockHolding.objects.filter(user=user)) if include_lots(request.query_params) else None
+        snapshot_rows = list(snapshot_query(user, chart_start, chart_end))
+
+        # Stale-while-revalidate: never call upstream on the request path. Serve the
+        # last known price, pick up fresher quotes other users' refreshes left in the
+        # shared cache, and queue a background refresh for anything still stale.
+        now = timezone.now()
+        is_stale = stale_checker(now)
+        stale_symbols = {p.symbol for p in positions if is_stale(p)}
+        cached_quotes = quote_cache.get_quotes(stale_symbols, fetch=False) if stale_symbols else {}
+        # One UPDATE for every position that picked up a fresher price
+        changed = apply_cached_quotes(positions, cached_quotes, now)
+        if changed:
+            PortfolioPosition.objects.bulk_update(changed, ['last_price', 'last_updated'])
+
+        refreshing = {p.symbol for p in positions if is_stale(p)}
+        if refreshing:
+            schedule_refresh(refreshing)
+
+        return Response(summary_payload(positions, totals, lots, snapshot_rows, max_points, refreshing, now))
+
+
+async def portfolio_summary_async_view(request):
+    """
+    Async (ASGI) version of PortfolioAPIView with the same payload. Reads use
+    the async ORM. Stale prices are still refreshed in the background, but
+    symbols with no usable price at all are resolved during the request,
+    concurrently, so a cold portfolio waits about one upstream round trip.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+    try:
+        chart_start, chart_end, max_points = chart_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    positions = [p async for p in PortfolioPosition.objects.filter(user=user)]
+    totals = await PortfolioTotals.objects.filter(user=user).afirst()
+    lots = [h async for h in StockHolding.objects.filter(user=user)] if include_lots(request.GET) else None
+    snapshot_rows = [row async for row in snapshot_query(user, chart_start, chart_end)]
+
+    now = timezone.now()
+    is_stale = stale_checker(now)
+    unavailable_cutoff = now - timedelta(seconds=getattr(settings, 'PRICE_MAX_STALENESS_SECONDS', 4 * 24 * 60 * 60))
+    stale_symbols = {p.symbol for p in positions if is_stale(p)}
+    cold_symbols = {p.symbol for p in positions if not p.last_updated or p.last_updated < unavailable_cutoff}
+    quotes = await sync_to_async(quote_cache.get_quotes)(stale_symbols, fetch=False) if stale_symbols else {}
+    # Positions with no usable price are worth waiting for: fetch them all at once
+    cold_symbols -= quotes.keys()
+    if cold_symbols:
+        quotes.update(await quote_cache.aget_quotes(cold_symbols))
+    changed = apply_cached_quotes(positions, quotes, now)
+    if changed:
+        await PortfolioPosition.objects.abulk_update(changed, ['last_price', 'last_updated'])
+
+    refreshing = {p.symbol for p in positions if is_stale(p)}
+    if refreshing:
+        schedule_refresh(refreshing)
+
+    return JsonResponse(summary_payload(positions, totals, lots, snapshot_rows, max_points, refreshing, now))
+
+
+def chart_params(params):
+    """ Parses the optional start, end and max_points query parameters. """
+    dates = []
+    for name in ('start', 'end'):
+        raw = params.get(name)
+        try:
+            parsed = parse_date(raw) if raw else None
+        except ValueError:
+            parsed = None
+        if raw and parsed is None:
+            raise ValueError(f"Invalid '{name}' date. Use YYYY-MM-DD.")
+        dates.append(parsed)
+
+    raw_points = params.get('max_points')
+    try:
+        max_points = int(raw_points) if raw_points else DEFAULT_MAX_POINTS
+    except ValueError:
+        raise ValueError("'max_points' must be a whole number.")
+    if not 2 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(f"'max_points' must be between 2 and {MAX_POINTS_LIMIT}.")
+    return dates[0], dates[1], max_points
+
+
+def snapshot_query(user, start, end):
+    """ Only the two columns the chart needs, within the requested range. """
+    snapshots = PortfolioSnapshot.objects.filter(user=user)
+    if start:
+        snapshots = snapshots.filter(date__gte=start)
+    if end:
+        snapshots = snapshots.filter(date__lte=end)
+    return snapshots.order_by('date').values_list('date', 'total_value')
+
+
+def include_lots(params):
+    """ ?lots=false leaves out the per-lot holdings list (positions and totals only). """
+    return params.get('lots', 'true').lower() not in ('0', 'false', 'no')
+
+
+def stale_checker(now):
+    """
+    A price is stale once it is older than PRICE_STALE_AFTER_SECONDS *and* its
+    market has been open since; a closing price stays current until the next open.
+    """
+    stale_after = getattr(settings, 'PRICE_STALE_AFTER_SECONDS', 15 * 60)
+
+    def is_stale(position):
+        if not position.last_updated:
+            return True
+        return now >= price_expiry(position.symbol, position.last_updated, stale_after)
+
+    return is_stale
+
+
+def apply_cached_quotes(positions, quotes, now):
+    """ Applies quotes fresher than each position's price in memory; returns the positions changed. """
+    changed = []
+    for position in positions:
+        quote = quotes.get(position.symbol)
+        if quote is not None and (not position.last_updated or (quote.as_of or now) > position.last_updated):
+            position.last_price = quote.price
+            position.last_updated = quote.as_of or now
+            changed.append(position)
+    return changed
+
+
+def summary_payload(positions, totals, lots, snapshot_rows, max_points, refreshing, now):
+    """
+    The summary response shared by the sync and async views. The cost basis
+    and counts come from the user's PortfolioTotals row (None if they have
+    never held anything), market value from the pre-aggregated positions;
+    `lots` (None to skip) only feeds the table.
+    """
+    unavailable_cutoff = now - timedelta(seconds=getattr(settings, 'PRICE_MAX_STALENESS_SECONDS', 4 * 24 * 60 * 60))
+    total_portfolio_value = Decimal('0.00')
+    total_investment = totals.total_cost if totals is not None else Decimal('0.00')
+    prices = {}
+
+    for position in positions:
+        # Beyond the hard staleness limit a price is treated as unknown
+        if position.last_updated is None or position.last_updated < unavailable_cutoff:
+            prices[position.symbol] = None
+        else:
+            prices[position.symbol] = position.last_price
+        if prices[position.symbol] is not None:
+            total_portfolio_value += position.total_quantity * prices[position.symbol]
+
+    def valuation(quantity, cost_basis, current_price):
+        market_value = quantity * current_price if current_price is not None else Decimal('0.00')
+        pnl = market_value - cost_basis if current_price is not None else Decimal('0.00')
+        return {
+            'cost_basis': f"{cost_basis:.2f}",
+            'market_price': f"{current_price:.2f}" if current_price is not None else "N/A",
+            'market_value': f"{market_value:.2f}",
+            'pnl_amount': f"{pnl:.2f}",
+            'pnl_percent': f"{(pnl / cost_basis * 100):.2f}" if cost_basis > 0 else "0.00",
+            'allocation': f"{(market_value / total_portfolio_value * 100):.2f}" if total_portfolio_value > 0 else "0.00",
+        }
+
+    by_symbol = {position.symbol: position for position in positions}
+    positions_data = [
+        {
+            'symbol': position.symbol,
+            'quantity': f"{position.total_quantity:.4f}",
+            'lot_count': position.lot_count,
+            'average_price': f"{(position.total_cost / position.total_quantity):.2f}" if position.total_quantity else "0.00",
+            **valuation(position.total_quantity, position.total_cost, prices[position.symbol]),
+            'price_as_of': position.last_updated.isoformat() if position.last_updated else None,
+            'stale': position.symbol in refreshing,
         }
-        return Response(response_data)
+        for position in positions
+    ]
+
+    holdings_data = []
+    for holding in lots or ():
+        symbol = holding.stock_symbol.upper()
+        position = by_symbol.get(symbol)
+        price_as_of = position.last_updated if position is not None else None
+        holdings_data.append({
+            'id': holding.id,
+            'symbol': holding.stock_symbol,
+            'quantity': f"{holding.quantity:.4f}",
+            'average_price': f"{holding.purchase_price:.2f}",
+            **valuation(holding.quantity, holding.quantity * holding.purchase_price, prices.get(symbol)),
+            'purchase_date': holding.purchase_date.strftime('%Y-%m-%d') if holding.purchase_date else None,
+            'price_as_of': price_as_of.isoformat() if price_as_of else None,
+            'stale': symbol in refreshing,
+        })
+
+    overall_pnl = total_portfolio_value - total_investment
+    overall_pnl_percent = (overall_pnl / total_investment * 100) if total_investment > 0 else Decimal('0.00')
+
+    chart_dates, chart_values = downsample_series(
+        [d for d, _ in snapshot_rows], [float(v) for _, v in snapshot_rows], max_points
+    )
+    chart_labels = [d.strftime('%Y-%m-%d') for d in chart_dates]
+
+    return {
+        'summary': {
+            'total_value': f"{total_portfolio_value:.2f}",
+            'total_investment': f"{total_investment:.2f}",
+            'overall_pnl': f"{overall_pnl:.2f}",
+            'overall_pnl_percent': f"{overall_pnl_percent:.2f}",
+            'lot_count': totals.lot_count if totals is not None else 0,
+            'position_count': totals.position_count if totals is not None else 0,
+            'prices_refreshing': bool(refreshing),
+        },
+        'positions': positions_data,
+        'holdings': holdings_data,
+        'chart_data': { 'labels': chart_labels, 'values': chart_values }
+    }
 
 class StockHoldingAPIView(APIView):
-    """ Handles CRUD (Create, Read, Update, Delete) for StockHoldings. """
+    """
+    Handles CRUD (Create, Read, Update, Delete) for StockHoldings. Each write
+    updates the user's PortfolioPosition aggregates in the same transaction.
+    """
     def post(self, request, *args, **kwargs):
         """ Create a new stock holding. """
         serializer = StockHoldingSerializer(data=request.data)
         if serializer.is_valid():
-            # Associate the holding with the logged-in user before saving
-            serializer.save(user=request.user)
+            with transaction.atomic():
+                # Associate the holding with the logged-in user before saving
+                holding = serializer.save(user=request.user)
+                apply_lot_changes(request.user.id, added=[holding])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, pk, *args, **kwargs):
         """ Update an existing stock holding. """
-        try:
-            holding = StockHolding.objects.get(pk=pk, user=request.user)
-        except StockHolding.DoesNotExist:
-            return Response({'error': 'Holding not found.'}, status=status.HTTP_404_NOT_FOUND)
-            
-        serializer = StockHoldingSerializer(holding, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+        with transaction.atomic():
+            try:
+                holding = StockHolding.objects.select_for_update().get(pk=pk, user=request.user)
+            except StockHolding.DoesNotExist:
+                return Response({'error': 'Holding not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+            before = lot_values(holding)
+            serializer = StockHoldingSerializer(holding, data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                apply_lot_changes(request.user.id, added=[holding], removed=[before])
+                return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk, *args, **kwargs):
         """ Delete a stock holding. """
+        with transaction.atomic():
+            try:
+                holding = StockHolding.objects.select_for_update().get(pk=pk, user=request.user)
+            except StockHolding.DoesNotExist:
+                return Response({'error': 'Holding not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+            apply_lot_changes(request.user.id, removed=[holding])
+            holding.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def holding_id(value):
+    """ `value` if it is a usable primary key, else None. JSON true/false are not ids. """
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+class StockHoldingBulkAPIView(APIView):
+    """
+    Applies many holding changes in one request and one transaction:
+
+        {"create": [{holding}, ...], "update": [{"id": 1, ...holding}, ...], "delete": [2, 3]}
+
+    Every operation is validated first with StockHoldingSerializer; if any
+    fails, nothing is written and the errors are returned per operation.
+    Writes use one bulk INSERT, one bulk UPDATE and one DELETE, plus the
+    position aggregates (one UPDATE per symbol touched).
+    """
+    MAX_OPERATIONS = 1000
+    FIELDS = ['stock_symbol', 'quantity', 'purchase_price', 'purchase_date']
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not isinstance(request.data, dict):
+            return Response(
+                {'error': "Expected an object with 'create', 'update' and/or 'delete' lists."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        creates = request.data.get('create') or []
+        updates = request.data.get('update') or []
+        deletes = request.data.get('delete') or []
+        if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+            return Response({'error': "'create', 'update' and 'delete' must be lists."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(creates) + len(updates) + len(deletes) > self.MAX_OPERATIONS:
+            return Response(
+                {'error': f'At most {self.MAX_OPERATIONS} operations per request.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Each lot may appear once: the position aggregates apply one delta per operation
+        update_ids = [holding_id(op.get('id')) for op in updates if isinstance(op, dict)]
+        update_ids = [i for i in update_ids if i is not None]
+        delete_ids = [i for i in map(holding_id, deletes) if i is not None]
+        counts = Counter(update_ids + delete_ids)
+        duplicates = sorted(i for i, count in counts.items() if count > 1)
+        if duplicates:
+            return Response(
+                {'error': 'Each holding may be updated or deleted only once per request.', 'ids': duplicates},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            # Every lot being updated or deleted, locked, in one query
+            existing = StockHolding.objects.select_for_update().filter(user=request.user).in_bulk(
+                update_ids + delete_ids
+            )
+
+            errors = {'create': [], 'update': [], 'delete': []}
+            to_create = []
+            for op in creates:
+                serializer = StockHoldingSerializer(data=op)
+                errors['create'].append(None if serializer.is_valid() else serializer.errors)
+                if serializer.is_valid():
+                    to_create.append(StockHolding(user=request.user, **serializer.validated_data))
+
+            to_update, before = [], []
+            for op in updates:
+                holding = existing.get(holding_id(op.get('id'))) if isinstance(op, dict) else None
+                if holding is None:
+                    errors['update'].append({'id': ['Holding not found.']})
+                    continue
+                serializer = StockHoldingSerializer(holding, data=op)
+                if not serializer.is_valid():
+                    errors['update'].append(serializer.errors)
+                    continue
+                errors['update'].append(None)
+                before.append(lot_values(holding))
+                for field, value in serializer.validated_data.items():
+                    setattr(holding, field, value)
+                to_update.append(holding)
+
+            to_delete = []
+            for pk in deletes:
+                holding = existing.get(holding_id(pk))
+                errors['delete'].append(None if holding is not None else {'id': ['Holding not found.']})
+                if holding is not None:
+                    to_delete.append(holding)
+
+            if any(error for ops in errors.values() for error in ops):
+                transaction.set_rollback(True)
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            created = StockHolding.objects.bulk_create(to_create)
+            if to_update:
+                StockHolding.objects.bulk_update(to_update, self.FIELDS)
+            if to_delete:
+                StockHolding.objects.filter(pk__in=[h.pk for h in to_delete]).delete()
+            apply_lot_changes(request.user.id, added=created + to_update, removed=before + to_delete)
+
+        return Response({
+            'created': StockHoldingSerializer(created, many=True).data,
+            'updated': StockHoldingSerializer(to_update, many=True).data,
+            'deleted': [h.pk for h in to_delete],
+        }, status=status.HTTP_200_OK)
+
+
+class StockHoldingImportAPIView(APIView):
+    """
+    Imports a broker transaction history uploaded as the multipart field
+    `file` (CSV with a header row, or NDJSON). The file is parsed as a
+    stream and written in chunks; valid rows are imported and invalid ones
+    reported by row number. `?file_format=csv|ndjson` overrides the format
+    implied by the file name, and `?dry_run=true` only validates.
+    """
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': "Upload the history as the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.query_params.get('file_format') or importer.format_for(upload.name)
+        if fmt not in importer.FORMATS:
+            return Response(
+                {'error': f"'file_format' must be one of: {', '.join(importer.FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Decode as the rows are read; large uploads stay in their temporary file
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
         try:
-            holding = StockHolding.objects.get(pk=pk, user=request.user)
-        except StockHolding.DoesNotExist:
-            return Response({'error': 'Holding not found.'}, status=status.HTTP_404_NOT_FOUND)
-        
-        holding.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+            result = importer.import_holdings(
+                request.user, stream, fmt=fmt,
+                dry_run=request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes'),
+            )
+        except UnicodeDecodeError:
+            return Response({'error': 'The file must be UTF-8 encoded.'}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            stream.detach()
+        return Response(result, status=status.HTTP_200_OK)
+
+
+def export_view(request, dataset):
+    """
+    Streams one of the user's datasets (see exports.EXPORTS) as CSV or, with
+    ?file_format=ndjson, as newline-delimited JSON. Staff can add ?all=true
+    to export every user's rows.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    export = exports.EXPORTS.get(dataset)
+    if export is None:
+        return JsonResponse({"error": f"Unknown export '{dataset}'."}, status=404)
+    fmt = request.GET.get('file_format', exports.CSV)
+    if fmt not in exports.CONTENT_TYPES:
+        return JsonResponse({"error": "'file_format' must be csv or ndjson."}, status=400)
+    all_users = request.GET.get('all', '').lower() in ('1', 'true', 'yes')
+    if all_users and not request.user.is_staff:
+        return JsonResponse({"error": "Staff access required."}, status=403)
+
+    rows = export.queryset(None if all_users else request.user)
+    header, encode = exports.line_encoder(export, fmt, all_users)
+    stream = exports.astream_rows if isinstance(request, ASGIRequest) else exports.stream_rows
+    response = StreamingHttpResponse(stream(rows, header, encode), content_type=exports.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
@@ -2,6 +2,9 @@
 ASGI config for stock_savvy_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+This is what the Procfile and the Dockerfile serve (uvicorn); long-lived
+responses such as the live price stream need it. The WSGI entry point still
+works for everything else.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_savvy_project.settings')
+# Served over ASGI, so route the portfolio summary to its async view unless overridden
+os.environ.setdefault('ASYNC_PORTFOLIO_SUMMARY', 'True')
 
 application = get_asgi_application()
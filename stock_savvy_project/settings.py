@@ -101,6 +101,79 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
+# --- Market Data (Alpha Vantage) ---
+# Quotes are shared between every user, worker and management command.
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv('QUOTE_CACHE_MAX_ENTRIES', '5000'))
+QUOTE_CACHE_TTLS = {
+    'QUOTE': 15 * 60,
+    'GLOBAL_QUOTE': 15 * 60,
+    'TIME_SERIES_DAILY_ADJUSTED': 6 * 60 * 60,
+}
+# Quote TTLs above apply while a symbol's market is open; once it has closed, prices
+# stay cached until the next open (see calculators/market_calendar.py). The calendar
+# file adds closures or venues to the built-in US and UK calendars.
+MARKET_CALENDAR_TTLS = os.getenv('MARKET_CALENDAR_TTLS', 'True') == 'True'
+MARKET_CALENDAR_FILE = os.getenv('MARKET_CALENDAR_FILE', str(BASE_DIR / 'market_calendar.json'))
+# Free tier allows 5 calls/minute. A burst of 1 spaces calls evenly (one every 12s).
+ALPHA_VANTAGE_CALLS_PER_MINUTE = int(os.getenv('ALPHA_VANTAGE_CALLS_PER_MINUTE', '5'))
+ALPHA_VANTAGE_BURST = int(os.getenv('ALPHA_VANTAGE_BURST', '1'))
+# REALTIME_BULK_QUOTES (100 symbols per call) requires a premium key.
+ALPHA_VANTAGE_BULK_QUOTES = os.getenv('ALPHA_VANTAGE_BULK_QUOTES', 'False') == 'True'
+# 'alpha_vantage' or 'local' (offline files, for development and load testing)
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'alpha_vantage')
+MARKET_DATA_LOCAL_DIR = os.getenv('MARKET_DATA_LOCAL_DIR', str(BASE_DIR / 'market_data'))
+# Upstream HTTP: separate connect/read timeouts (seconds), retries on 5xx/connection errors
+MARKET_DATA_CONNECT_TIMEOUT = float(os.getenv('MARKET_DATA_CONNECT_TIMEOUT', '3.05'))
+MARKET_DATA_READ_TIMEOUT = float(os.getenv('MARKET_DATA_READ_TIMEOUT', '10'))
+MARKET_DATA_MAX_RETRIES = int(os.getenv('MARKET_DATA_MAX_RETRIES', '2'))
+MARKET_DATA_POOL_SIZE = int(os.getenv('MARKET_DATA_POOL_SIZE', '10'))
+# Dashboard prices: served immediately, refreshed in the background once stale,
+# and shown as unavailable once older than the hard limit.
+PRICE_STALE_AFTER_SECONDS = int(os.getenv('PRICE_STALE_AFTER_SECONDS', str(15 * 60)))
+PRICE_MAX_STALENESS_SECONDS = int(os.getenv('PRICE_MAX_STALENESS_SECONDS', str(4 * 24 * 60 * 60)))
+# Serve /portfolio/api/summary/ with the async view. Off by default, so WSGI servers
+# keep the sync view; stock_savvy_project/asgi.py turns it on for ASGI servers.
+ASYNC_PORTFOLIO_SUMMARY = os.getenv('ASYNC_PORTFOLIO_SUMMARY', 'False') == 'True'
+# Live price stream (ASGI): how often each worker checks the shared cache for new
+# quotes, how far each check reaches back for quotes committed late, and how often
+# idle connections get a keep-alive comment.
+PRICE_STREAM_POLL_SECONDS = float(os.getenv('PRICE_STREAM_POLL_SECONDS', '2'))
+PRICE_STREAM_OVERLAP_SECONDS = float(os.getenv('PRICE_STREAM_OVERLAP_SECONDS', '30'))
+PRICE_STREAM_HEARTBEAT_SECONDS = float(os.getenv('PRICE_STREAM_HEARTBEAT_SECONDS', '15'))
+# Symbols the provider cannot quote are skipped for BASE * 2^(failures - 1) seconds, up to MAX.
+MARKET_DATA_BACKOFF_BASE_SECONDS = int(os.getenv('MARKET_DATA_BACKOFF_BASE_SECONDS', str(15 * 60)))
+MARKET_DATA_BACKOFF_MAX_SECONDS = int(os.getenv('MARKET_DATA_BACKOFF_MAX_SECONDS', str(7 * 24 * 60 * 60)))
+# After this many consecutive rate limit ("Note"/"Information") responses, every
+# upstream call is short-circuited until the window has passed.
+MARKET_DATA_BREAKER_THRESHOLD = int(os.getenv('MARKET_DATA_BREAKER_THRESHOLD', '3'))
+MARKET_DATA_BREAKER_RESET_SECONDS = int(os.getenv('MARKET_DATA_BREAKER_RESET_SECONDS', '60'))
+
+# --- Calculator result memoization ---
+# Capital gains / reprice / rebalance results are cached by a hash of the validated
+# request. Any Django cache backend works: locmem (per worker, the default),
+# filebased (LOCATION = a directory) or db (LOCATION = a table made by createcachetable).
+# MAX_ENTRIES bounds the size; CULL_FREQUENCY=4 drops a quarter of it when full.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'calculators': {
+        'BACKEND': os.getenv('CALCULATOR_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CALCULATOR_CACHE_LOCATION', 'calculator-results'),
+        'TIMEOUT': int(os.getenv('CALCULATOR_CACHE_TIMEOUT', str(24 * 60 * 60))),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CALCULATOR_CACHE_MAX_ENTRIES', '10000')), 'CULL_FREQUENCY': 4},
+    },
+}
+CALCULATOR_CACHE_ALIAS = 'calculators'
+CALCULATOR_MEMO_ENABLED = os.getenv('CALCULATOR_MEMO_ENABLED', 'True') == 'True'
+
+# Rendered report PDFs, keyed by template + context hash and evicted least recently
+# used first beyond PDF_CACHE_MAX_BYTES. Unset directory = the system temp dir.
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR')
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+# Part of every PDF cache key. Template edits (including extended and included
+# templates) invalidate on their own; bump this on deploys that change the output
+# some other way, e.g. stylesheets, fonts or an xhtml2pdf upgrade.
+PDF_CACHE_VERSION = os.getenv('PDF_CACHE_VERSION', '1')
+
 # --- Email Configuration (SendGrid HTTPS API) ---
 if not DEBUG:
     # Use Anymail to connect via HTTPS (Port 443) - Bypasses Railway Block